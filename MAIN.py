@@ -6,37 +6,20 @@ import streamlit as st
 import folium
 from streamlit_folium import st_folium
 import json
-import os
 import math
+import os
+from contraction_hierarchy import prepare_hierarchies
 from edgegraph import Graph
-from dijkstras_algorithm import dijkstra
-
-
-# ----------------------------------------------------------------------------------
-# Utility: Load and Save Voice Updates (JSON)
-# ----------------------------------------------------------------------------------
-
-
-def load_voice_update(file_path="voice_update.json"):
-    """Load voice update data from a JSON file if it exists."""
-    if not os.path.exists(file_path):
-        return None
-    try:
-        with open(file_path, "r") as f:
-            data = json.load(f)
-            return data
-    except Exception as e:
-        st.error(f"Error reading {file_path}: {e}")
-        return None
-
-
-def save_voice_update(data: dict, file_path="voice_update.json"):
-    """Save voice update data to a JSON file."""
-    try:
-        with open(file_path, "w") as f:
-            json.dump(data, f)
-    except Exception as e:
-        st.error(f"Error writing to {file_path}: {e}")
+# find_closest_node and geometry_dijkstra are re-exported for callers of MAIN
+from geometry_graph import (  # noqa: F401
+    POLYLINE_MISSING, POLYLINE_STRAIGHT, GeometryArtifacts, RoutePolylines, build_edge_features, find_closest_node,
+    geometry_dijkstra, input_key, lod_for_zoom
+)
+from route_cache import RouteCache
+from route_table import prepare_route_table
+from routing import compute_route
+from tracing import TRACER, count, span
+from voice_channel import VoiceChannel
 
 
 # ----------------------------------------------------------------------------------
@@ -45,7 +28,9 @@ def save_voice_update(data: dict, file_path="voice_update.json"):
 
 
 def format_time_in_minutes_seconds(total_seconds: float) -> str:
-    """Convert seconds to a formatted string in minutes and seconds."""
+    """Convert seconds to a formatted string in minutes and seconds ("unknown" for a missing metric)."""
+    if not math.isfinite(total_seconds):
+        return "unknown"
     total_seconds = int(total_seconds)
     minutes = total_seconds // 60
     seconds = total_seconds % 60
@@ -58,165 +43,39 @@ def format_time_in_minutes_seconds(total_seconds: float) -> str:
 
 
 def format_distance_in_feet(distance_km: float) -> str:
-    """Convert distance from kilometers to feet and return as string."""
+    """Convert distance from kilometers to feet and return as string ("unknown" for a missing metric)."""
+    if not math.isfinite(distance_km):
+        return "unknown"
     feet = distance_km * 3280.84
     return f"{int(feet)} feet"
 
 
 # ----------------------------------------------------------------------------------
-# Helper functions for snapping (buffered matching)
-# ----------------------------------------------------------------------------------
-
-
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate the distance (in meters) between two lat/lon points using the Haversine formula."""
-    R = 6371000  # Earth radius in meters
-    d_lat = math.radians(lat2 - lat1)
-    d_lon = math.radians(lon2 - lon1)
-    a = math.sin(d_lat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lon/2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
-def find_closest_node(lat, lon, node_data, threshold=5.0):
-    """
-    Find the closest node from node_data to the given lat/lon within a threshold (meters).
-    Returns the node name if within threshold, otherwise None.
-    """
-    closest_node = None
-    min_dist = float("inf")
-    for node_name, coords in node_data.items():
-        nlat = coords.get("latitude")
-        nlon = coords.get("longitude")
-        if nlat is None or nlon is None:
-            continue
-        dist = haversine_distance(lat, lon, nlat, nlon)
-        if dist < min_dist:
-            min_dist = dist
-            closest_node = node_name
-    if min_dist <= threshold:
-        return closest_node
-    else:
-        return None
-
-
-# ----------------------------------------------------------------------------------
-# GeometryGraph: Build a graph from red lines in GeoJSON data
+# Enhanced CampusMap Class: Display map with paths and buildings
 # ----------------------------------------------------------------------------------
 
 
-class GeometryGraph:
-    """
-    Build a graph from GeoJSON red lines, splitting them at known campus nodes.
-    Each segment is stored as an edge with coordinates and distance.
-    """
-    def __init__(self, node_data, geojson_data, threshold=5.0):
-        self.adj = {}
-        self.node_data = node_data
-        self.threshold = threshold
-        self.build_geometry_graph(geojson_data)
-
-    def add_edge(self, nodeA, nodeB, coords):
-        """Add a bidirectional edge between nodeA and nodeB with computed distance."""
-        distance_m = 0.0
-        for i in range(len(coords) - 1):
-            lon1, lat1 = coords[i]
-            lon2, lat2 = coords[i+1]
-            distance_m += haversine_distance(lat1, lon1, lat2, lon2)
-
-        if nodeA not in self.adj:
-            self.adj[nodeA] = {}
-        if nodeB not in self.adj:
-            self.adj[nodeB] = {}
-
-        self.adj[nodeA][nodeB] = {"coords": coords, "distance": distance_m}
-        self.adj[nodeB][nodeA] = {"coords": list(reversed(coords)), "distance": distance_m}
-
-    def build_geometry_graph(self, geojson_data):
-        """Parse GeoJSON features and build the geometry graph."""
-        for feature in geojson_data["features"]:
-            geom = feature.get("geometry", {})
-            if geom.get("type") != "LineString":
-                continue
-            coords = geom.get("coordinates", [])
-            if len(coords) < 2:
-                continue
-            # Identify breakpoints along the line for snapping nodes
-            break_indices = [0]
-            for i, (lon, lat) in enumerate(coords):
-                if i == 0 or i == len(coords) - 1:
-                    continue
-                snapped_node = find_closest_node(lat, lon, self.node_data, self.threshold)
-                if snapped_node:
-                    break_indices.append(i)
-            break_indices.append(len(coords) - 1)
-            # Create segments between breakpoints
-            for idx in range(len(break_indices) - 1):
-                start_i = break_indices[idx]
-                end_i = break_indices[idx + 1]
-                segment_coords = coords[start_i:end_i + 1]
-                first_lon, first_lat = segment_coords[0]
-                last_lon, last_lat = segment_coords[-1]
-                nodeA = find_closest_node(first_lat, first_lon, self.node_data, self.threshold)
-                nodeB = find_closest_node(last_lat, last_lon, self.node_data, self.threshold)
-                if nodeA and nodeB and nodeA != nodeB:
-                    self.add_edge(nodeA, nodeB, segment_coords)
-
-
-# ----------------------------------------------------------------------------------
-# Dijkstra for GeometryGraph
-# ----------------------------------------------------------------------------------
+# Style of each base layer class (see CampusMap.style_class)
+BASE_LAYER_STYLES = {
+    "dorm": {"fillColor": "purple", "color": "purple", "weight": 2, "fillOpacity": 0.4},
+    "lab": {"fillColor": "orange", "color": "orange", "weight": 2, "fillOpacity": 0.4},
+    "other": {"fillColor": "blue", "color": "red", "weight": 2, "fillOpacity": 0.4},
+    "red_paths": {"color": "red", "weight": 4, "opacity": 0.8},
+}
 
 
-def geometry_dijkstra(geom_graph, start_node, end_node):
+class CampusMap:
     """
-    Run a mini Dijkstra algorithm on a GeometryGraph to find a path between nodes.
-    Returns a list of edge tuples (nodeA, nodeB) for the shortest path.
+    Handles rendering of the campus map with GeoJSON data and graph routes.
+    Pass prebuilt GeometryArtifacts (see load_geometry) to skip snapping the path data;
+    they are only read, never modified.
+
+    The base map (buildings) is built once and kept for the session (see
+    get_campus_map). The route and the red paths are handed to st_folium as dynamic
+    layers (see dynamic_layers), so the browser keeps the base map mounted, and are
+    drawn at the level of detail that suits the map's zoom.
     """
-    import heapq
-    dist = {}
-    prev = {}
-    for node in geom_graph.adj:
-        dist[node] = float('inf')
-        prev[node] = None
-    if start_node not in geom_graph.adj or end_node not in geom_graph.adj:
-        return None
-    dist[start_node] = 0
-    visited = set()
-    heap = [(0, start_node)]
-    while heap:
-        current_dist, node = heapq.heappop(heap)
-        if node in visited:
-            continue
-        visited.add(node)
-        if node == end_node:
-            break
-        for neighbor, info in geom_graph.adj[node].items():
-            edge_dist = info["distance"]
-            alt = current_dist + edge_dist
-            if alt < dist[neighbor]:
-                dist[neighbor] = alt
-                prev[neighbor] = node
-                heapq.heappush(heap, (alt, neighbor))
-    if dist[end_node] == float('inf'):
-        return None
-    path_edges = []
-    cur = end_node
-    while prev[cur] is not None:
-        path_edges.append((prev[cur], cur))
-        cur = prev[cur]
-    path_edges.reverse()
-    return path_edges
-
-
-# ----------------------------------------------------------------------------------
-# Enhanced CampusMap Class: Display map with paths and buildings
-# ----------------------------------------------------------------------------------
-
-
-class CampusMap:
-    """Handles rendering of the campus map with GeoJSON data and graph routes."""
-    def __init__(self, geojson_data, graph):
+    def __init__(self, geojson_data, graph, artifacts=None):
         self.geojson_data = geojson_data
         self.graph = graph
 
@@ -227,72 +86,120 @@ class CampusMap:
         )
 
         self.route_group = folium.FeatureGroup(name="Route")
-        self.map.add_child(self.route_group)
+        self.route_view = None
 
         self.red_paths_group = folium.FeatureGroup(name="RedPaths")
-        self.edge_geometry = {}
-        self.parse_line_features()
-
-        self.geometry_graph = GeometryGraph(graph.location_data, geojson_data, threshold=5.0)
+        self.show_red_paths = False
+        self.red_paths_groups = {}
+        self.attached_layers = []
+        if artifacts is None:
+            artifacts = GeometryArtifacts.build(geojson_data, graph.get_spatial_index(), key=(),
+                                                compact=graph.get_compact_graph())
+        self.key = artifacts.key
+        self.edge_geometry = artifacts.edge_geometry
+        self.geometry_graph = artifacts.geometry_graph
+        self.polylines = artifacts.polylines
+        self.path_layers = artifacts.path_layers
+        if self.polylines is None:
+            self.polylines = RoutePolylines.build(graph.get_compact_graph(), self.edge_geometry, self.geometry_graph)
+
+    @staticmethod
+    def style_class(feature):
+        """Return the base layer style class of a feature ("dorm", "lab", "other" or "red_paths")."""
+        if feature["geometry"]["type"] == "LineString":
+            return "red_paths"
+        bldg_type = feature.get("properties", {}).get("type", "").lower()
+        return bldg_type if bldg_type in ("dorm", "lab") else "other"
 
     def style_function(self, feature):
         """Return a style dict based on feature type."""
-        props = feature.get("properties", {})
-        bldg_type = props.get("type", "").lower()
-        if bldg_type == "dorm":
-            return {"fillColor": "purple", "color": "purple", "weight": 2, "fillOpacity": 0.4}
-        elif bldg_type == "lab":
-            return {"fillColor": "orange", "color": "orange", "weight": 2, "fillOpacity": 0.4}
-        else:
-            return {"fillColor": "blue", "color": "red", "weight": 2, "fillOpacity": 0.4}
+        return BASE_LAYER_STYLES[self.style_class(feature)]
 
     def add_base_layers(self):
-        """Add GeoJSON layers to the map based on geometry type."""
+        """
+        Add the building polygons to the map as one FeatureCollection per style
+        class, so the map holds a few layers with a constant style each instead of
+        one layer (and style callback) per feature. The red paths are drawn by
+        red_paths_layer at the zoom's level of detail.
+        """
+        collections = {name: [] for name in BASE_LAYER_STYLES if name != "red_paths"}
         for feature in self.geojson_data["features"]:
-            geom_type = feature["geometry"]["type"]
-            if geom_type == "Polygon":
-                folium.GeoJson(feature, style_function=self.style_function).add_to(self.map)
-            elif geom_type == "LineString":
-                folium.GeoJson(
-                    feature,
-                    style_function=lambda x: {"color": "red", "weight": 4, "opacity": 0.8}
-                ).add_to(self.red_paths_group)
+            if feature["geometry"]["type"] == "Polygon":
+                collections[self.style_class(feature)].append(feature)
+        for name, features in collections.items():
+            if not features:
+                continue
+            folium.GeoJson(
+                {"type": "FeatureCollection", "features": features},
+                name=name,
+                style_function=lambda x, style=BASE_LAYER_STYLES[name]: style
+            ).add_to(self.map)
+
+    def red_paths_layer(self, tolerance=0.0):
+        """Return the red paths simplified to the LOD level tolerance (one FeatureGroup per level, reused)."""
+        group = self.red_paths_groups.get(tolerance)
+        if group is None:
+            group = folium.FeatureGroup(name="RedPaths")
+            folium.GeoJson(
+                self.path_layers[tolerance],
+                name="red_paths",
+                style_function=lambda x: BASE_LAYER_STYLES["red_paths"]
+            ).add_to(group)
+            self.red_paths_groups[tolerance] = group
+        self.red_paths_group = group
+        return group
 
     def toggle_red_paths(self, show: bool):
         """Show or hide red paths on the map."""
-        group_name = self.red_paths_group.get_name()
-        if show:
-            if group_name not in self.map._children:
-                self.map.add_child(self.red_paths_group)
-        else:
-            if group_name in self.map._children:
-                del self.map._children[group_name]
+        self.show_red_paths = show
+
+    def dynamic_layers(self, tolerance=0.0):
+        """
+        Return the layers to pass to st_folium's feature_group_to_add: the route,
+        and the red paths at tolerance when shown. st_folium attaches them to the
+        map, so the ones attached on the previous run are detached first.
+        """
+        for group in self.attached_layers:
+            if group.get_name() in self.map._children:
+                del self.map._children[group.get_name()]
+        self.attached_layers = [self.route_group]
+        if self.show_red_paths:
+            self.attached_layers.append(self.red_paths_layer(tolerance))
+        return self.attached_layers
 
     def clear_route(self):
-        """Clear the current route from the map."""
+        """
+        Clear the current route. st_folium attaches the route group it was given to
+        the map, so it is detached here before the base map is rendered again.
+        """
         route_group_name = self.route_group.get_name()
         if route_group_name in self.map._children:
             del self.map._children[route_group_name]
         self.route_group = folium.FeatureGroup(name="Route")
-        self.map.add_child(self.route_group)
+        self.route_view = None
+
+    def fit_route(self, coords, width=700, height=500):
+        """
+        Set route_view to the (center, zoom) that fits [lat, lon] coords into a
+        width x height pixel map. Passed to st_folium instead of fit_bounds, which
+        would change the base map.
+        """
+        lats = [c[0] for c in coords]
+        lons = [c[1] for c in coords]
+        center = ((min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2)
+        # Web Mercator: 256 * 2**zoom pixels span 360 degrees of longitude
+        lon_span = max(max(lons) - min(lons), 1e-6)
+        lat_span = max(max(lats) - min(lats), 1e-6) / math.cos(math.radians(center[0]))
+        zoom = math.log2(min(width / lon_span, height / lat_span) * 360 / 256 * 0.9)
+        self.route_view = (center, max(1, min(18, int(zoom))))
 
     def parse_line_features(self):
         """Extract edge geometries from GeoJSON features for later use."""
-        node_data = self.graph.location_data
-        for feature in self.geojson_data["features"]:
-            geom = feature.get("geometry", {})
-            if geom.get("type") != "LineString":
-                continue
-            coords = geom.get("coordinates", [])
-            if len(coords) < 2:
-                continue
-            first_lon, first_lat = coords[0]
-            last_lon, last_lat = coords[-1]
-            node1 = find_closest_node(first_lat, first_lon, node_data, threshold=5.0)
-            node2 = find_closest_node(last_lat, last_lon, node_data, threshold=5.0)
-            if node1 and node2 and node1 != node2:
-                edge_key = frozenset([node1, node2])
-                self.edge_geometry[edge_key] = geom
+        node_data = self.graph.get_spatial_index()
+        self.edge_geometry = {
+            edge_key: self.geojson_data["features"][i]["geometry"]
+            for edge_key, i in build_edge_features(self.geojson_data, node_data, threshold=5.0).items()
+        }
 
     def draw_geometry_path(self, path_edges):
         """Combine coordinates for a series of geometry edges to form a continuous path."""
@@ -305,61 +212,35 @@ class CampusMap:
                 all_coords.extend(seg_info["coords"][1:])
         return all_coords
 
-    def draw_route_from_geojson(self, route_edges):
-        """Draw a route on the map using GeoJSON edge data, with fallbacks if needed."""
+    def draw_route_from_geojson(self, route_edges, tolerance=0.0):
+        """
+        Draw a route on the map as one polyline, stitched from the edge polylines
+        resolved ahead of time (GeoJSON feature, geometry graph path or straight line)
+        and simplified to the LOD level tolerance (meters).
+        """
         self.clear_route()
         if not route_edges:
             return
 
-        all_coords_for_bounds = []
-        for i, edge in enumerate(route_edges):
-            try:
-                node1, node2 = edge.split("-")
-                edge_key = frozenset([node1, node2])
-                geometry = self.edge_geometry.get(edge_key)
-                if geometry:
-                    folium.GeoJson(
-                        geometry,
-                        style_function=lambda x: {"color": "green", "weight": 6, "opacity": 0.9},
-                        name=f"Segment {i+1}"
-                    ).add_to(self.route_group)
-                    for lon, lat in geometry["coordinates"]:
-                        all_coords_for_bounds.append([lat, lon])
-                else:
-                    # Use geometry_dijkstra as a fallback to draw the segment
-                    path_edges_geom = geometry_dijkstra(self.geometry_graph, node1, node2)
-                    if path_edges_geom:
-                        combined_coords = self.draw_geometry_path(path_edges_geom)
-                        if combined_coords:
-                            latlon_list = [[c[1], c[0]] for c in combined_coords]
-                            folium.PolyLine(
-                                locations=latlon_list,
-                                color="green",
-                                weight=6,
-                                opacity=0.9
-                            ).add_to(self.route_group)
-                            all_coords_for_bounds.extend(latlon_list)
-                        else:
-                            st.warning(f"No sub-segment coords found for fallback route {node1}-{node2}")
-                    else:
-                        st.warning(f"No direct or geometry-based path found for {edge}. Drawing straight line.")
-                        loc1 = self.graph.location_data.get(node1)
-                        loc2 = self.graph.location_data.get(node2)
-                        if not loc1 or not loc2:
-                            st.warning(f"Missing location data for '{node1}' or '{node2}'.")
-                            continue
-                        lat1, lon1 = loc1["latitude"], loc1["longitude"]
-                        lat2, lon2 = loc2["latitude"], loc2["longitude"]
-                        folium.PolyLine(
-                            locations=[[lat1, lon1], [lat2, lon2]],
-                            color="green",
-                            weight=6,
-                            opacity=0.9
-                        ).add_to(self.route_group)
-                        all_coords_for_bounds.append([lat1, lon1])
-                        all_coords_for_bounds.append([lat2, lon2])
-            except Exception as exc:
-                st.error(f"Error processing edge '{edge}': {exc}")
+        edge_ids = []
+        for edge in route_edges:
+            e = self.polylines.edge_ids.get(edge)
+            if e is None or self.polylines.kind[e] == POLYLINE_MISSING:
+                count("route_missing_edges")
+                st.warning(f"Missing location data for edge '{edge}'.")
+                continue
+            if self.polylines.kind[e] == POLYLINE_STRAIGHT:
+                count("route_straight_line_edges")
+                st.warning(f"No direct or geometry-based path found for {edge}. Drawing straight line.")
+            edge_ids.append(e)
+        all_coords_for_bounds = self.polylines.route_points(edge_ids, tolerance)
+        if len(all_coords_for_bounds) >= 2:
+            folium.PolyLine(
+                locations=all_coords_for_bounds,
+                color="green",
+                weight=6,
+                opacity=0.9
+            ).add_to(self.route_group)
 
         # Fit map to the route bounds and add start/end markers
         if len(all_coords_for_bounds) >= 2:
@@ -382,7 +263,7 @@ class CampusMap:
                     popup=end_node_name,
                     icon=folium.Icon(color='red', icon='flag')
                 ).add_to(self.route_group)
-            self.map.fit_bounds(all_coords_for_bounds)
+            self.fit_route(all_coords_for_bounds)
 
     def draw_route(self, route_edges):
         """Draw a simple straight-line route between nodes."""
@@ -412,7 +293,7 @@ class CampusMap:
                 weight=10,
                 opacity=0.7
             ).add_to(self.route_group)
-            self.map.fit_bounds(full_coords)
+            self.fit_route(full_coords)
 
 
 # ----------------------------------------------------------------------------------
@@ -420,53 +301,180 @@ class CampusMap:
 # ----------------------------------------------------------------------------------
 
 
-@st.cache_data
-def load_data(geojson_path, excel_path):
-    """Load GeoJSON data and Excel-based graph, returning both."""
+@st.cache_resource(show_spinner=False)
+def load_data(geojson_path, excel_path, file_key):
+    """
+    Load GeoJSON data and Excel-based graph, returning both.
+    Shared by every rerun and session rather than copied out of a data cache, so the
+    contraction hierarchies and route table prepared here are not pickled on each run.
+    file_key (the input files' digests, see input_key) keys the resource, so editing
+    either file loads them again.
+    """
     try:
         with open(geojson_path) as f:
             geojson_data = json.load(f)
         graph = Graph()
         graph.load_from_excel(excel_path)
+        # Build the routing arrays, contraction hierarchies and building route table once
+        prepare_hierarchies(graph.get_compact_graph(), excel_path)
+        prepare_route_table(graph, excel_path)
+        graph.get_spatial_index()
         return geojson_data, graph
     except Exception as e:
         st.error(f"Data loading error: {str(e)}")
         return None, None
 
 
+@st.cache_resource(show_spinner=False)
+def load_geometry(geojson_path, excel_path, file_key):
+    """
+    Build the snapped (and topologically noded) geometry graph, edge geometries and
+    route polylines once per process.
+    file_key (the input files' digests) keys the resource, so editing either file
+    rebuilds it; the artifacts are also persisted next to the GeoJSON file.
+    """
+    geojson_data, graph = load_data(geojson_path, excel_path, file_key)
+    if not geojson_data or not graph:
+        return None
+    cache_path = os.path.splitext(geojson_path)[0] + ".geometry.bin"
+    return GeometryArtifacts.load_or_build(geojson_data, graph.get_spatial_index(), file_key, cache_path,
+                                           noded=True, workers=None, compact=graph.get_compact_graph())
+
+
+def get_campus_map(geojson_data, graph, artifacts):
+    """
+    Return this session's CampusMap, building it (and its base layers) only on the
+    first run or when the input files change. Kept per session rather than as a
+    shared resource, since drawing a route and st_folium both modify the map.
+    The graph is compared by version, which changes whenever it is loaded again.
+    """
+    campus_map = st.session_state.get("campus_map")
+    if campus_map is None or campus_map.key != artifacts.key or campus_map.graph.version != graph.version:
+        with span("campus_map_init"):
+            campus_map = CampusMap(geojson_data, graph, artifacts)
+        with span("add_base_layers"):
+            campus_map.add_base_layers()
+        st.session_state.campus_map = campus_map
+    return campus_map
+
+
+@st.cache_resource
+def get_route_cache():
+    """Process-wide LRU cache of computed routes, shared by every session."""
+    return RouteCache(maxsize=512)
+
+
+@st.cache_resource(show_spinner=False)
+def get_voice_channel(_graph):
+    """
+    Process-wide consumer of queued voice requests (voice_channel.py), routing them
+    on a background thread. There is one channel per process whatever the input
+    files; main hands it the current graph (see VoiceChannel.use_graph).
+    """
+    return VoiceChannel(_graph, cache=get_route_cache()).start()
+
+
+@st.fragment(run_every=1.0)
+def watch_voice_channel(channel):
+    """Rerun the app once the voice channel has routed a request nobody has shown yet."""
+    if channel.has_results():
+        st.rerun()
+
+
+def apply_voice_results(channel):
+    """
+    Show the voice requests routed since the last look, in order (the last one
+    stays drawn). Each result goes to the one session that takes it first, as
+    the voice update file did before the channel existed.
+    """
+    for result in channel.take_results():
+        route = result["route"]
+        if not route.found:
+            st.error(f"No valid path found via voice for {result['start']} → {result['end']}.")
+            st.session_state.current_route_edges = []
+            st.session_state.current_route_metric = 0.0
+            st.session_state.success_message = None
+        else:
+            travel_time = route.totals.get("time", float('inf'))
+            st.session_state.current_route_edges = route.edges
+            st.session_state.current_route_metric = travel_time
+            formatted_time = format_time_in_minutes_seconds(travel_time)
+            formatted_distance = format_distance_in_feet(route.totals.get("distance", float('inf')))
+            st.session_state.success_message = (
+                f"Voice route found! Travel time: {formatted_time}, covering {formatted_distance}."
+            )
+
+
 # ----------------------------------------------------------------------------------
 # Compute Multi-Leg Route with Dijkstra
 # ----------------------------------------------------------------------------------
 
 
-def compute_full_route(graph, start, waypoints, end, metric_choice):
+def compute_full_route(graph, start, waypoints, end, metric_choice, algorithm="dijkstra"):
     """
-    Compute a full route from start to end with optional waypoints using Dijkstra.
+    Compute a full route from start to end with optional waypoints using Dijkstra
+    (or another kernel from routing.SEARCH_ALGORITHMS, e.g. "astar" or "bidirectional").
     Returns the combined edges and the total metric (time or distance).
+    Use routing.compute_route directly to also get the other metrics of the same route.
     """
-    adjacency = graph.get_connection_matrix()
-    all_edges = []
-    total_metric = 0.0
-    current = start
-    route_ok = True
-    for wp in waypoints:
-        path, metric_val = dijkstra(adjacency, current, wp, metric=metric_choice)
-        if metric_val == float('inf'):
-            route_ok = False
-            break
-        all_edges.extend(list(path.keys()))
-        total_metric += metric_val
-        current = wp
-    if route_ok:
-        path, metric_val = dijkstra(adjacency, current, end, metric=metric_choice)
-        if metric_val == float('inf'):
-            route_ok = False
-        else:
-            all_edges.extend(list(path.keys()))
-            total_metric += metric_val
-    if not route_ok:
+    route = compute_route(graph, start, waypoints, end, metric=metric_choice, algorithm=algorithm)
+    if not route.found:
         return None, float('inf')
-    return all_edges, total_metric
+    return route.edges, route.total
+
+
+# ----------------------------------------------------------------------------------
+# Debug Panel: stage timings and counters (see tracing.py)
+# ----------------------------------------------------------------------------------
+
+
+def debug_enabled():
+    """The debug panel is opt-in: open the app with ?debug=1 or set LOCAL_GRAPH_DEBUG=1."""
+    flag = st.query_params.get("debug") or os.environ.get("LOCAL_GRAPH_DEBUG", "")
+    return str(flag).lower() in ("1", "true", "yes")
+
+
+def show_debug_panel():
+    """Show the process-wide span timings, counters and route cache statistics, with exports."""
+    snap = TRACER.snapshot()
+    with st.expander("Debug: stage timings and counters", expanded=True):
+        rows = [
+            {
+                "stage": name,
+                "last ms": stats["last"] * 1000,
+                "p50 ms": stats["percentiles"].get("0.5", 0.0) * 1000,
+                "p90 ms": stats["percentiles"].get("0.9", 0.0) * 1000,
+                "p99 ms": stats["percentiles"].get("0.99", 0.0) * 1000,
+                "count": stats["count"],
+            }
+            for name, stats in snap["spans"].items()
+        ]
+        st.dataframe(rows, hide_index=True)
+        st.json({"counters": snap["counters"], "route_cache": get_route_cache().stats()})
+        col_json, col_prom = st.columns(2)
+        with col_json:
+            st.download_button("Download JSON", json.dumps(snap, indent=2), "local_graph_trace.json",
+                               mime="application/json")
+        with col_prom:
+            st.download_button("Download Prometheus", TRACER.to_prometheus(), "local_graph.prom", mime="text/plain")
+
+
+def export_metrics():
+    """
+    Write the tracer's snapshot after every rerun when LOCAL_GRAPH_METRICS_FILE is
+    set: a .json path gets JSON, anything else the Prometheus text format (point
+    it at node_exporter's textfile directory, e.g. /var/lib/node_exporter/local_graph.prom).
+    """
+    path = os.environ.get("LOCAL_GRAPH_METRICS_FILE")
+    if not path:
+        return
+    try:
+        if path.endswith(".json"):
+            TRACER.write_json(path)
+        else:
+            TRACER.write_prometheus(path)
+    except OSError as e:
+        print(f"Warning: could not write metrics to {path}: {e}")
 
 
 # ----------------------------------------------------------------------------------
@@ -476,6 +484,15 @@ def compute_full_route(graph, start, waypoints, end, metric_choice):
 
 def main():
     """Main function to run the Streamlit application."""
+    with span("rerun"):
+        render_app()
+    if debug_enabled():
+        show_debug_panel()
+    export_metrics()
+
+
+def render_app():
+    """Render one run of the app (timed as the "rerun" span by main)."""
     st.title("The Local Graph")
 
     # Initialize session state variables
@@ -487,50 +504,33 @@ def main():
         st.session_state.success_message = None
     if 'show_red_paths' not in st.session_state:
         st.session_state.show_red_paths = False
+    if 'map_zoom' not in st.session_state:
+        st.session_state.map_zoom = 15
 
-    geojson_data, graph = load_data("qgis_1.json", "compendium.xlsx")
+    with span("input_key"):
+        file_key = input_key("qgis_1.json", "compendium.xlsx")
+    with span("load_data"):
+        geojson_data, graph = load_data("qgis_1.json", "compendium.xlsx", file_key)
     if not geojson_data or not graph:
         return
 
-    campus_map = CampusMap(geojson_data, graph)
-    campus_map.add_base_layers()
+    with span("load_geometry"):
+        artifacts = load_geometry("qgis_1.json", "compendium.xlsx", file_key)
+    campus_map = get_campus_map(geojson_data, graph, artifacts)
     campus_map.toggle_red_paths(st.session_state.show_red_paths)
 
-    # Check for voice update input
-    voice_data = load_voice_update()
-    if voice_data:
-        start_from_voice = voice_data.get("start")
-        end_from_voice = voice_data.get("end")
-        confirmed = voice_data.get("confirmed", False)
-    else:
-        start_from_voice = None
-        end_from_voice = None
-        confirmed = False
-
-    if start_from_voice and end_from_voice and confirmed:
-        # Calculate route using voice data
-        route_edges, travel_time = compute_full_route(
-            graph, start_from_voice, [], end_from_voice, metric_choice="time"
-        )
-        _, travel_distance = compute_full_route(
-            graph, start_from_voice, [], end_from_voice, metric_choice="distance"
-        )
-        if route_edges is None or travel_time == float('inf'):
-            st.error(f"No valid path found via voice for {start_from_voice} → {end_from_voice}.")
-            st.session_state.current_route_edges = []
-            st.session_state.current_route_metric = 0.0
-            st.session_state.success_message = None
-        else:
-            st.session_state.current_route_edges = route_edges
-            st.session_state.current_route_metric = travel_time
-            formatted_time = format_time_in_minutes_seconds(travel_time)
-            formatted_distance = format_distance_in_feet(travel_distance)
-            st.session_state.success_message = (
-                f"Voice route found! Travel time: {formatted_time}, covering {formatted_distance}."
-            )
-        save_voice_update({"start": None, "end": None, "confirmed": False})
+    # Voice requests are routed off the rerun path by the channel's thread
+    channel = get_voice_channel(graph)
+    if channel.graph.version != graph.version:
+        channel.use_graph(graph)
+    with span("voice_update"):
+        apply_voice_results(channel)
+    watch_voice_channel(channel)
 
-    campus_map.draw_route_from_geojson(st.session_state.current_route_edges)
+    # Level of detail for the zoom the map was last shown at (simplification below one pixel)
+    tolerance = lod_for_zoom(st.session_state.map_zoom, campus_map.map.location[0])
+    with span("draw_route"):
+        campus_map.draw_route_from_geojson(st.session_state.current_route_edges, tolerance)
 
     # --- Add blue markers for each optional waypoint ---
     if 'selected_waypoints' in st.session_state:
@@ -543,12 +543,20 @@ def main():
                     icon=folium.Icon(color="blue", icon="info-sign")
                 ).add_to(campus_map.route_group)
 
-    st_folium(
-        campus_map.map,
-        width=700,
-        height=500,
-        key="main_map"
-    )
+    # Only the dynamic layers change between reruns; the base map stays mounted
+    center, zoom = campus_map.route_view or (None, None)
+    with span("st_folium"):
+        map_state = st_folium(
+            campus_map.map,
+            width=700,
+            height=500,
+            key="main_map",
+            feature_group_to_add=campus_map.dynamic_layers(tolerance),
+            center=center,
+            zoom=zoom
+        )
+    if map_state and map_state.get("zoom"):
+        st.session_state.map_zoom = map_state["zoom"]
 
     if st.session_state.success_message:
         st.success(st.session_state.success_message)
@@ -588,6 +596,10 @@ def main():
         options=filtered_waypoint_buildings,
         key="selected_waypoints"
     )
+    optimize_order = st.checkbox(
+        "Optimize waypoint order (visit them in the fastest order instead)",
+        key="optimize_waypoint_order"
+    )
 
     st.subheader("Calculate Path")
     col_find, col_clear, col_toggle = st.columns(3)
@@ -596,26 +608,28 @@ def main():
             if not start_building or not end_building:
                 st.error("Please select valid Start and End buildings.")
             else:
-                route_edges_time, travel_time = compute_full_route(
-                    graph, start_building, selected_waypoints, end_building, metric_choice="time"
-                )
-                route_edges_dist, travel_distance = compute_full_route(
-                    graph, start_building, selected_waypoints, end_building, metric_choice="distance"
-                )
-                if route_edges_time is None or travel_time == float('inf'):
+                with span("compute_route"):
+                    route = compute_route(
+                        graph, start_building, selected_waypoints, end_building, metric="time", algorithm="table",
+                        cache=get_route_cache(), optimize_order=optimize_order
+                    )
+                if not route.found:
                     st.error("No valid path found.")
                     st.session_state.current_route_edges = []
                     st.session_state.current_route_metric = 0.0
                     st.session_state.success_message = None
                 else:
-                    st.session_state.current_route_edges = route_edges_time
+                    travel_time = route.totals.get("time", float('inf'))
+                    st.session_state.current_route_edges = route.edges
                     st.session_state.current_route_metric = travel_time
                     formatted_time = format_time_in_minutes_seconds(travel_time)
-                    formatted_distance = format_distance_in_feet(travel_distance)
+                    formatted_distance = format_distance_in_feet(route.totals.get("distance", float('inf')))
                     st.session_state.success_message = (
                         f"Route found! Travel time: {formatted_time}, Distance: {formatted_distance}.  \n"
                         f"**Zoom in on the map to see the route.**"
                     )
+                    if optimize_order and len(route.waypoints) > 1:
+                        st.session_state.success_message += f"  \nVisiting order: {' → '.join(route.waypoints)}"
     with col_clear:
         if st.button("Clear Path"):
             st.session_state.current_route_edges = []
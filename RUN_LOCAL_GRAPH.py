@@ -31,6 +31,7 @@ def install_dependencies():
         ("streamlit", "streamlit"),
         ("folium", "folium"),
         ("streamlit_folium", "streamlit-folium"),
+        ("numpy", "numpy"),
         ("pandas", "pandas"),
         ("openpyxl", "openpyxl"),
     ]
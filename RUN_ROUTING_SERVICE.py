@@ -0,0 +1,42 @@
+
+# The Local Graph, RUN_ROUTING_SERVICE file
+# Handles installation of dependencies and launches the headless routing service (routing_service.py)
+# Pass --host, --port and --workers through to the service, e.g. python RUN_ROUTING_SERVICE.py --port 8502
+
+import multiprocessing
+import os
+import sys
+
+from RUN_LOCAL_GRAPH import install_package
+
+
+def install_dependencies():
+    # The service needs only the graph loading dependencies, not Streamlit or folium
+    # Format: (module name, pip package name)
+    packages_to_install = [
+        ("numpy", "numpy"),
+        ("pandas", "pandas"),
+        ("openpyxl", "openpyxl"),
+    ]
+
+    for module_name, pip_name in packages_to_install:
+        install_package(module_name, pip_name)
+
+
+def main():
+    # First, install dependencies
+    install_dependencies()
+
+    # Change the current working directory to the parent folder, where the data files live
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(base_dir)
+
+    # Import the service after installing its dependencies
+    import routing_service
+
+    routing_service.main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
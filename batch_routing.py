@@ -0,0 +1,245 @@
+# The Local Graph, Batch Routing Module
+# Command line tool computing routes for many origin-destination pairs (CSV or JSON Lines in, same out).
+#
+#   python batch_routing.py pairs.csv -o routes.csv
+#   python batch_routing.py pairs.jsonl --output-format jsonl --metric distance --workers 4 < pairs.jsonl
+#
+# Input rows need an origin and a destination column/key ("start"/"end" are accepted too).
+# Any other columns are passed through to the output unchanged.
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import math
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from edgegraph import Graph
+from route_table import prepare_route_table
+from routing import accumulate_metrics
+from waypoint_order import terminal_trees
+from worker_pool import init_worker, worker_state
+
+OUTPUT_METRICS = ('time', 'distance', 'gain', 'loss')
+ORIGIN_KEYS = ('origin', 'start', 'source')
+DESTINATION_KEYS = ('destination', 'end', 'target')
+
+
+# ----------------------------------------------------------------------------------
+# Reading and writing pairs
+# ----------------------------------------------------------------------------------
+
+
+def _pick(row, keys):
+    """Returns the value of the first of keys present in row (None if none is)."""
+    for key in keys:
+        if row.get(key) not in (None, ""):
+            return str(row[key]).strip()
+    return None
+
+
+def read_pairs(stream, fmt):
+    """Yields (row, origin, destination) for every record of a CSV or JSON Lines stream."""
+    if fmt == "csv":
+        rows = csv.DictReader(stream)
+    else:
+        rows = (json.loads(line) for line in stream if line.strip())
+    for row in rows:
+        yield row, _pick(row, ORIGIN_KEYS), _pick(row, DESTINATION_KEYS)
+
+
+def chunks_of(iterable, size):
+    """Yields lists of up to size consecutive items."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ResultWriter:
+    """Writes result dicts as CSV (header from the first row) or JSON Lines."""
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self.csv_writer = None
+
+    def write(self, record):
+        if self.fmt == "jsonl":
+            self.stream.write(json.dumps(record) + "\n")
+            return
+        record = dict(record, edges=" ".join(record["edges"]))
+        if self.csv_writer is None:
+            self.csv_writer = csv.DictWriter(self.stream, fieldnames=list(record), extrasaction="ignore")
+            self.csv_writer.writeheader()
+        self.csv_writer.writerow(record)
+
+
+# ----------------------------------------------------------------------------------
+# Worker side: one shortest path tree per origin
+# ----------------------------------------------------------------------------------
+
+
+def _origin_task(origin, destinations, metric, with_edges):
+    """
+    Answers every destination of one origin from a single one-to-all search
+    (or the origin's row of the route table). Returns one result dict per
+    destination, in order.
+    """
+    compact = worker_state("batch_routing")
+    source = compact.ids.get(origin)
+    if source is None:
+        return [_not_found(f"unknown origin {origin!r}") for _ in destinations]
+    (dist, prev_edge), = terminal_trees(compact, [source], metric)
+    results = []
+    for destination in destinations:
+        target = compact.ids.get(destination)
+        if target is None:
+            results.append(_not_found(f"unknown destination {destination!r}"))
+            continue
+        if dist[target] == math.inf:
+            results.append(_not_found("no path"))
+            continue
+        edge_ids = compact.unwind(prev_edge, source, target)
+        totals = accumulate_metrics(compact, edge_ids)
+        result = {"found": True, "error": ""}
+        result.update({m: totals.get(m) for m in OUTPUT_METRICS})
+        result["edges"] = [compact.edge_key(e) for e in edge_ids] if with_edges else []
+        results.append(result)
+    return results
+
+
+def _not_found(error):
+    """Result dict for a pair without a route."""
+    result = {"found": False, "error": error}
+    result.update({m: None for m in OUTPUT_METRICS})
+    result["edges"] = []
+    return result
+
+
+# ----------------------------------------------------------------------------------
+# Driver
+# ----------------------------------------------------------------------------------
+
+
+def route_pairs(compact, pairs, metric='time', workers=None, chunk_size=5000, with_edges=True):
+    """
+    Routes an iterable of (row, origin, destination) and yields (row, result) in
+    input order. Pairs are read chunk_size at a time and grouped by origin, and
+    each origin's group is one task in a process pool (workers=1 runs in this
+    process). At most a few chunks are in flight, so memory stays bounded
+    however long the input is.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max(2, workers)
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=("batch_routing", compact))
+    else:
+        init_worker("batch_routing", compact)
+
+    def submit(chunk):
+        groups = {}
+        for position, (_, origin, destination) in enumerate(chunk):
+            groups.setdefault(origin, []).append((position, destination))
+        tasks = []
+        for origin, members in groups.items():
+            args = (origin, [d for _, d in members], metric, with_edges)
+            if pool is None:
+                tasks.append((members, _origin_task(*args)))
+            else:
+                tasks.append((members, pool.submit(_origin_task, *args)))
+        return chunk, tasks
+
+    def collect(chunk, tasks):
+        results = [None] * len(chunk)
+        for members, outcome in tasks:
+            group_results = outcome if pool is None else outcome.result()
+            for (position, _), result in zip(members, group_results):
+                results[position] = result
+        for (row, _, _), result in zip(chunk, results):
+            yield row, result
+
+    pending = deque()
+    try:
+        for chunk in chunks_of(pairs, chunk_size):
+            pending.append(submit(chunk))
+            if len(pending) >= max_in_flight:
+                yield from collect(*pending.popleft())
+        while pending:
+            yield from collect(*pending.popleft())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def _format_for(path, explicit):
+    """Picks "csv" or "jsonl" from an explicit choice or the file extension."""
+    if explicit:
+        return explicit
+    return "jsonl" if path and os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson", ".json") else "csv"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute routes for many origin-destination pairs.")
+    parser.add_argument("input", nargs="?", default="-", help="CSV or JSON Lines file of pairs ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="output file ('-' for stdout)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="input format (default: from the extension)")
+    parser.add_argument("--output-format", choices=("csv", "jsonl"),
+                        help="output format (default: from the extension)")
+    parser.add_argument("--metric", default="time", help="metric to optimize (time, distance, ...)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="pairs grouped by origin at a time")
+    parser.add_argument("--no-edges", action="store_true", help="leave the edge list out of the output")
+    parser.add_argument("--excel", default="compendium.xlsx")
+    args = parser.parse_args(argv)
+
+    # Progress messages go to stderr so they never mix with results written to stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        graph = Graph()
+        graph.load_from_excel(args.excel)
+        compact = graph.get_compact_graph()
+        if args.metric not in compact.weights:
+            parser.error(f"unknown metric {args.metric!r}; expected one of {sorted(compact.weights)}")
+        prepare_route_table(graph, args.excel)
+
+    in_fmt = _format_for(args.input if args.input != "-" else None, args.format)
+    out_fmt = _format_for(args.output if args.output != "-" else None, args.output_format)
+    source = sys.stdin if args.input == "-" else open(args.input, "r", newline="", encoding="utf-8-sig")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    wrapper = None
+    if out_fmt == "csv" and target is sys.stdout:
+        # csv writes its own \r\n line ends; write them to stdout's buffer untranslated
+        sys.stdout.flush()
+        target = wrapper = io.TextIOWrapper(sys.stdout.buffer, newline="", encoding="utf-8")
+    writer = ResultWriter(target, out_fmt)
+
+    count = found = 0
+    try:
+        for row, result in route_pairs(compact, read_pairs(source, in_fmt), args.metric, args.workers,
+                                       args.chunk_size, not args.no_edges):
+            record = {k: v for k, v in row.items() if k not in result}
+            record.update(result)
+            writer.write(record)
+            count += 1
+            found += result["found"]
+    finally:
+        target.flush()
+        if wrapper is not None:
+            wrapper.detach()  # hands sys.stdout's buffer back open
+        if source is not sys.stdin:
+            source.close()
+        if args.output != "-":
+            target.close()
+    print(f"Routed {count} pairs ({found} found).", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
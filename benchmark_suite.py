@@ -0,0 +1,362 @@
+# The Local Graph, Benchmark Suite Module
+# Times loading, geometry building, snapping and routing on deterministic synthetic campuses of several sizes.
+#
+#   python benchmark_suite.py --sizes x1 x10 --out bench.json
+#   python benchmark_suite.py --sizes x1 x10 --compare bench.json --threshold 0.25
+#
+# Synthetic campuses are grids of junctions with every few nodes a building, written in the same
+# workbook layout as compendium.xlsx (one node x node matrix per metric plus coords and node_type
+# sheets) and a matching GeoJSON file of LineStrings. They are cached in --workdir by size and seed.
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+from openpyxl import Workbook
+
+from compact_graph import CompactGraph
+from contraction_hierarchy import prepare_hierarchies
+from dijkstras_algorithm import dijkstra
+from edgegraph import ExcelGraphIO, Graph
+from geometry_graph import GeometryGraph, PathNetwork, find_closest_node, geometry_dijkstra
+from route_table import prepare_route_table
+from routing import compute_route
+
+# Grid side per size; x1 is about the size of the real campus graph (57 nodes)
+SIZES = {"x1": 8, "x10": 24, "x100": 76}
+CAMPUS_CENTER = (38.031, -120.3877)
+SPACING_M = 40.0
+WALKING_SPEED = 1.4  # m/s
+METRICS = ('time', 'distance', 'gain', 'loss')
+GENERATOR_VERSION = 1
+MIN_COMPARE_RUNS = 3  # fewer timed runs than this are too noisy to flag as a regression
+
+
+# ----------------------------------------------------------------------------------
+# Synthetic campus generator
+# ----------------------------------------------------------------------------------
+
+
+def generate_campus(side, seed=0, building_every=5, drop_fraction=0.1):
+    """
+    Builds a side x side grid campus deterministically from seed.
+    Returns (nodes, edges, geojson_data): nodes maps name -> (lat, lon,
+    elevation, is_building); edges maps (u, v) -> {metric: value} in both
+    directions; geojson_data holds one wiggly LineString per street.
+    """
+    rng = random.Random(seed)
+    lat_step = SPACING_M / 111320.0
+    lon_step = SPACING_M / (111320.0 * math.cos(math.radians(CAMPUS_CENTER[0])))
+    origin_lat = CAMPUS_CENTER[0] - lat_step * side / 2
+    origin_lon = CAMPUS_CENTER[1] - lon_step * side / 2
+
+    names = {}
+    nodes = {}
+    for r in range(side):
+        for c in range(side):
+            index = r * side + c
+            is_building = index % building_every == building_every - 1
+            name = f"B{index}" if is_building else f"J{index}"
+            names[r, c] = name
+            lat = origin_lat + r * lat_step + rng.uniform(-0.2, 0.2) * lat_step
+            lon = origin_lon + c * lon_step + rng.uniform(-0.2, 0.2) * lon_step
+            elevation = 10 * math.sin(r / 3.0) + 6 * math.cos(c / 4.0) + rng.uniform(-1, 1)
+            nodes[name] = (round(lat, 6), round(lon, 6), elevation, is_building)
+
+    # Grid streets, with a fraction dropped where both ends keep at least two streets
+    streets = [((r, c), (r, c + 1)) for r in range(side) for c in range(side - 1)]
+    streets += [((r, c), (r + 1, c)) for r in range(side - 1) for c in range(side)]
+    degree = {cell: 0 for cell in names}
+    for a, b in streets:
+        degree[a] += 1
+        degree[b] += 1
+    kept = []
+    for a, b in streets:
+        if rng.random() < drop_fraction and degree[a] > 2 and degree[b] > 2:
+            degree[a] -= 1
+            degree[b] -= 1
+            continue
+        kept.append((names[a], names[b]))
+
+    edges = {}
+    features = []
+    for u, v in kept:
+        lat_u, lon_u, elev_u, _ = nodes[u]
+        lat_v, lon_v, elev_v, _ = nodes[v]
+        # A few interior vertices offset sideways, like digitized paths
+        coords = [[lon_u, lat_u]]
+        for t in (0.25, 0.5, 0.75):
+            offset = rng.uniform(-0.04, 0.04)
+            coords.append([round(lon_u + t * (lon_v - lon_u) - offset * (lat_v - lat_u), 6),
+                           round(lat_u + t * (lat_v - lat_u) + offset * (lon_v - lon_u), 6)])
+        coords.append([lon_v, lat_v])
+        features.append({"type": "Feature", "properties": {"name": f"{u}-{v}"},
+                         "geometry": {"type": "LineString", "coordinates": coords}})
+
+        length_m = sum(
+            _ground_distance(coords[i][1], coords[i][0], coords[i + 1][1], coords[i + 1][0])
+            for i in range(len(coords) - 1)
+        )
+        climb = elev_v - elev_u
+        for a, b, rise in ((u, v, climb), (v, u, -climb)):
+            edges[a, b] = {
+                'time': round(length_m / WALKING_SPEED * (1 + max(rise, 0) / 20), 1),
+                'distance': round(length_m / 1000, 3),
+                'gain': round(max(rise, 0)),
+                'loss': round(max(-rise, 0)),
+            }
+    return nodes, edges, {"type": "FeatureCollection", "features": features}
+
+
+def _ground_distance(lat1, lon1, lat2, lon2):
+    """Equirectangular distance in meters, plenty for generating test data."""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    return 6371000 * math.hypot(x, math.radians(lat2 - lat1))
+
+
+def write_campus(nodes, edges, geojson_data, excel_path, geojson_path):
+    """Writes a generated campus as a compendium-style workbook plus a GeoJSON file."""
+    names = list(nodes)
+    column = {name: i for i, name in enumerate(names)}
+    rows = {}
+    for (u, v), metrics in edges.items():
+        rows.setdefault(u, []).append((column[v], metrics))
+
+    # write_only streams rows, which keeps large mostly-empty matrices fast to write
+    workbook = Workbook(write_only=True)
+    for metric in METRICS:
+        sheet = workbook.create_sheet(metric)
+        sheet.append([metric] + names)
+        for name in names:
+            values = [None] * len(names)
+            for j, metrics in rows.get(name, ()):
+                values[j] = metrics[metric]
+            sheet.append([name] + values)
+    coords = workbook.create_sheet("coords")
+    coords.append(["node", "coords"])
+    node_type = workbook.create_sheet("node_type")
+    node_type.append(["node", "is_building"])
+    for name, (lat, lon, _, is_building) in nodes.items():
+        coords.append([name, f"{lat}, {lon}"])
+        node_type.append([name, is_building])
+    workbook.save(excel_path)
+
+    with open(geojson_path, "w") as f:
+        json.dump(geojson_data, f)
+
+
+def campus_files(size, workdir, seed=0):
+    """Returns (excel_path, geojson_path) for a size, generating the files if they are not cached yet."""
+    side = SIZES[size]
+    base = os.path.join(workdir, f"campus_{size}_s{seed}_v{GENERATOR_VERSION}")
+    excel_path, geojson_path = base + ".xlsx", base + ".json"
+    if not (os.path.exists(excel_path) and os.path.exists(geojson_path)):
+        os.makedirs(workdir, exist_ok=True)
+        print(f"Generating {size} campus ({side}x{side} grid)...", file=sys.stderr)
+        write_campus(*generate_campus(side, seed), excel_path, geojson_path)
+    return excel_path, geojson_path
+
+
+# ----------------------------------------------------------------------------------
+# Timing
+# ----------------------------------------------------------------------------------
+
+
+def time_call(fn, repeat=3, ops=1, warmup=0):
+    """
+    Runs fn() warmup times untimed, then repeat times timed, and returns timing
+    statistics in seconds. ops is the number of operations one call performs
+    (queries, routes); per_op_us divides the median by it.
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {"runs": repeat, "ops": ops, "min": min(times), "median": median,
+            "mean": statistics.fmean(times), "per_op_us": median / ops * 1e6}
+
+
+def run_size(size, workdir, repeat=3, queries=200, seed=0):
+    """Runs every benchmark on one synthetic campus size and returns {benchmark: stats}."""
+    excel_path, geojson_path = campus_files(size, workdir, seed)
+    with open(geojson_path, "r") as f:
+        geojson_data = json.load(f)
+    rng = random.Random(seed)
+    results = {}
+
+    def bench(name, fn, ops=1, runs=repeat, warmup=0):
+        results[name] = time_call(fn, runs, ops, warmup)
+        print(f"  {size:>5} {name:<26} {results[name]['median'] * 1000:10.2f} ms", file=sys.stderr)
+
+    def load(use_snapshot):
+        graph = Graph()
+        ExcelGraphIO.load_graph_from_excel(graph, excel_path, use_snapshot=use_snapshot)
+        return graph
+
+    # The loaders print a line per load; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        bench("load_excel", lambda: load(False))
+        # The first snapshot load parses the workbook and writes the snapshot
+        bench("load_snapshot", lambda: load(True), warmup=1)
+        graph = load(True)
+    bench("compact_graph", lambda: CompactGraph.from_graph(graph))
+    compact = graph.get_compact_graph()
+    index = graph.get_spatial_index()
+
+    bench("geometry_graph", lambda: GeometryGraph(index, geojson_data))
+    bench("path_network", lambda: PathNetwork.build(geojson_data, index))
+    geometry_graph = GeometryGraph(index, geojson_data)
+
+    names = list(compact.names)
+    buildings = [n for n, is_bldg in graph.node_type.items() if is_bldg]
+    lats = [graph.location_data[n]["latitude"] for n in names]
+    lons = [graph.location_data[n]["longitude"] for n in names]
+    points = [(rng.uniform(min(lats), max(lats)), rng.uniform(min(lons), max(lons))) for _ in range(queries)]
+    pairs = [(rng.choice(names), rng.choice(names)) for _ in range(queries)]
+    geometry_nodes = list(geometry_graph.adj)
+    geometry_pairs = [(rng.choice(geometry_nodes), rng.choice(geometry_nodes)) for _ in range(queries)]
+    route_count = max(1, queries // 4)
+    routes = [(rng.choice(buildings), rng.sample(buildings, 3), rng.choice(buildings)) for _ in range(route_count)]
+
+    bench("find_closest_node", lambda: [find_closest_node(lat, lon, index, 25.0) for lat, lon in points], queries)
+    bench("find_closest_node_linear",
+          lambda: [find_closest_node(lat, lon, graph.location_data, 25.0) for lat, lon in points], queries)
+    bench("dijkstra", lambda: [dijkstra(compact, a, b, 'time') for a, b in pairs], queries)
+    bench("geometry_dijkstra", lambda: [geometry_dijkstra(geometry_graph, a, b) for a, b in geometry_pairs], queries)
+
+    # compute_full_route in MAIN wraps routing.compute_route; call the latter to avoid importing Streamlit
+    def full_routes(algorithm):
+        return [compute_route(compact, s, w, e, 'time', algorithm) for s, w, e in routes]
+
+    bench("compute_full_route", lambda: full_routes('dijkstra'), route_count)
+    with contextlib.redirect_stdout(io.StringIO()):
+        prepare_runs = max(MIN_COMPARE_RUNS, repeat)
+        bench("prepare_hierarchies", lambda: _fresh_hierarchies(compact, excel_path), runs=prepare_runs)
+        bench("prepare_route_table", lambda: _fresh_route_table(graph, excel_path), runs=prepare_runs)
+    bench("compute_full_route_ch", lambda: full_routes('ch'), route_count)
+    bench("compute_full_route_table", lambda: full_routes('table'), route_count)
+    return results
+
+
+def _fresh_hierarchies(compact, excel_path):
+    """Builds the hierarchies from scratch (removing any saved copy first)."""
+    from contraction_hierarchy import hierarchy_path
+    for metric in ('time', 'distance'):
+        if os.path.exists(hierarchy_path(excel_path, metric)):
+            os.remove(hierarchy_path(excel_path, metric))
+    prepare_hierarchies(compact, excel_path)
+
+
+def _fresh_route_table(graph, excel_path):
+    """Builds the building route table from scratch (removing any saved copy first)."""
+    from route_table import route_table_path
+    if os.path.exists(route_table_path(excel_path)):
+        os.remove(route_table_path(excel_path))
+    prepare_route_table(graph, excel_path, workers=1)
+
+
+# ----------------------------------------------------------------------------------
+# Baseline comparison
+# ----------------------------------------------------------------------------------
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compares best-of-run (min) times against a baseline report; the minimum is
+    far less sensitive to scheduler noise than the median. Returns a list of
+    (size, benchmark, baseline_s, current_s, ratio, status) rows, where status is
+    "REGRESSION" when current is more than threshold slower, "faster" when it is
+    more than threshold faster, and "ok" otherwise. A benchmark with fewer than
+    MIN_COMPARE_RUNS runs on either side is only reported, as "few runs".
+    """
+    rows = []
+    for size, benches in results["results"].items():
+        for name, stats in benches.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if base is None:
+                rows.append((size, name, None, stats["min"], None, "new"))
+                continue
+            ratio = stats["min"] / base["min"] if base["min"] > 0 else math.inf
+            if min(stats["runs"], base.get("runs", 1)) < MIN_COMPARE_RUNS:
+                status = "few runs"
+            else:
+                status = "REGRESSION" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else "ok"
+            rows.append((size, name, base["min"], stats["min"], ratio, status))
+    return rows
+
+
+def print_comparison(rows, file=None):
+    """Prints compare() rows as a table (to stdout unless file is given)."""
+    print(f"{'size':>5}  {'benchmark':<26} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}  status", file=file)
+    for size, name, base, current, ratio, status in rows:
+        base_ms = f"{base * 1000:12.2f}" if base is not None else f"{'-':>12}"
+        ratio_s = f"{ratio:7.2f}" if ratio is not None else f"{'-':>7}"
+        print(f"{size:>5}  {name:<26} {base_ms} {current * 1000:12.2f} {ratio_s}  {status}", file=file)
+
+
+# ----------------------------------------------------------------------------------
+# Entry point
+# ----------------------------------------------------------------------------------
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark The Local Graph on synthetic campuses.")
+    parser.add_argument("--sizes", nargs="+", default=["x1", "x10"], choices=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark")
+    parser.add_argument("--queries", type=int, default=200, help="queries per query benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=".benchmarks", help="where generated campuses are cached")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown flagged as a regression")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "queries": args.queries,
+            "seed": args.seed,
+            "generator_version": GENERATOR_VERSION,
+        },
+        "results": {},
+    }
+    for size in args.sizes:
+        report["results"][size] = run_size(size, args.workdir, args.repeat, args.queries, args.seed)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.out}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold)
+        # Without --out stdout carries the JSON report, so keep it parseable
+        print_comparison(rows, file=None if args.out else sys.stderr)
+        regressions = [row for row in rows if row[-1] == "REGRESSION"]
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}.", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# The Local Graph, Binary Store Module
+# Compact on-disk container for typed arrays plus a small JSON header.
+# Used for graph snapshots and other precomputed routing artifacts.
+
+import contextlib
+import functools
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+
+# ----------------------------------------------------------------------------------
+# File Layout
+# ----------------------------------------------------------------------------------
+#   MAGIC (8 bytes) | header length (uint32, little endian) | header (UTF-8 JSON)
+#   | zero padding to an 8 byte boundary | raw array data
+#
+# The header holds caller metadata under "meta" and an "arrays" table describing
+# the name, typecode, byte offset and length of every stored array.
+
+MAGIC = b"LGBIN001"
+_ALIGN = 8
+
+
+def file_sha256(path):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=64)
+def _stamped_sha256(path, mtime_ns, size):
+    return file_sha256(path)
+
+
+def cached_file_sha256(path):
+    """file_sha256, recomputed only when the file's mtime or size changes."""
+    stat = os.stat(path)
+    return _stamped_sha256(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="w", sync=False):
+    """
+    Context manager yielding a file opened with mode on a temporary name next
+    to path, renamed into place when the block completes (and removed if it
+    raises), so readers never see a partial file. The temporary name starts
+    with a dot, so directory scanners can skip it. With sync, the data is
+    flushed to disk before the rename.
+    """
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{name}.tmp{os.getpid()}.{threading.get_ident()}")
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def _aligned(offset):
+    """Round an offset up to the next multiple of the alignment."""
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_bundle(path, meta, arrays):
+    """
+    Writes a metadata dict and a mapping of name -> array.array to path.
+    The file is written through atomic_write, so readers never see a partially
+    written bundle.
+    """
+    table = []
+    offset = 0
+    for name, values in arrays.items():
+        offset = _aligned(offset)
+        nbytes = len(values) * values.itemsize
+        table.append({"name": name, "typecode": values.typecode, "offset": offset, "length": len(values)})
+        offset += nbytes
+
+    header = json.dumps({"byteorder": sys.byteorder, "meta": meta, "arrays": table}).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + 4 + len(header))
+
+    with atomic_write(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        f.write(b"\0" * (data_start - f.tell()))
+        for entry, values in zip(table, arrays.values()):
+            f.write(b"\0" * (data_start + entry["offset"] - f.tell()))
+            values.tofile(f)
+
+
+def read_bundle_meta(path):
+    """Reads only the metadata dict of a bundle (cheap validity checks)."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a Local Graph binary bundle")
+        (header_len,) = struct.unpack("<I", f.read(4))
+        return json.loads(f.read(header_len).decode("utf-8"))["meta"]
+
+
+def read_bundle(path):
+    """
+    Memory-maps a bundle and returns (meta, arrays) where arrays maps each
+    stored name to an array.array.
+    """
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a Local Graph binary bundle")
+            (header_len,) = struct.unpack_from("<I", mm, len(MAGIC))
+            header_start = len(MAGIC) + 4
+            header = json.loads(mm[header_start:header_start + header_len].decode("utf-8"))
+            data_start = _aligned(header_start + header_len)
+
+            arrays = {}
+            for entry in header["arrays"]:
+                values = array(entry["typecode"])
+                start = data_start + entry["offset"]
+                values.frombytes(mm[start:start + entry["length"] * values.itemsize])
+                if header["byteorder"] != sys.byteorder:
+                    values.byteswap()
+                arrays[entry["name"]] = values
+    return header["meta"], arrays
@@ -0,0 +1,552 @@
+# The Local Graph, Compact Graph Module
+# Array-backed (CSR) view of Graph.get_connection_matrix() used by the routing code.
+
+import hashlib
+import heapq
+import json
+import math
+import threading
+from array import array
+
+import numpy as np
+
+from geodesy import haversine_array, haversine_distance
+
+INF = math.inf
+
+
+class ConnectionMatrix(dict):
+    """
+    The dict returned by Graph.get_connection_matrix().
+    Behaves exactly like the plain {node: connections} mapping, but remembers the
+    Graph it came from so routing code can reuse that graph's CompactGraph.
+    """
+    def __init__(self, graph, *args):
+        super().__init__(*args)
+        self.graph = graph
+
+
+class CompactGraph:
+    """
+    Array-backed directed graph with integer node ids.
+
+    Stores:
+      - names: Node names indexed by id (ids maps names back to ids).
+      - offsets/targets: CSR adjacency; the out-edges of node u are the edge ids
+        offsets[u] .. offsets[u + 1] - 1, and targets[e] is the head of edge e.
+      - sources: The tail of every edge (used when unwinding paths).
+      - rev_offsets/rev_edges: Reverse CSR; the edges entering node v are
+        rev_edges[rev_offsets[v]:rev_offsets[v + 1]] (forward edge ids, so the
+        reverse graph shares the weight arrays).
+      - weights: One contiguous array per metric aligned with targets. Edges that
+        lack a metric store inf, which the search kernels never relax.
+      - latitude/longitude: Node coordinates (nan when unknown), used by A*.
+      - heuristic: Per-metric (scale, slack) turning great-circle kilometers into
+        a lower bound on that metric (see _heuristic_bounds).
+
+    Search buffers are allocated once per thread and reset only where touched,
+    so repeated queries do not allocate graph-sized dicts.
+    """
+    def __init__(self, names, offsets, targets, weights, latitude=None, longitude=None):
+        self.names = list(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.sources = array('i', [0]) * len(targets)
+        for u in range(len(self.names)):
+            for e in range(offsets[u], offsets[u + 1]):
+                self.sources[e] = u
+        n = len(self.names)
+        self.rev_offsets, self.rev_edges = self._reverse_csr(n)
+        self.latitude = latitude if latitude is not None else array('d', [math.nan]) * n
+        self.longitude = longitude if longitude is not None else array('d', [math.nan]) * n
+        self.heuristic = self._heuristic_bounds()
+        self.hierarchies = {}     # metric -> ContractionHierarchy, see contraction_hierarchy.py
+        self.route_table = None   # RouteTable of building-to-all trees, see route_table.py
+        self.last_settled = 0
+        self._fingerprint = None
+        self._local = threading.local()
+
+    @classmethod
+    def from_connection_matrix(cls, matrix, metrics=None, location_data=None):
+        """
+        Builds a CompactGraph from a {node: {neighbor: metrics}} mapping.
+        Scalar (non-dict) weights apply to every metric. location_data, if given,
+        supplies node coordinates in the Graph.location_data format.
+        """
+        names = list(matrix)
+        seen = set(names)
+        for connections in matrix.values():
+            for neighbor in connections:
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    names.append(neighbor)
+        ids = {name: i for i, name in enumerate(names)}
+
+        if metrics is None:
+            metrics = []
+            for connections in matrix.values():
+                for edge in connections.values():
+                    if isinstance(edge, dict):
+                        metrics.extend(m for m in edge if m not in metrics)
+
+        offsets = array('i', [0])
+        targets = array('i')
+        weights = {m: array('d') for m in metrics}
+        for name in names:
+            for neighbor, edge in matrix.get(name, {}).items():
+                targets.append(ids[neighbor])
+                for m, values in weights.items():
+                    if isinstance(edge, dict):
+                        value = edge.get(m)
+                        values.append(INF if value is None else float(value))
+                    else:
+                        values.append(float(edge))
+            offsets.append(len(targets))
+
+        latitude, longitude = array('d'), array('d')
+        for name in names:
+            coords = location_data.get(name, {}) if location_data else {}
+            lat, lon = coords.get('latitude'), coords.get('longitude')
+            latitude.append(math.nan if lat is None else float(lat))
+            longitude.append(math.nan if lon is None else float(lon))
+        return cls(names, offsets, targets, weights, latitude, longitude)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """Builds a CompactGraph (with node coordinates) from an edgegraph.Graph."""
+        return cls.from_connection_matrix(graph.get_connection_matrix(), location_data=graph.location_data)
+
+    def __len__(self):
+        return len(self.names)
+
+    def fingerprint(self):
+        """
+        Returns a SHA-256 hex digest of the names, adjacency and weights.
+        Precomputed artifacts store it so they can detect a changed graph.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256(json.dumps(self.names).encode('utf-8'))
+            digest.update(self.offsets.tobytes())
+            digest.update(self.targets.tobytes())
+            for metric in sorted(self.weights):
+                digest.update(metric.encode('utf-8'))
+                digest.update(self.weights[metric].tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _reverse_csr(self, n):
+        """Builds the reverse adjacency (edges grouped by head node) as CSR arrays."""
+        counts = [0] * (n + 1)
+        for v in self.targets:
+            counts[v + 1] += 1
+        for v in range(n):
+            counts[v + 1] += counts[v]
+        rev_offsets = array('i', counts)
+        rev_edges = array('i', [0]) * len(self.targets)
+        fill = counts[:-1]
+        for e, v in enumerate(self.targets):
+            rev_edges[fill[v]] = e
+            fill[v] += 1
+        return rev_offsets, rev_edges
+
+    def _heuristic_bounds(self):
+        """
+        Derives per-metric A* parameters (scale, slack) from the edge data.
+
+        For every edge with known endpoint coordinates, gc is the great-circle
+        length in kilometers. Scaling gc by k bounds an edge's weight from below
+        as long as k * gc <= weight, so for edges with a positive weight:
+          - distance: k = min(1, min(distance / gc)), i.e. plain great-circle
+            distance unless the sheet records an edge shorter than its chord.
+          - time: k = 1 / fastest observed speed, where an edge's speed is
+            max(distance, gc) / time.
+        Zero-weight connector edges cannot be bounded that way, so their total
+        great-circle length becomes a slack that is subtracted before scaling,
+        which keeps the heuristic admissible. Metrics without a bound (gain,
+        loss) get no heuristic, and neither does any metric once an edge touches
+        a node without coordinates: a path through such nodes can be cheaper
+        than the bound the located nodes suggest, so no scale is safe.
+        """
+        distance, time = self.weights.get('distance'), self.weights.get('time')
+        distance_scale, fastest_speed = 1.0, 0.0
+        slack = {'distance': 0.0, 'time': 0.0}
+        if not len(self.targets):
+            return {}
+
+        # Great-circle length of every edge in one vectorized pass (nan if a coordinate is missing)
+        sources, targets = np.asarray(self.sources), np.asarray(self.targets)
+        lat, lon = np.asarray(self.latitude), np.asarray(self.longitude)
+        gc = haversine_array(lat[sources], lon[sources], lat[targets], lon[targets]) / 1000.0
+        if np.isnan(gc).any():
+            return {}
+        usable = gc > 0
+        d = np.asarray(distance) if distance is not None else np.full(len(gc), INF)
+        t = np.asarray(time) if time is not None else np.full(len(gc), INF)
+
+        for metric, values in (('distance', d), ('time', t)):
+            # Count each zero-weight connector once, whichever direction it is stored in
+            zero = usable & (values == 0)
+            pairs = {}
+            for u, v, length in zip(sources[zero].tolist(), targets[zero].tolist(), gc[zero].tolist()):
+                pairs[frozenset((u, v))] = length
+            slack[metric] = sum(pairs.values())
+
+        mask = usable & (d > 0) & (d < INF)
+        if mask.any():
+            distance_scale = min(distance_scale, float((d[mask] / gc[mask]).min()))
+        mask = usable & (t > 0) & (t < INF)
+        if mask.any():
+            reach = np.where(d[mask] < INF, np.maximum(gc[mask], d[mask]), gc[mask])
+            fastest_speed = float((reach / t[mask]).max())
+
+        scales = {}
+        if distance is not None:
+            scales['distance'] = distance_scale
+        if time is not None and fastest_speed > 0:
+            scales['time'] = 1.0 / fastest_speed
+        # Shave off a hair so floating point rounding never overestimates
+        return {m: (k * (1 - 1e-9), slack[m]) for m, k in scales.items() if k > 0}
+
+    # ------------------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------------------
+    def edge_id(self, u, v):
+        """Returns the id of the edge from node id u to node id v, or None (scans u's out-edges)."""
+        targets = self.targets
+        for e in range(self.offsets[u], self.offsets[u + 1]):
+            if targets[e] == v:
+                return e
+        return None
+
+    def apply_changes(self, graph, changes):
+        """
+        Applies Graph.changes_since entries in place, reading the current values
+        from graph. Works when the CSR layout stays the same: changed or removed
+        connections that are already edges here (a removed one keeps its slot with
+        every weight at inf, which the kernels never relax) and coordinate changes.
+        Returns False without touching anything if a change needs a new layout
+        (added or removed locations, new connections, new metrics).
+
+        Derived data follows along: the fingerprint is recomputed, hierarchies and
+        route table rows of changed metrics are dropped (the "ch" and "table"
+        kernels fall back to A* until they are prepared again), and the A*
+        bounds are recomputed only if a changed edge would break them.
+        """
+        # Location changes come with edge entries for connections that no longer
+        # exist (remove_location logs them first), so look for them before any edge
+        if any(op in ('add_node', 'remove_node') for _, op, _, _ in changes):
+            return False
+        ids = self.ids
+        edges, moved = {}, set()
+        for _, op, key, _ in changes:
+            if op == 'update_node':
+                if key not in ids:
+                    return False
+                moved.add(ids[key])
+            elif op in ('add_edge', 'update_edge', 'remove_edge'):
+                u, v = ids.get(key[0]), ids.get(key[1])
+                e = self.edge_id(u, v) if u is not None and v is not None else None
+                if e is None:
+                    return False
+                weight = graph.nodes[key[0]]['connections'].get(key[1])
+                if isinstance(weight, dict) and any(m not in self.weights for m in weight):
+                    return False
+                edges[e] = weight
+            else:
+                return False
+
+        changed_metrics = set()
+        for e, weight in edges.items():
+            for metric, values in self.weights.items():
+                if weight is None:
+                    value = INF
+                elif isinstance(weight, dict):
+                    value = INF if weight.get(metric) is None else float(weight[metric])
+                else:
+                    value = float(weight)
+                if values[e] != value:
+                    values[e] = value
+                    changed_metrics.add(metric)
+        touched = set(edges)
+        for u in moved:
+            coords = graph.location_data[self.names[u]]
+            lat, lon = coords.get('latitude'), coords.get('longitude')
+            self.latitude[u] = math.nan if lat is None else float(lat)
+            self.longitude[u] = math.nan if lon is None else float(lon)
+            touched.update(range(self.offsets[u], self.offsets[u + 1]))
+            touched.update(self.rev_edges[self.rev_offsets[u]:self.rev_offsets[u + 1]])
+
+        self._fingerprint = None
+        for metric in changed_metrics:
+            self.hierarchies.pop(metric, None)
+            if self.route_table is not None:
+                self.route_table.discard(metric)
+        if not all(self._within_heuristic(e) for e in touched):
+            self.heuristic = self._heuristic_bounds()
+        return True
+
+    def _within_heuristic(self, e):
+        """
+        True if the A* bounds still hold for edge e: every metric with a bound
+        needs weight >= scale * great-circle km. Zero-weight edges are covered by
+        the slack, which is only known for the edges seen when it was computed,
+        so they always count as breaking the bounds.
+        """
+        u, v = self.sources[e], self.targets[e]
+        gc = haversine_distance(self.latitude[u], self.longitude[u], self.latitude[v], self.longitude[v]) / 1000.0
+        if math.isnan(gc):
+            return not self.heuristic
+        if gc == 0:
+            return True
+        for metric, (scale, _) in self.heuristic.items():
+            weight = self.weights[metric][e]
+            if weight == 0 or weight < scale * gc:
+                return False
+        return True
+
+    # ------------------------------------------------------------------------------
+    # Reusable search buffers
+    # ------------------------------------------------------------------------------
+    def _buffers(self, direction='forward'):
+        """
+        Returns this thread's (dist, prev_edge, touched) buffers for one search
+        direction, reset to clean. Bidirectional search uses both directions.
+        """
+        local = self._local
+        buffers = getattr(local, direction, None)
+        if buffers is None:
+            buffers = ([INF] * len(self.names), [-1] * len(self.names), [])
+            setattr(local, direction, buffers)
+        dist, prev_edge, touched = buffers
+        for u in touched:
+            dist[u] = INF
+            prev_edge[u] = -1
+        touched.clear()
+        return buffers
+
+    # ------------------------------------------------------------------------------
+    # Search kernels
+    # ------------------------------------------------------------------------------
+    def shortest_path(self, source, target, metric='time'):
+        """
+        Runs Dijkstra from node id source to node id target.
+        Returns (edge_ids, cost); edge_ids is empty and cost is inf if unreachable.
+        """
+        weights = self.weights.get(metric)
+        if weights is None:
+            return [], (0.0 if source == target else INF)
+        offsets, targets = self.offsets, self.targets
+        dist, prev_edge, touched = self._buffers()
+
+        dist[source] = 0.0
+        touched.append(source)
+        heap = [(0.0, source)]
+        settled = 0
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u == target:
+                self.last_settled = settled + 1
+                return self.unwind(prev_edge, source, target), d
+            if d > dist[u]:
+                continue
+            settled += 1
+            for e in range(offsets[u], offsets[u + 1]):
+                nd = d + weights[e]
+                v = targets[e]
+                if nd < dist[v]:
+                    if dist[v] == INF:
+                        touched.append(v)
+                    dist[v] = nd
+                    prev_edge[v] = e
+                    heapq.heappush(heap, (nd, v))
+        self.last_settled = settled
+        return [], INF
+
+    def shortest_path_tree(self, source, metric='time'):
+        """
+        Runs a one-to-all Dijkstra from node id source.
+        Returns new (dist, prev_edge) arrays indexed by node id; unreachable
+        nodes have dist inf and prev_edge -1. Use unwind() to extract paths.
+        """
+        n = len(self.names)
+        dist = array('d', [INF]) * n
+        prev_edge = array('i', [-1]) * n
+        weights = self.weights.get(metric)
+        dist[source] = 0.0
+        if weights is None:
+            return dist, prev_edge
+        offsets, targets = self.offsets, self.targets
+        heap = [(0.0, source)]
+        settled = 0
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            settled += 1
+            for e in range(offsets[u], offsets[u + 1]):
+                nd = d + weights[e]
+                v = targets[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    prev_edge[v] = e
+                    heapq.heappush(heap, (nd, v))
+        self.last_settled = settled
+        return dist, prev_edge
+
+    def astar(self, source, target, metric='time'):
+        """
+        Runs A* from node id source to node id target, guided by
+        scale * max(0, great-circle km to target - slack) from heuristic[metric].
+        Falls back to plain Dijkstra when the metric has no heuristic or the target
+        has no coordinates; nodes without coordinates get a heuristic of zero.
+        The heuristic is admissible but not always consistent, so settled nodes
+        may be reopened. Returns (edge_ids, cost) exactly like shortest_path.
+        """
+        scale, slack = self.heuristic.get(metric, (0.0, 0.0))
+        lat, lon = self.latitude, self.longitude
+        if not scale or math.isnan(lat[target]) or math.isnan(lon[target]):
+            return self.shortest_path(source, target, metric)
+        weights = self.weights[metric]
+        offsets, targets = self.offsets, self.targets
+        dist, prev_edge, touched = self._buffers()
+        target_lat, target_lon = lat[target], lon[target]
+        estimates = {}
+
+        def estimate(node):
+            h = estimates.get(node)
+            if h is None:
+                if math.isnan(lat[node]) or math.isnan(lon[node]):
+                    h = 0.0
+                else:
+                    gc = haversine_distance(lat[node], lon[node], target_lat, target_lon) / 1000.0
+                    h = scale * max(0.0, gc - slack)
+                estimates[node] = h
+            return h
+
+        dist[source] = 0.0
+        touched.append(source)
+        heap = [(estimate(source), 0.0, source)]
+        settled = 0
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u == target:
+                self.last_settled = settled + 1
+                return self.unwind(prev_edge, source, target), d
+            if d > dist[u]:
+                continue
+            settled += 1
+            for e in range(offsets[u], offsets[u + 1]):
+                nd = d + weights[e]
+                v = targets[e]
+                if nd < dist[v]:
+                    if dist[v] == INF:
+                        touched.append(v)
+                    dist[v] = nd
+                    prev_edge[v] = e
+                    heapq.heappush(heap, (nd + estimate(v), nd, v))
+        self.last_settled = settled
+        return [], INF
+
+    def bidirectional(self, source, target, metric='time'):
+        """
+        Runs bidirectional Dijkstra: forward from source over the out-edges and
+        backward from target over the reverse CSR, stopping once the two queue
+        minima together can no longer beat the best meeting point found.
+        Returns (edge_ids, cost) exactly like shortest_path.
+        """
+        weights = self.weights.get(metric)
+        if weights is None or source == target:
+            return [], (0.0 if source == target else INF)
+        offsets, targets = self.offsets, self.targets
+        rev_offsets, rev_edges, sources = self.rev_offsets, self.rev_edges, self.sources
+        dist_f, prev_f, touched_f = self._buffers('forward')
+        dist_b, next_b, touched_b = self._buffers('backward')
+
+        dist_f[source] = 0.0
+        touched_f.append(source)
+        dist_b[target] = 0.0
+        touched_b.append(target)
+        heap_f, heap_b = [(0.0, source)], [(0.0, target)]
+        best, meet = INF, -1
+        settled = 0
+        while heap_f and heap_b:
+            if heap_f[0][0] + heap_b[0][0] >= best:
+                break
+            if heap_f[0][0] <= heap_b[0][0]:
+                d, u = heapq.heappop(heap_f)
+                if d > dist_f[u]:
+                    continue
+                settled += 1
+                for e in range(offsets[u], offsets[u + 1]):
+                    nd = d + weights[e]
+                    v = targets[e]
+                    if nd < dist_f[v]:
+                        if dist_f[v] == INF:
+                            touched_f.append(v)
+                        dist_f[v] = nd
+                        prev_f[v] = e
+                        heapq.heappush(heap_f, (nd, v))
+                        if nd + dist_b[v] < best:
+                            best, meet = nd + dist_b[v], v
+            else:
+                d, u = heapq.heappop(heap_b)
+                if d > dist_b[u]:
+                    continue
+                settled += 1
+                for i in range(rev_offsets[u], rev_offsets[u + 1]):
+                    e = rev_edges[i]
+                    nd = d + weights[e]
+                    w = sources[e]
+                    if nd < dist_b[w]:
+                        if dist_b[w] == INF:
+                            touched_b.append(w)
+                        dist_b[w] = nd
+                        next_b[w] = e
+                        heapq.heappush(heap_b, (nd, w))
+                        if dist_f[w] + nd < best:
+                            best, meet = dist_f[w] + nd, w
+        self.last_settled = settled
+        if meet < 0:
+            return [], INF
+
+        edges = self.unwind(prev_f, source, meet)
+        node = meet
+        while node != target:
+            e = next_b[node]
+            edges.append(e)
+            node = targets[e]
+        return edges, best
+
+    def unwind(self, prev_edge, source, target):
+        """Follows predecessor edges from target back to source, returning edge ids in order."""
+        edges = []
+        node = target
+        while node != source:
+            e = prev_edge[node]
+            edges.append(e)
+            node = self.sources[e]
+        edges.reverse()
+        return edges
+
+    # ------------------------------------------------------------------------------
+    # Path helpers
+    # ------------------------------------------------------------------------------
+    def edge_key(self, e):
+        """Returns the "A-B" key used by the rest of the app for edge id e."""
+        return f"{self.names[self.sources[e]]}-{self.names[self.targets[e]]}"
+
+    def path_metrics(self, edge_ids, metric):
+        """Converts a list of edge ids into an ordered {"A-B": cost} dict."""
+        weights = self.weights[metric]
+        return {self.edge_key(e): weights[e] for e in edge_ids}
@@ -0,0 +1,299 @@
+# The Local Graph, Contraction Hierarchy Module
+# Optional preprocessing of the campus graph for near-constant time point-to-point queries.
+
+import heapq
+import math
+import os
+from array import array
+
+from binary_store import read_bundle, read_bundle_meta, write_bundle
+
+INF = math.inf
+CH_VERSION = 1
+
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy over one metric of a CompactGraph.
+
+    Stores:
+      - rank: Contraction order of every node (higher = more important).
+      - edge_src/edge_dst/edge_weight/edge_mid: Every original edge plus the
+        shortcuts added during contraction. edge_mid is -1 for original edges and
+        the contracted middle node for shortcuts, which is all that is needed to
+        unpack a shortcut back into original "A-B" edges.
+
+    Queries run a bidirectional upward search: forward from the source over edges
+    leading to higher ranks, backward from the target over edges arriving from
+    higher ranks.
+    """
+    def __init__(self, compact, metric, rank, edge_src, edge_dst, edge_weight, edge_mid):
+        self.compact = compact
+        self.metric = metric
+        self.rank = rank
+        self.edge_src, self.edge_dst = edge_src, edge_dst
+        self.edge_weight, self.edge_mid = edge_weight, edge_mid
+
+        n = len(compact)
+        self.up = [[] for _ in range(n)]    # u -> [(v, weight)] with rank[v] > rank[u]
+        self.down = [[] for _ in range(n)]  # v -> [(u, weight)] for edges u->v with rank[u] > rank[v]
+        self.middle = {}                    # (u, v) -> middle node, or -1 for an original edge
+        for u, v, w, mid in zip(edge_src, edge_dst, edge_weight, edge_mid):
+            self.middle[(u, v)] = mid
+            if rank[v] > rank[u]:
+                self.up[u].append((v, w))
+            else:
+                self.down[v].append((u, w))
+
+        # Cheapest original edge for each (u, v), used when unpacking
+        weights = compact.weights[metric]
+        self.original = {}
+        for e, v in enumerate(compact.targets):
+            key = (compact.sources[e], v)
+            if key not in self.original or weights[e] < weights[self.original[key]]:
+                self.original[key] = e
+
+    # ------------------------------------------------------------------------------
+    # Preprocessing
+    # ------------------------------------------------------------------------------
+    @classmethod
+    def build(cls, compact, metric, witness_settle_limit=500):
+        """
+        Contracts every node of compact in edge-difference order (with lazy
+        priority updates), adding a shortcut u->w through v whenever a bounded
+        witness search finds no path from u to w avoiding v that is as cheap.
+        """
+        n = len(compact)
+        weights = compact.weights[metric]
+        out_adj = [dict() for _ in range(n)]  # u -> {v: (weight, mid)} among uncontracted nodes
+        in_adj = [dict() for _ in range(n)]
+        edges = {}                             # (u, v) -> (weight, mid) for all edges and shortcuts
+        for e, v in enumerate(compact.targets):
+            u, w = compact.sources[e], weights[e]
+            if u == v or w == INF:
+                continue
+            if (u, v) not in edges or w < edges[(u, v)][0]:
+                edges[(u, v)] = (w, -1)
+                out_adj[u][v] = (w, -1)
+                in_adj[v][u] = (w, -1)
+
+        contracted = [False] * n
+        contracted_neighbors = [0] * n
+
+        def witness_distances(source, skip, limit):
+            """Bounded Dijkstra from source over uncontracted nodes, avoiding skip."""
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            while heap and settled < witness_settle_limit:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                if d > limit:
+                    break
+                settled += 1
+                for v, (w, _) in out_adj[u].items():
+                    if v == skip:
+                        continue
+                    nd = d + w
+                    if nd < dist.get(v, INF):
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+            return dist
+
+        def shortcuts_for(v):
+            """Returns the shortcuts [(u, w, cost)] that contracting v requires."""
+            shortcuts = []
+            outgoing = list(out_adj[v].items())
+            for u, (w_uv, _) in in_adj[v].items():
+                targets = [(w, w_uv + w_vw) for w, (w_vw, _) in outgoing if w != u]
+                if not targets:
+                    continue
+                dist = witness_distances(u, v, max(cost for _, cost in targets))
+                for w, cost in targets:
+                    if dist.get(w, INF) > cost:
+                        shortcuts.append((u, w, cost))
+            return shortcuts
+
+        def priority(v):
+            return len(shortcuts_for(v)) - len(in_adj[v]) - len(out_adj[v]) + contracted_neighbors[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = array('i', [0]) * n
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            current = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+
+            for u, w, cost in shortcuts_for(v):
+                if cost < edges.get((u, w), (INF, -1))[0]:
+                    edges[(u, w)] = (cost, v)
+                    out_adj[u][w] = (cost, v)
+                    in_adj[w][u] = (cost, v)
+            for u in in_adj[v]:
+                del out_adj[u][v]
+                contracted_neighbors[u] += 1
+            for w in out_adj[v]:
+                del in_adj[w][v]
+                contracted_neighbors[w] += 1
+            in_adj[v].clear()
+            out_adj[v].clear()
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+
+        edge_src, edge_dst, edge_mid = array('i'), array('i'), array('i')
+        edge_weight = array('d')
+        for (u, v), (w, mid) in edges.items():
+            edge_src.append(u)
+            edge_dst.append(v)
+            edge_weight.append(w)
+            edge_mid.append(mid)
+        return cls(compact, metric, rank, edge_src, edge_dst, edge_weight, edge_mid)
+
+    @property
+    def shortcut_count(self):
+        """Number of shortcuts added during contraction."""
+        return sum(1 for mid in self.edge_mid if mid >= 0)
+
+    # ------------------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------------------
+    def save(self, path):
+        """Writes the hierarchy to path, stamped with the graph fingerprint."""
+        meta = {"version": CH_VERSION, "metric": self.metric, "graph": self.compact.fingerprint()}
+        write_bundle(path, meta, {
+            "rank": self.rank, "edge_src": self.edge_src, "edge_dst": self.edge_dst,
+            "edge_weight": self.edge_weight, "edge_mid": self.edge_mid,
+        })
+
+    @classmethod
+    def load(cls, path, compact, metric):
+        """Loads a saved hierarchy, or returns None if it is missing or belongs to another graph."""
+        if not os.path.exists(path):
+            return None
+        try:
+            meta = read_bundle_meta(path)
+            if (meta.get("version") != CH_VERSION or meta.get("metric") != metric
+                    or meta.get("graph") != compact.fingerprint()):
+                return None
+            _, arrays = read_bundle(path)
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read contraction hierarchy {path}: {e}")
+            return None
+        return cls(compact, metric, arrays["rank"], arrays["edge_src"], arrays["edge_dst"],
+                   arrays["edge_weight"], arrays["edge_mid"])
+
+    # ------------------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------------------
+    def query(self, source, target):
+        """
+        Answers a point-to-point query with a bidirectional upward search.
+        Returns (edge_ids, cost) with edge_ids in the underlying CompactGraph,
+        exactly like CompactGraph.shortest_path.
+        """
+        if source == target:
+            return [], 0.0
+        dist_f, dist_b = {source: 0.0}, {target: 0.0}
+        prev_f, next_b = {source: None}, {target: None}
+        heap_f, heap_b = [(0.0, source)], [(0.0, target)]
+        best, meet = INF, None
+        settled = 0
+        while heap_f or heap_b:
+            forward = bool(heap_f) and (not heap_b or heap_f[0][0] <= heap_b[0][0])
+            heap, dist, other, links, adjacency = (
+                (heap_f, dist_f, dist_b, prev_f, self.up) if forward
+                else (heap_b, dist_b, dist_f, next_b, self.down)
+            )
+            d, u = heapq.heappop(heap)
+            if d >= best:
+                heap.clear()  # nothing left in this direction can improve the result
+                continue
+            if d > dist[u]:
+                continue
+            settled += 1
+            if u in other and d + other[u] < best:
+                best, meet = d + other[u], u
+            for v, w in adjacency[u]:
+                nd = d + w
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    links[v] = u
+                    heapq.heappush(heap, (nd, v))
+                    if v in other and nd + other[v] < best:
+                        best, meet = nd + other[v], v
+        self.compact.last_settled = settled
+        if meet is None:
+            return [], INF
+
+        nodes = [meet]
+        while prev_f[nodes[-1]] is not None:
+            nodes.append(prev_f[nodes[-1]])
+        nodes.reverse()
+        while next_b[nodes[-1]] is not None:
+            nodes.append(next_b[nodes[-1]])
+
+        edge_ids = []
+        for u, v in zip(nodes, nodes[1:]):
+            self._unpack(u, v, edge_ids)
+        return edge_ids, best
+
+    def _unpack(self, u, v, out):
+        """Appends the original edge ids behind the (possibly shortcut) edge u->v."""
+        stack = [(u, v)]
+        while stack:
+            a, b = stack.pop()
+            mid = self.middle[(a, b)]
+            if mid < 0:
+                out.append(self.original[(a, b)])
+            else:
+                stack.append((mid, b))
+                stack.append((a, mid))
+
+
+# ----------------------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------------------
+
+
+def hierarchy_path(excel_file, metric):
+    """Returns the file a metric's hierarchy is persisted to, next to the workbook."""
+    return os.path.splitext(excel_file)[0] + f".ch-{metric}.bin"
+
+
+def prepare_hierarchies(compact, excel_file='compendium.xlsx', metrics=('time', 'distance')):
+    """
+    Loads (or builds and saves) a hierarchy per metric and attaches them to
+    compact.hierarchies, where the "ch" routing algorithm picks them up.
+    """
+    for metric in metrics:
+        if metric not in compact.weights:
+            continue
+        path = hierarchy_path(excel_file, metric)
+        hierarchy = ContractionHierarchy.load(path, compact, metric)
+        if hierarchy is None:
+            hierarchy = ContractionHierarchy.build(compact, metric)
+            try:
+                hierarchy.save(path)
+            except OSError as e:
+                print(f"Warning: could not write contraction hierarchy {path}: {e}")
+        compact.hierarchies[metric] = hierarchy
+    return compact.hierarchies
+
+
+def ch_search(compact, source, target, metric='time'):
+    """
+    Search kernel for routing.SEARCH_ALGORITHMS: answers from the attached
+    hierarchy for metric, or falls back to A* if none has been prepared.
+    """
+    hierarchy = compact.hierarchies.get(metric)
+    if hierarchy is None:
+        return compact.astar(source, target, metric)
+    return hierarchy.query(source, target)
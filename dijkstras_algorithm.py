@@ -1,12 +1,30 @@
-import heapq
+from compact_graph import CompactGraph, ConnectionMatrix
 from edgegraph import MarcelGraph, Graph
 
 
+def compact_graph_for(graph):
+    """
+    Returns a CompactGraph for any graph representation used in the app.
+    A Graph or a matrix from Graph.get_connection_matrix() reuses the graph's cached
+    CompactGraph; a plain dict is converted on every call.
+    """
+    if isinstance(graph, CompactGraph):
+        return graph
+    if isinstance(graph, Graph):
+        return graph.get_compact_graph()
+    if isinstance(graph, ConnectionMatrix):
+        return graph.graph.get_compact_graph()
+    return CompactGraph.from_connection_matrix(graph)
+
+
 def dijkstra(graph, start, destination, metric='time'):
     """
     Implements Dijkstra's algorithm to find the shortest path from a start node
     to a destination node using the specified metric.
 
+    The search itself runs on the array-backed CompactGraph (see compact_graph_for);
+    this function only translates node names and the resulting path.
+
     Args:
         graph (dict): A dictionary representing the graph. Each key is a node,
                       and each value is a dictionary of neighbor nodes with a
@@ -22,52 +40,46 @@ def dijkstra(graph, start, destination, metric='time'):
             - total_metric is the total accumulated cost along the path.
         If no path is found, returns ({}, float('inf')).
     """
-    # Initialize distances and previous nodes
-    distances = {node: float('inf') for node in graph}
-    distances[start] = 0
-    previous_nodes = {node: None for node in graph}
-    priority_queue = [(0, start)]
-
-    while priority_queue:
-        current_distance, current_node = heapq.heappop(priority_queue)
-
-        # Check if destination is reached
-        if current_node == destination:
-            path_metrics = {}
-            current = destination
-            # Reconstruct the path backwards
-            while current != start:
-                prev = previous_nodes[current]
-                if prev is None:
-                    return {}, float('inf')
-                # Retrieve the cost for the edge from prev to current
-                edge = graph[prev][current]
-                value = edge.get(metric, float('inf'))
-                path_metrics[f"{prev}-{current}"] = value
-                current = prev
-            # Reverse the order to get forward path
-            path_metrics = dict(reversed(list(path_metrics.items())))
-            return path_metrics, distances[destination]
-
-        # Skip outdated entries in the queue
-        if current_distance > distances[current_node]:
-            continue
-
-        # Evaluate all neighbors for potential relaxation
-        for neighbor, edge_metrics in graph[current_node].items():
-            edge_cost = edge_metrics.get(metric)
-            if edge_cost is None:
-                continue  # Skip if chosen metric is missing
-            new_distance = current_distance + edge_cost
-
-            # Relaxation: update distance if a shorter path is found
-            if new_distance < distances[neighbor]:
-                distances[neighbor] = new_distance
-                previous_nodes[neighbor] = current_node
-                heapq.heappush(priority_queue, (new_distance, neighbor))
-
-    # No path found if loop exits without returning
-    return {}, float('inf')
+    compact = compact_graph_for(graph)
+    source, target = compact.ids.get(start), compact.ids.get(destination)
+    if source is None or target is None:
+        return {}, float('inf')
+    edge_ids, total = compact.shortest_path(source, target, metric)
+    if total == float('inf'):
+        return {}, float('inf')
+    return compact.path_metrics(edge_ids, metric), total
+
+
+def astar(graph, start, destination, metric='time'):
+    """
+    A* variant of dijkstra() with the same arguments and return value.
+    Uses a great-circle heuristic for the time and distance metrics and behaves
+    like plain Dijkstra for the others (see CompactGraph.astar).
+    """
+    compact = compact_graph_for(graph)
+    source, target = compact.ids.get(start), compact.ids.get(destination)
+    if source is None or target is None:
+        return {}, float('inf')
+    edge_ids, total = compact.astar(source, target, metric)
+    if total == float('inf'):
+        return {}, float('inf')
+    return compact.path_metrics(edge_ids, metric), total
+
+
+def bidirectional_dijkstra(graph, start, destination, metric='time'):
+    """
+    Bidirectional variant of dijkstra() with the same arguments and return value.
+    Searches forward from start and backward from destination over the reversed
+    (directed) adjacency until the frontiers meet (see CompactGraph.bidirectional).
+    """
+    compact = compact_graph_for(graph)
+    source, target = compact.ids.get(start), compact.ids.get(destination)
+    if source is None or target is None:
+        return {}, float('inf')
+    edge_ids, total = compact.bidirectional(source, target, metric)
+    if total == float('inf'):
+        return {}, float('inf')
+    return compact.path_metrics(edge_ids, metric), total
 
 
 # Example usage
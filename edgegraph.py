@@ -3,15 +3,31 @@
 # Code Linted with Flake8, Spellchecked with Code Spell Checker,
 # and general Cleanup and formatting with ChatGPT
 
+import contextlib
+import itertools
+import math
 import os
+from array import array
+from collections import deque
+
+import numpy as np
 import pandas as pd
 from openpyxl import load_workbook
 
+from binary_store import file_sha256, read_bundle, read_bundle_meta, write_bundle
+from compact_graph import CompactGraph, ConnectionMatrix
+from spatial_index import SpatialIndex
+
 
 # ----------------------------------------------------------------------------------
 # Graph Class
 # ----------------------------------------------------------------------------------
 
+_graph_versions = itertools.count(1)  # process-wide source of unique graph version stamps
+
+# Change log entries kept per graph; consumers further behind than this rebuild from scratch
+CHANGE_LOG_LIMIT = 4096
+
 
 class Graph:
     """
@@ -21,44 +37,219 @@ class Graph:
       - nodes: Each node with its connections and metrics.
       - location_data: Mapping of locations to their latitude and longitude.
       - node_type: Mapping indicating whether a location is a building.
+      - version: Stamp that increases with every modification (or reload),
+        used to invalidate route caches and other derived data.
+      - changes: Change log of the most recent modifications as
+        (version, op, key, old) tuples, oldest first (see changes_since).
+
+    Every mutation costs O(degree) of the touched nodes. The CompactGraph and
+    SpatialIndex handed out by get_compact_graph/get_spatial_index are brought
+    up to date from the change log the next time they are asked for. Loading a
+    graph is one bulk change (see bulk_changes), not one version per element.
+    Mutations are not thread-safe; make them from one thread.
     """
     def __init__(self):
         self.nodes = {}           # e.g., {'A': {'name': 'A', 'connections': {...}}}
         self.location_data = {}   # e.g., {'A': {'latitude': 38.0, 'longitude': -120.0}}
         self.node_type = {}       # e.g., {'A': True or False}
-
+        self._incoming = {}       # node -> set of nodes with a connection to it
+        self._compact = None      # CompactGraph built on demand for routing
+        self._spatial = None      # SpatialIndex over location_data built on demand
+        self.version = next(_graph_versions)
+        self.changes = deque()
+        self._log_floor = self.version   # changes_since can answer for any version >= this
+        self._compact_version = self._spatial_version = self.version
+        self._bulk_depth = 0      # > 0 inside bulk_changes()
+
+    # ------------------------------------------------------------------------------
+    # Locations
+    # ------------------------------------------------------------------------------
     def add_location(self, name, latitude, longitude, is_building=False):
         """Adds a new location and its metadata to the graph."""
         if name not in self.nodes:
             self.nodes[name] = {'name': name, 'connections': {}}
             self.location_data[name] = {'latitude': latitude, 'longitude': longitude}
             self.node_type[name] = is_building
+            self._incoming[name] = set()
+            self._changed(('add_node', name, None))
 
+    def update_location(self, name, latitude=None, longitude=None, is_building=None):
+        """Changes the coordinates and/or building flag of a location (None keeps a value)."""
+        if name not in self.nodes:
+            raise ValueError(f"Unknown location {name!r}.")
+        old = (dict(self.location_data[name]), self.node_type[name])
+        if latitude is not None:
+            self.location_data[name]['latitude'] = latitude
+        if longitude is not None:
+            self.location_data[name]['longitude'] = longitude
+        if is_building is not None:
+            self.node_type[name] = is_building
+        self._changed(('update_node', name, old))
+
+    def remove_location(self, name):
+        """Removes a location together with every connection from or to it."""
+        if name not in self.nodes:
+            raise ValueError(f"Unknown location {name!r}.")
+        entries = []
+        for destination, weight in self.nodes[name]['connections'].items():
+            self._incoming[destination].discard(name)
+            entries.append(('remove_edge', (name, destination), weight))
+        for source in self._incoming.pop(name):
+            if source != name:
+                entries.append(('remove_edge', (source, name), self.nodes[source]['connections'].pop(name)))
+        entries.append(('remove_node', name, (self.location_data.pop(name), self.node_type.pop(name))))
+        del self.nodes[name]
+        self._changed(*entries)
+
+    # ------------------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------------------
     def add_connection(self, source, destination, weight):
         """
-        Adds a connection from source to destination.
+        Adds a connection from source to destination, replacing an existing one.
         The weight can be a dictionary of metrics (e.g. time, distance) or a float.
         """
         if source not in self.nodes or destination not in self.nodes:
             raise ValueError("Both locations must be added before connecting them.")
+        connections = self.nodes[source]['connections']
+        old = connections.get(destination)
+        op = 'add_edge' if destination not in connections else 'update_edge'
         if isinstance(weight, dict):
-            self.nodes[source]['connections'][destination] = weight
+            connections[destination] = weight
         else:
-            self.nodes[source]['connections'][destination] = float(weight)
+            connections[destination] = float(weight)
+        self._incoming[destination].add(source)
+        self._changed((op, (source, destination), old))
+
+    def update_connection(self, source, destination, **metrics):
+        """
+        Changes some metrics of an existing connection, e.g.
+        update_connection('Fir', 'Node A', time=95.0). A metric set to None is removed
+        (a connection without a metric is never used when routing by it).
+        """
+        weight = self.nodes.get(source, {}).get('connections', {}).get(destination)
+        if weight is None:
+            raise ValueError(f"No connection from {source!r} to {destination!r}.")
+        if not isinstance(weight, dict):
+            raise ValueError(f"Connection {source}-{destination} has a single weight; "
+                             "use add_connection to replace it.")
+        updated = {m: v for m, v in weight.items() if metrics.get(m, v) is not None}
+        updated.update((m, v) for m, v in metrics.items() if v is not None)
+        self.nodes[source]['connections'][destination] = updated
+        self._changed(('update_edge', (source, destination), weight))
+
+    def remove_connection(self, source, destination):
+        """Removes the connection from source to destination (e.g. a closed path)."""
+        connections = self.nodes.get(source, {}).get('connections', {})
+        if destination not in connections:
+            raise ValueError(f"No connection from {source!r} to {destination!r}.")
+        old = connections.pop(destination)
+        self._incoming[destination].discard(source)
+        self._changed(('remove_edge', (source, destination), old))
+
+    # ------------------------------------------------------------------------------
+    # Versions and change log
+    # ------------------------------------------------------------------------------
+    def _changed(self, *entries):
+        """
+        Bumps the version after a modification and logs its (op, key, old) entries
+        under it. op is one of add_node, update_node, remove_node (key: the name,
+        old: (location_data entry, is_building) before the change) or add_edge,
+        update_edge, remove_edge (key: (source, destination), old: the previous
+        weight or None).
+        """
+        if self._bulk_depth:
+            return
+        self.version = next(_graph_versions)
+        for op, key, old in entries:
+            self.changes.append((self.version, op, key, old))
+        while len(self.changes) > CHANGE_LOG_LIMIT:
+            self._log_floor = self.changes.popleft()[0]
+
+    @contextlib.contextmanager
+    def bulk_changes(self):
+        """
+        Context manager for bulk modifications such as loading a whole graph:
+        nothing is logged inside the block, and on leaving it the version is
+        bumped once and the change log restarts there, so anything derived from
+        an earlier version is rebuilt rather than patched element by element.
+        """
+        self._bulk_depth += 1
+        try:
+            yield self
+        finally:
+            self._bulk_depth -= 1
+            if not self._bulk_depth:
+                self.version = self._log_floor = next(_graph_versions)
+                self.changes.clear()
+
+    def changes_since(self, version):
+        """
+        Returns the change log entries made after version, oldest first, or None
+        if the log no longer reaches back that far (the caller has to rebuild).
+        """
+        if version < self._log_floor:
+            return None
+        newer = []
+        for change in reversed(self.changes):
+            if change[0] <= version:
+                break
+            newer.append(change)
+        newer.reverse()
+        return newer
 
     def get_connection_matrix(self):
         """Returns a mapping of each node to its connections and associated metrics."""
-        return {node: data['connections'] for node, data in self.nodes.items()}
+        return ConnectionMatrix(self, {node: data['connections'] for node, data in self.nodes.items()})
+
+    def get_compact_graph(self):
+        """
+        Returns the array-backed CompactGraph for routing. Changes that only touch
+        existing connections or coordinates are applied to it in place (see
+        CompactGraph.apply_changes); added connections and added or removed
+        locations rebuild it.
+        """
+        if self._compact is not None and self._compact_version != self.version:
+            changes = self.changes_since(self._compact_version)
+            if changes is None or not self._compact.apply_changes(self, changes):
+                self._compact = None
+        if self._compact is None:
+            self._compact = CompactGraph.from_graph(self)
+        self._compact_version = self.version
+        return self._compact
+
+    def get_spatial_index(self):
+        """
+        Returns the SpatialIndex over location_data, updated in place after changes
+        (see SpatialIndex.apply_changes).
+        """
+        if self._spatial is not None and self._spatial_version != self.version:
+            changes = self.changes_since(self._spatial_version)
+            if changes is None or not self._spatial.apply_changes(self.location_data, changes):
+                self._spatial = None
+        if self._spatial is None:
+            self._spatial = SpatialIndex(self.location_data)
+        self._spatial_version = self.version
+        return self._spatial
+
+    def snap_to_graph(self, latitude, longitude, max_distance=None):
+        """
+        Snaps a raw lat/lon (e.g. a GPS fix) to the closest node.
+        Returns (node name, distance in meters), or None if no node lies within
+        max_distance meters.
+        """
+        return self.get_spatial_index().nearest(latitude, longitude, max_distance)
 
-    def load_from_excel(self, excel_file='compendium.xlsx'):
+    def load_from_excel(self, excel_file='compendium.xlsx', use_snapshot=True):
         """
         Loads the graph from an Excel file.
         Expects:
           - Sheets: "time", "distance", "gain", "loss" for metrics.
           - Sheet "coords": columns "node" and "coords" (e.g. "38.031, -120.3877").
           - Sheet "node_type": columns "node" and "is_building".
+        A binary snapshot next to the workbook is used when it is still current.
         """
-        ExcelGraphIO.load_graph_from_excel(self, excel_file)
+        ExcelGraphIO.load_graph_from_excel(self, excel_file, use_snapshot=use_snapshot)
 
     def __repr__(self):
         """Return a formatted string representation of the graph."""
@@ -89,93 +280,253 @@ class ExcelGraphIO:
       - Sheet "node_type" with columns "node" and "is_building".
     """
     @staticmethod  # https://www.geeksforgeeks.org/class-method-vs-static-method-python/
-    def load_graph_from_excel(graph, excel_file='compendium.xlsx'):
-        """Loads graph data from the Excel file."""
+    def load_graph_from_excel(graph, excel_file='compendium.xlsx', use_snapshot=True):
+        """
+        Loads graph data from the Excel file.
+        When use_snapshot is set, a current binary snapshot is loaded instead of
+        parsing the workbook, and a fresh snapshot is written after parsing.
+        """
         if not os.path.exists(excel_file):
             raise FileNotFoundError(f"Excel file not found at {excel_file}")
 
-        # Load metric sheets into dataframes
+        if use_snapshot and ExcelGraphIO.load_snapshot(graph, excel_file):
+            return
+
+        # Read every sheet from a single open workbook
         metrics_list = ['time', 'distance', 'gain', 'loss']
         sheets = {}
-        for metric in metrics_list:
+        coords_df, node_type_df = None, None
+        with pd.ExcelFile(excel_file) as workbook:
+            for metric in metrics_list:
+                try:
+                    df = workbook.parse(sheet_name=metric, header=0, index_col=0)
+                    # Clean up row and column labels
+                    df.index = df.index.map(lambda x: str(x).strip())
+                    df.columns = [str(col).strip() for col in df.columns]
+                    sheets[metric] = df
+                except Exception as e:
+                    sheets[metric] = None
+                    print(f"Warning: could not load sheet '{metric}': {e}")
+
+            # Load coordinates and node type sheets
             try:
-                df = pd.read_excel(excel_file, sheet_name=metric, header=0, index_col=0)
-                # Clean up row and column labels
-                df.index = df.index.map(lambda x: str(x).strip())
-                df.columns = [str(col).strip() for col in df.columns]
-                sheets[metric] = df
+                coords_df = workbook.parse(sheet_name="coords", header=0)
+                coords_df["node"] = coords_df["node"].astype(str).str.strip()
             except Exception as e:
-                sheets[metric] = None
-                print(f"Warning: could not load sheet '{metric}': {e}")
+                print(f"Warning: could not load sheet 'coords': {e}")
 
-        # Load coordinates and node type sheets
-        coords_df, node_type_df = None, None
-        try:
-            coords_df = pd.read_excel(excel_file, sheet_name="coords", header=0)
-            coords_df["node"] = coords_df["node"].astype(str).str.strip()
-        except Exception as e:
-            print(f"Warning: could not load sheet 'coords': {e}")
-
-        try:
-            node_type_df = pd.read_excel(excel_file, sheet_name="node_type", header=0)
-            node_type_df["node"] = node_type_df["node"].astype(str).str.strip()
-        except Exception as e:
-            print(f"Warning: could not load sheet 'node_type': {e}")
+            try:
+                node_type_df = workbook.parse(sheet_name="node_type", header=0)
+                node_type_df["node"] = node_type_df["node"].astype(str).str.strip()
+            except Exception as e:
+                print(f"Warning: could not load sheet 'node_type': {e}")
 
-        # Gather all nodes from metric sheets, coords, and node_type data
-        all_nodes = set()
+        # Gather all nodes from metric sheets, coords, and node_type data (first-seen order)
+        all_nodes = {}
         for m in metrics_list:
             if sheets[m] is not None:
-                all_nodes |= set(sheets[m].index.tolist())
-                all_nodes |= set(sheets[m].columns.tolist())
+                all_nodes.update(dict.fromkeys(sheets[m].index))
+                all_nodes.update(dict.fromkeys(sheets[m].columns))
+        if coords_df is not None:
+            all_nodes.update(dict.fromkeys(coords_df["node"]))
+        if node_type_df is not None:
+            all_nodes.update(dict.fromkeys(node_type_df["node"]))
+        nodes = pd.Index(list(all_nodes), dtype=object)
 
+        # Join coordinates and node types onto the node list
+        latitudes, longitudes = [None] * len(nodes), [None] * len(nodes)
         if coords_df is not None:
-            all_nodes |= set(coords_df["node"].tolist())
+            coords = coords_df.drop_duplicates("node").set_index("node")["coords"].reindex(nodes)
+            has_row = nodes.isin(coords_df["node"])
+            # Expected format: "lat, lon" (decimal tuple)
+            parts = coords.where(coords.map(lambda v: isinstance(v, str))).str.split(",")
+            lat = pd.to_numeric(parts.str[0].str.strip(), errors="coerce")
+            lon = pd.to_numeric(parts.str[1].str.strip(), errors="coerce")
+            valid = (parts.str.len() == 2) & lat.notna() & lon.notna()
+            for i in np.flatnonzero(valid.to_numpy()):
+                latitudes[i], longitudes[i] = float(lat.iloc[i]), float(lon.iloc[i])
+            for node in nodes[has_row & ~valid.to_numpy()]:
+                print(f"Error parsing coords '{coords[node]}' for node {node}: expected 'lat, lon'")
+
+        is_building = pd.Series(False, index=nodes)
         if node_type_df is not None:
-            all_nodes |= set(node_type_df["node"].tolist())
-
-        # Populate the graph with each node's information
-        for node in all_nodes:
-            latitude, longitude = None, None
-            is_building = False
-
-            # Parse coordinates if available
-            if coords_df is not None:
-                row = coords_df[coords_df["node"] == node]
-                if not row.empty:
-                    coords_str = row["coords"].iloc[0]
-                    try:
-                        lat_str, lon_str = coords_str.split(",")  # Expected format: "lat, lon" (decimal tuple)
-                        latitude = float(lat_str.strip())
-                        longitude = float(lon_str.strip())
-                    except Exception as ex:
-                        print(f"Error parsing coords '{coords_str}' for node {node}: {ex}")
-
-            # Parse node type if available
-            if node_type_df is not None:
-                row = node_type_df[node_type_df["node"] == node]
-                if not row.empty:
-                    is_building = bool(row["is_building"].iloc[0])
-
-            graph.add_location(node, latitude, longitude, is_building)
-
-        # Build connections using available metrics
-        for source in all_nodes:
-            for destination in all_nodes:
-                edge_dict = {}
-                for metric in metrics_list:
-                    if sheets[metric] is not None:
-                        try:
-                            value = sheets[metric].at[source, destination]
-                            if pd.notna(value):
-                                edge_dict[metric] = float(value)
-                        except Exception:
-                            pass
-                if edge_dict:
+            types = node_type_df.drop_duplicates("node").set_index("node")["is_building"]
+            has_row = nodes.isin(types.index)
+            is_building[has_row] = types.reindex(nodes[has_row]).astype(bool).to_numpy()
+
+        # Stack each metric matrix into a long (source, destination, value) table,
+        # keeping only non-empty numeric cells, then outer-join the metrics per edge
+        edges = None
+        for metric in metrics_list:
+            df = sheets[metric]
+            if df is None:
+                continue
+            matrix = df.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+            rows, cols = np.nonzero(~np.isnan(matrix))
+            long_df = pd.DataFrame({
+                "source": df.index.to_numpy(dtype=object)[rows],
+                "destination": df.columns.to_numpy(dtype=object)[cols],
+                metric: matrix[rows, cols],
+            }).drop_duplicates(["source", "destination"])
+            edges = long_df if edges is None else edges.merge(long_df, on=["source", "destination"], how="outer")
+
+        # Populate the graph with each node's information, then build connections using
+        # available metrics; as one bulk change, the load is a single version of the graph
+        with graph.bulk_changes():
+            for node, latitude, longitude, building in zip(nodes, latitudes, longitudes, is_building):
+                graph.add_location(node, latitude, longitude, bool(building))
+
+            if edges is not None:
+                present = [m for m in metrics_list if m in edges.columns]
+                columns = [edges[m].to_numpy() for m in present]
+                for i, (source, destination) in enumerate(zip(edges["source"], edges["destination"])):
+                    edge_dict = {}
+                    for metric, values in zip(present, columns):
+                        value = values[i]
+                        if value == value:  # skip NaN
+                            edge_dict[metric] = float(value)
                     graph.add_connection(source, destination, edge_dict)
 
         print(f"Graph data successfully loaded from {excel_file} with metrics: {metrics_list}")
 
+        if use_snapshot:
+            try:
+                ExcelGraphIO.save_snapshot(graph, excel_file)
+            except OSError as e:
+                print(f"Warning: could not write graph snapshot: {e}")
+
+    # ------------------------------------------------------------------------------
+    # Binary snapshot cache
+    # ------------------------------------------------------------------------------
+    SNAPSHOT_VERSION = 2  # Bump whenever the snapshot layout or the graph the loader builds changes
+
+    @staticmethod
+    def snapshot_path(excel_file):
+        """Returns the snapshot file path that belongs to a workbook."""
+        return os.path.splitext(excel_file)[0] + ".graph.bin"
+
+    @staticmethod
+    def save_snapshot(graph, excel_file='compendium.xlsx'):
+        """
+        Writes a binary snapshot of the graph next to the workbook.
+        Stores node names, coordinates, building flags and one array per metric
+        over a flat edge list, stamped with the workbook's size, mtime and hash.
+        """
+        names = list(graph.nodes)
+        index = {name: i for i, name in enumerate(names)}
+
+        latitude, longitude, building = array('d'), array('d'), array('b')
+        for name in names:
+            coords = graph.location_data.get(name, {})
+            lat, lon = coords.get('latitude'), coords.get('longitude')
+            latitude.append(math.nan if lat is None else lat)
+            longitude.append(math.nan if lon is None else lon)
+            building.append(1 if graph.node_type.get(name) else 0)
+
+        metrics = []
+        for data in graph.nodes.values():
+            for weight in data['connections'].values():
+                if isinstance(weight, dict):
+                    metrics.extend(m for m in weight if m not in metrics)
+        if not metrics:
+            metrics = ['weight']
+
+        sources, targets, scalar = array('i'), array('i'), array('b')
+        metric_values = {m: array('d') for m in metrics}
+        for source, data in graph.nodes.items():
+            for destination, weight in data['connections'].items():
+                sources.append(index[source])
+                targets.append(index[destination])
+                is_scalar = not isinstance(weight, dict)
+                scalar.append(1 if is_scalar else 0)
+                for m, values in metric_values.items():
+                    if is_scalar:
+                        values.append(weight)
+                    else:
+                        values.append(weight.get(m, math.nan))
+
+        stat = os.stat(excel_file)
+        meta = {
+            "version": ExcelGraphIO.SNAPSHOT_VERSION,
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "source_sha256": file_sha256(excel_file),
+            "nodes": names,
+            "metrics": metrics,
+        }
+        arrays = {"latitude": latitude, "longitude": longitude, "building": building,
+                  "sources": sources, "targets": targets, "scalar": scalar}
+        arrays.update({f"metric:{m}": values for m, values in metric_values.items()})
+        write_bundle(ExcelGraphIO.snapshot_path(excel_file), meta, arrays)
+
+    @staticmethod
+    def snapshot_is_current(excel_file='compendium.xlsx'):
+        """
+        Checks whether the snapshot still matches the workbook.
+        Size and mtime are compared first; if either changed, the content hash decides,
+        and a snapshot whose hash still matches is restamped with the new size and
+        mtime so later starts skip the hash again.
+        """
+        path = ExcelGraphIO.snapshot_path(excel_file)
+        if not os.path.exists(path):
+            return False
+        try:
+            meta = read_bundle_meta(path)
+        except (OSError, ValueError):
+            return False
+        if meta.get("version") != ExcelGraphIO.SNAPSHOT_VERSION:
+            return False
+        stat = os.stat(excel_file)
+        if stat.st_size == meta.get("source_size") and stat.st_mtime_ns == meta.get("source_mtime_ns"):
+            return True
+        if file_sha256(excel_file) != meta.get("source_sha256"):
+            return False
+        ExcelGraphIO._restamp_snapshot(path, stat)
+        return True
+
+    @staticmethod
+    def _restamp_snapshot(path, stat):
+        """Rewrites the snapshot at path with the workbook size and mtime from stat (contents unchanged)."""
+        try:
+            meta, arrays = read_bundle(path)
+            meta.update(source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns)
+            write_bundle(path, meta, arrays)
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not restamp graph snapshot: {e}")
+
+    @staticmethod
+    def load_snapshot(graph, excel_file='compendium.xlsx'):
+        """
+        Loads the graph from its binary snapshot if the snapshot is current.
+        Returns True on success and False if the workbook has to be parsed instead.
+        """
+        if not ExcelGraphIO.snapshot_is_current(excel_file):
+            return False
+        try:
+            meta, arrays = read_bundle(ExcelGraphIO.snapshot_path(excel_file))
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read graph snapshot: {e}")
+            return False
+
+        names = meta["nodes"]
+        latitude, longitude, building = arrays["latitude"], arrays["longitude"], arrays["building"]
+        metric_values = [(m, arrays[f"metric:{m}"]) for m in meta["metrics"]]
+        with graph.bulk_changes():
+            for i, name in enumerate(names):
+                lat, lon = latitude[i], longitude[i]
+                graph.add_location(name, None if math.isnan(lat) else lat,
+                                   None if math.isnan(lon) else lon, bool(building[i]))
+
+            for e, (s, t) in enumerate(zip(arrays["sources"], arrays["targets"])):
+                if arrays["scalar"][e]:
+                    weight = metric_values[0][1][e]
+                else:
+                    weight = {m: values[e] for m, values in metric_values if not math.isnan(values[e])}
+                graph.add_connection(names[s], names[t], weight)
+
+        print(f"Graph data loaded from snapshot of {excel_file} with metrics: {meta['metrics']}")
+        return True
+
     @staticmethod
     def export_graph_to_excel(graph, excel_file='compendium.xlsx'):
         """
@@ -318,5 +669,15 @@ if __name__ == '__main__':
         for location, is_building in graph.node_type.items():
             type_graph.add_location(location, is_building)
         print(type_graph)
+
+        # Close a path and reopen it; the routing arrays are updated in place from the change log
+        compact = graph.get_compact_graph()
+        source = next(name for name, data in graph.nodes.items() if data['connections'])
+        destination, weight = next(iter(graph.nodes[source]['connections'].items()))
+        before = graph.version
+        graph.remove_connection(source, destination)
+        graph.add_connection(source, destination, weight)
+        print(f"Changes since version {before}: {[(op, key) for _, op, key, _ in graph.changes_since(before)]}")
+        print(f"CompactGraph updated in place: {graph.get_compact_graph() is compact}")
         # Optionally, export the graph data back to Excel:
         # ExcelGraphIO.export_graph_to_excel(graph)
@@ -0,0 +1,94 @@
+# The Local Graph, Geodesy Module
+# Great-circle distance helpers shared by the map, snapping and routing code.
+
+import math
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000  # Earth radius in meters
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Calculate the distance (in meters) between two lat/lon points using the Haversine formula."""
+    R = EARTH_RADIUS_M
+    d_lat = math.radians(lat2 - lat1)
+    d_lon = math.radians(lon2 - lon1)
+    a = math.sin(d_lat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lon/2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+# ----------------------------------------------------------------------------------
+# Vectorized helpers (NumPy)
+# ----------------------------------------------------------------------------------
+
+
+def haversine_array(lat1, lon1, lat2, lon2):
+    """
+    Element-wise haversine distance in meters. Arguments broadcast like NumPy
+    arrays, so a scalar point against arrays gives point-to-many distances.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def pairwise_distances(lats1, lons1, lats2, lons2):
+    """Returns the len(lats1) x len(lats2) matrix of haversine distances in meters."""
+    lats1, lons1 = np.asarray(lats1, dtype=float), np.asarray(lons1, dtype=float)
+    return haversine_array(lats1[:, None], lons1[:, None], np.asarray(lats2, dtype=float)[None, :],
+                           np.asarray(lons2, dtype=float)[None, :])
+
+
+def segment_lengths(coords):
+    """Lengths in meters of the segments of a GeoJSON [lon, lat] polyline."""
+    coords = np.asarray(coords, dtype=float)
+    if coords.ndim != 2 or len(coords) < 2:
+        return np.zeros(0)
+    return haversine_array(coords[:-1, 1], coords[:-1, 0], coords[1:, 1], coords[1:, 0])
+
+
+def polyline_length(coords):
+    """Total length in meters of a GeoJSON [lon, lat] polyline."""
+    return float(segment_lengths(coords).sum())
+
+
+def meters_per_pixel(zoom, latitude):
+    """Ground size in meters of one Web Mercator map pixel at the given zoom level and latitude."""
+    return 2 * math.pi * EARTH_RADIUS_M * math.cos(math.radians(latitude)) / (256 * 2 ** zoom)
+
+
+def simplify_polyline(coords, tolerance, keep=()):
+    """
+    Douglas-Peucker simplification of a GeoJSON [lon, lat] polyline. Drops
+    vertices until every removed vertex lies within tolerance meters of the
+    simplified line. The first and last vertex and the indices in keep are
+    always kept, so lines still meet at shared vertices. Returns the kept coords.
+    """
+    n = len(coords)
+    if n <= 2 or tolerance <= 0:
+        return list(coords)
+    # Local equirectangular projection to meters, accurate over campus-sized extents
+    xy = np.radians(np.asarray([c[:2] for c in coords], dtype=float)) * EARTH_RADIUS_M
+    xy[:, 0] *= math.cos(xy[:, 1].mean() / EARTH_RADIUS_M)
+
+    kept = np.zeros(n, dtype=bool)
+    kept[[0, n - 1]] = True
+    kept[list(keep)] = True
+    anchors = np.flatnonzero(kept)
+    stack = list(zip(anchors[:-1], anchors[1:]))
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        a, d = xy[i], xy[j] - xy[i]
+        inner = xy[i + 1:j] - a
+        length2 = float(d @ d)
+        t = np.clip(inner @ d / length2, 0.0, 1.0) if length2 > 0 else np.zeros(len(inner))
+        dist = np.hypot(*(inner - t[:, None] * d).T)
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            m = i + 1 + k
+            kept[m] = True
+            stack.extend(((i, m), (m, j)))
+    return [coords[i] for i in np.flatnonzero(kept)]
@@ -0,0 +1,775 @@
+# The Local Graph, Geometry Graph Module
+# Snapping of GeoJSON path data to campus nodes and the derived geometry used for drawing routes.
+# GeometryGraph, geometry_dijkstra and find_closest_node originally lived in MAIN.py.
+
+import heapq
+import math
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from binary_store import cached_file_sha256, read_bundle, read_bundle_meta, write_bundle
+from geodesy import haversine_distance, meters_per_pixel, polyline_length, simplify_polyline
+from spatial_index import SpatialIndex
+from tracing import count
+from worker_pool import init_worker, worker_state
+
+GEOMETRY_VERSION = 3
+
+# With workers=None, inputs smaller than these are built serially (pool startup would dominate):
+# LineStrings segmented by GeometryGraph, and vertices snapped by PathNetwork (far cheaper each)
+PARALLEL_MIN_LINES = 2000
+PARALLEL_MIN_VERTICES = 20000
+
+# Douglas-Peucker tolerances (meters) of the simplified levels of detail; 0.0 is the raw geometry
+LOD_TOLERANCES = (0.0, 1.0, 2.0, 4.0, 8.0, 16.0)
+
+
+# ----------------------------------------------------------------------------------
+# Helper functions for snapping (buffered matching)
+# ----------------------------------------------------------------------------------
+
+
+def find_closest_node(lat, lon, node_data, threshold=5.0):
+    """
+    Find the closest node from node_data to the given lat/lon within a threshold (meters).
+    node_data is either a location_data dict (scanned linearly) or a SpatialIndex built
+    from one (same answer, found through the index).
+    Returns the node name if within threshold, otherwise None.
+    """
+    if isinstance(node_data, SpatialIndex):
+        found = node_data.nearest(lat, lon, threshold)
+        return found[0] if found else None
+    closest_node = None
+    min_dist = float("inf")
+    count("snap_distance_evaluations", len(node_data))
+    for node_name, coords in node_data.items():
+        nlat = coords.get("latitude")
+        nlon = coords.get("longitude")
+        if nlat is None or nlon is None:
+            continue
+        dist = haversine_distance(lat, lon, nlat, nlon)
+        if dist < min_dist:
+            min_dist = dist
+            closest_node = node_name
+    if min_dist <= threshold:
+        return closest_node
+    else:
+        return None
+
+
+# ----------------------------------------------------------------------------------
+# GeometryGraph: Build a graph from red lines in GeoJSON data
+# ----------------------------------------------------------------------------------
+
+
+class GeometryGraph:
+    """
+    Build a graph from GeoJSON red lines, splitting them at known campus nodes.
+    Each segment is stored as an edge with coordinates and distance.
+    """
+    def __init__(self, node_data, geojson_data, threshold=5.0, workers=1):
+        self.adj = {}
+        self.node_data = node_data if isinstance(node_data, SpatialIndex) else SpatialIndex(node_data)
+        self.threshold = threshold
+        self.build_geometry_graph(geojson_data, workers)
+
+    @classmethod
+    def from_adjacency(cls, adj, node_data, threshold=5.0):
+        """Rebuilds a GeometryGraph from a previously computed adjacency (no snapping)."""
+        geometry_graph = cls.__new__(cls)
+        geometry_graph.adj = adj
+        geometry_graph.node_data = node_data
+        geometry_graph.threshold = threshold
+        return geometry_graph
+
+    def add_edge(self, nodeA, nodeB, coords, distance_m=None):
+        """Add a bidirectional edge between nodeA and nodeB with computed distance."""
+        if distance_m is None:
+            distance_m = polyline_length(coords)
+
+        if nodeA not in self.adj:
+            self.adj[nodeA] = {}
+        if nodeB not in self.adj:
+            self.adj[nodeB] = {}
+
+        self.adj[nodeA][nodeB] = {"coords": coords, "distance": distance_m}
+        self.adj[nodeB][nodeA] = {"coords": list(reversed(coords)), "distance": distance_m}
+
+    def build_geometry_graph(self, geojson_data, workers=1):
+        """
+        Parse GeoJSON features and build the geometry graph. With workers > 1 (or
+        None for one per CPU) the lines are sharded over a process pool; the shards
+        are merged in feature order, so the result is identical to the serial build.
+        """
+        lines = [
+            feature["geometry"]["coordinates"] for feature in geojson_data["features"]
+            if feature.get("geometry", {}).get("type") == "LineString"
+            and len(feature["geometry"].get("coordinates", [])) >= 2
+        ]
+        shards = run_sharded(_segment_task, lines, self.node_data, workers, self.threshold)
+        for segments in shards:
+            for nodeA, nodeB, segment_coords, distance_m in segments:
+                self.add_edge(nodeA, nodeB, segment_coords, distance_m)
+
+
+def segment_lines(node_index, lines, threshold=5.0):
+    """
+    Splits each line (a list of [lon, lat] coordinates) at the vertices that snap
+    to a campus node. Returns (nodeA, nodeB, coords, distance_m) for every segment
+    joining two different nodes, in line order.
+    """
+    if not lines:
+        return []
+    # Snap every vertex of every line in one vectorized batch
+    all_coords = np.asarray([c[:2] for coords in lines for c in coords], dtype=float).reshape(-1, 2)
+    all_snapped = node_index.nearest_many(all_coords[:, 1], all_coords[:, 0], threshold)
+    segments = []
+    offset = 0
+    for coords in lines:
+        snapped = all_snapped[offset:offset + len(coords)]
+        offset += len(coords)
+        # Identify breakpoints along the line for snapping nodes
+        break_indices = [0]
+        break_indices.extend(i for i in range(1, len(coords) - 1) if snapped[i])
+        break_indices.append(len(coords) - 1)
+        # Create segments between breakpoints
+        for idx in range(len(break_indices) - 1):
+            start_i = break_indices[idx]
+            end_i = break_indices[idx + 1]
+            segment_coords = coords[start_i:end_i + 1]
+            nodeA = snapped[start_i]
+            nodeB = snapped[end_i]
+            if nodeA and nodeB and nodeA != nodeB:
+                segments.append((nodeA, nodeB, segment_coords, polyline_length(segment_coords)))
+    return segments
+
+
+# ----------------------------------------------------------------------------------
+# Parallel build helpers
+# ----------------------------------------------------------------------------------
+
+
+def _segment_task(lines, threshold):
+    """Snaps and segments one shard of lines."""
+    return segment_lines(worker_state("geometry_graph"), lines, threshold)
+
+
+def _snap_task(coords, threshold):
+    """Snaps one shard of [lon, lat] coordinates."""
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    return worker_state("geometry_graph").nearest_many(coords[:, 1], coords[:, 0], threshold)
+
+
+def run_sharded(task, items, node_index, workers=1, threshold=5.0, min_items=None):
+    """
+    Runs task(shard, threshold) over contiguous shards of items and returns the
+    results in shard order. With workers == 1, or workers None and fewer than
+    min_items (default PARALLEL_MIN_LINES) items, the whole input is one shard
+    run in this process.
+    """
+    if workers is None:
+        min_items = PARALLEL_MIN_LINES if min_items is None else min_items
+        workers = (os.cpu_count() or 1) if len(items) >= min_items else 1
+    if workers == 1 or len(items) < 2:
+        init_worker("geometry_graph", node_index)
+        return [task(items, threshold)]
+    # A few shards per worker balances uneven line lengths
+    size = max(1, -(-len(items) // (4 * workers)))
+    shards = [items[i:i + size] for i in range(0, len(items), size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=("geometry_graph", node_index)) as pool:
+        return list(pool.map(task, shards, [threshold] * len(shards)))
+
+
+# ----------------------------------------------------------------------------------
+# Dijkstra for GeometryGraph
+# ----------------------------------------------------------------------------------
+
+
+def geometry_dijkstra(geom_graph, start_node, end_node):
+    """
+    Run a mini Dijkstra algorithm on a GeometryGraph to find a path between nodes.
+    Returns a list of edge tuples (nodeA, nodeB) for the shortest path.
+    """
+    dist = {}
+    prev = {}
+    for node in geom_graph.adj:
+        dist[node] = float('inf')
+        prev[node] = None
+    if start_node not in geom_graph.adj or end_node not in geom_graph.adj:
+        return None
+    count("geometry_searches")
+    dist[start_node] = 0
+    visited = set()
+    heap = [(0, start_node)]
+    while heap:
+        current_dist, node = heapq.heappop(heap)
+        if node in visited:
+            continue
+        visited.add(node)
+        if node == end_node:
+            break
+        for neighbor, info in geom_graph.adj[node].items():
+            edge_dist = info["distance"]
+            alt = current_dist + edge_dist
+            if alt < dist[neighbor]:
+                dist[neighbor] = alt
+                prev[neighbor] = node
+                heapq.heappush(heap, (alt, neighbor))
+    count("geometry_nodes_settled", len(visited))
+    if dist[end_node] == float('inf'):
+        return None
+    path_edges = []
+    cur = end_node
+    while prev[cur] is not None:
+        path_edges.append((prev[cur], cur))
+        cur = prev[cur]
+    path_edges.reverse()
+    return path_edges
+
+
+# ----------------------------------------------------------------------------------
+# Whole-feature edge geometry
+# ----------------------------------------------------------------------------------
+
+
+def build_edge_features(geojson_data, node_data, threshold=5.0):
+    """
+    Maps frozenset({node1, node2}) to the index of the LineString feature whose
+    endpoints snap to those two (different) nodes; later features win.
+    """
+    features = geojson_data["features"]
+    lines = [
+        i for i, feature in enumerate(features)
+        if feature.get("geometry", {}).get("type") == "LineString"
+        and len(feature["geometry"].get("coordinates", [])) >= 2
+    ]
+    # Snap both endpoints of every line in one vectorized batch
+    endpoints = np.asarray(
+        [c[:2] for i in lines for c in (features[i]["geometry"]["coordinates"][0],
+                                        features[i]["geometry"]["coordinates"][-1])], dtype=float
+    ).reshape(-1, 2)
+    snapped = node_data.nearest_many(endpoints[:, 1], endpoints[:, 0], threshold)
+    edge_features = {}
+    for n, i in enumerate(lines):
+        node1, node2 = snapped[2 * n], snapped[2 * n + 1]
+        if node1 and node2 and node1 != node2:
+            edge_features[frozenset([node1, node2])] = i
+    return edge_features
+
+
+# ----------------------------------------------------------------------------------
+# Levels of detail
+# ----------------------------------------------------------------------------------
+
+
+def lod_level(tolerance):
+    """Returns the coarsest LOD_TOLERANCES level that stays within tolerance meters."""
+    return max(t for t in LOD_TOLERANCES if t <= tolerance) if tolerance > 0 else 0.0
+
+
+def lod_for_zoom(zoom, latitude):
+    """Returns the LOD level whose error stays below one map pixel at zoom."""
+    return lod_level(meters_per_pixel(zoom, latitude))
+
+
+def simplify_path_layer(geojson_data, geometry_graph, tolerance):
+    """
+    Returns a FeatureCollection of the GeoJSON LineStrings simplified to
+    tolerance meters. Vertices where geometry_graph splits the lines (campus
+    nodes and junctions) are kept, so simplified paths still meet there.
+    """
+    breakpoints = set()
+    for neighbors in geometry_graph.adj.values():
+        for info in neighbors.values():
+            breakpoints.add(tuple(info["coords"][0][:2]))
+    features = []
+    for feature in geojson_data["features"]:
+        geom = feature.get("geometry") or {}
+        if geom.get("type") != "LineString":
+            continue
+        coords = geom.get("coordinates", [])
+        keep = [i for i, c in enumerate(coords) if tuple(c[:2]) in breakpoints]
+        features.append({
+            "type": "Feature",
+            "properties": feature.get("properties", {}),
+            "geometry": {"type": "LineString", "coordinates": simplify_polyline(coords, tolerance, keep)},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+# ----------------------------------------------------------------------------------
+# RoutePolylines: drawable polyline of every routing graph edge
+# ----------------------------------------------------------------------------------
+
+# How RoutePolylines resolved an edge
+POLYLINE_DIRECT, POLYLINE_GEOMETRY, POLYLINE_STRAIGHT, POLYLINE_MISSING = range(4)
+
+
+class RoutePolylines:
+    """
+    The polyline drawn for every edge of a CompactGraph, resolved once instead of
+    at draw time: the whole GeoJSON feature joining the two nodes if there is one,
+    else the shortest path through the geometry graph, else a straight line.
+
+    Stores:
+      - coords: Flat [lat, lon, lat, lon, ...] buffer of every edge's polyline,
+        oriented from the edge's source node to its target node.
+      - offsets: Edge e's points are offsets[e]..offsets[e + 1] (in points).
+      - kind: POLYLINE_* constant telling how each edge was resolved
+        (POLYLINE_MISSING edges have no points: a node has no coordinates).
+      - edge_keys: "A-B" key of every edge id; edge_ids maps them back.
+      - levels: LOD tolerance -> (coords, offsets) of the edges simplified to it
+        (levels[0.0] is coords, offsets). Only the raw level is stored on disk;
+        the others are simplified from it on construction.
+    """
+    def __init__(self, edge_keys, coords, offsets, kind):
+        self.edge_keys = list(edge_keys)
+        self.coords = coords
+        self.offsets = offsets
+        self.kind = kind
+        self.edge_ids = {}
+        for e, key in enumerate(self.edge_keys):
+            self.edge_ids.setdefault(key, e)
+        self.levels = {0.0: (coords, offsets)}
+        for tolerance in LOD_TOLERANCES[1:]:
+            self.levels[tolerance] = self._simplified(tolerance)
+
+    def _simplified(self, tolerance):
+        """Simplifies every edge polyline; edge endpoints (the nodes) are kept."""
+        coords, offsets = array('d'), array('q', [0])
+        for e in range(len(self.kind)):
+            # simplify_polyline works on [lon, lat]; the buffer holds [lat, lon]
+            points = [(lon, lat) for lat, lon in self.edge_points(e)]
+            for lon, lat in simplify_polyline(points, tolerance):
+                coords.extend((lat, lon))
+            offsets.append(len(coords) // 2)
+        return coords, offsets
+
+    @classmethod
+    def build(cls, compact, edge_geometry, geometry_graph):
+        """Resolves the polyline of every edge of compact."""
+        coords, offsets, kind = array('d'), array('q', [0]), array('b')
+        for e in range(len(compact.targets)):
+            u, v = compact.sources[e], compact.targets[e]
+            name_u, name_v = compact.names[u], compact.names[v]
+            start = (compact.latitude[u], compact.longitude[u])
+            end = (compact.latitude[v], compact.longitude[v])
+            points, how = None, POLYLINE_MISSING
+            geometry = edge_geometry.get(frozenset((name_u, name_v)))
+            if geometry:
+                points = [(lat, lon) for lon, lat in (c[:2] for c in geometry["coordinates"])]
+                # Orient the feature from u to v (features are digitized in either direction)
+                if not math.isnan(start[0]) and (haversine_distance(*start, *points[-1])
+                                                 < haversine_distance(*start, *points[0])):
+                    points.reverse()
+                how = POLYLINE_DIRECT
+            else:
+                path = geometry_dijkstra(geometry_graph, name_u, name_v) if name_u != name_v else None
+                if path:
+                    points = []
+                    for a, b in path:
+                        segment = geometry_graph.adj[a][b]["coords"]
+                        points.extend((c[1], c[0]) for c in (segment[1:] if points else segment))
+                    how = POLYLINE_GEOMETRY
+                elif not math.isnan(start[0]) and not math.isnan(end[0]):
+                    points, how = [start, end], POLYLINE_STRAIGHT
+            for point in points or ():
+                coords.extend(point)
+            offsets.append(len(coords) // 2)
+            kind.append(how)
+        edge_keys = [compact.edge_key(e) for e in range(len(compact.targets))]
+        return cls(edge_keys, coords, offsets, kind)
+
+    def edge_points(self, e, tolerance=0.0):
+        """Returns the [lat, lon] points of edge e at the level of detail for tolerance (see lod_level)."""
+        c, offsets = self.levels[lod_level(tolerance)] if tolerance else (self.coords, self.offsets)
+        return [[c[2 * i], c[2 * i + 1]] for i in range(offsets[e], offsets[e + 1])]
+
+    def route_points(self, edge_ids, tolerance=0.0):
+        """
+        Concatenates the polylines of consecutive edges into one [lat, lon] list,
+        dropping the point shared by adjacent edges.
+        """
+        points = []
+        for e in edge_ids:
+            segment = self.edge_points(e, tolerance)
+            if points and segment and points[-1] == segment[0]:
+                segment = segment[1:]
+            points.extend(segment)
+        return points
+
+
+# ----------------------------------------------------------------------------------
+# GeometryArtifacts: derived geometry built once and shared read-only
+# ----------------------------------------------------------------------------------
+
+
+def input_key(*paths):
+    """Returns the tuple of SHA-256 digests identifying a set of input files."""
+    return tuple(cached_file_sha256(path) for path in paths)
+
+
+class GeometryArtifacts:
+    """
+    Everything CampusMap derives from the GeoJSON and the node coordinates.
+    Built once per set of input files and shared read-only between reruns and sessions.
+
+    Stores:
+      - key: Digests of the input files the artifacts were derived from.
+      - geometry_graph: GeometryGraph of the red lines split at campus nodes, with
+        segment lengths precomputed in adj[a][b]["distance"]. When built noded, the
+        lines are also split at shared vertices and crossings (see PathNetwork).
+      - noded: Whether geometry_graph was built from the noded PathNetwork.
+      - edge_features: frozenset({node1, node2}) -> index of the whole feature
+        connecting them; edge_geometry maps the same keys to the geometries.
+      - polylines: RoutePolylines of the routing graph's edges (None unless a
+        CompactGraph was given when building).
+      - path_layers: LOD tolerance -> the GeoJSON paths as a FeatureCollection
+        simplified to it (see simplify_path_layer), for drawing the path data.
+    """
+    def __init__(self, key, geojson_data, geometry_graph, edge_features, noded=False, polylines=None):
+        self.key = tuple(key)
+        self.noded = noded
+        self.polylines = polylines
+        self.geometry_graph = geometry_graph
+        self.edge_features = edge_features
+        features = geojson_data["features"]
+        self.edge_geometry = {k: features[i]["geometry"] for k, i in edge_features.items()}
+        self.path_layers = {
+            tolerance: simplify_path_layer(geojson_data, geometry_graph, tolerance) for tolerance in LOD_TOLERANCES
+        }
+
+    @classmethod
+    def build(cls, geojson_data, node_index, key, threshold=5.0, noded=False, workers=1, compact=None):
+        """
+        Snaps the GeoJSON against node_index (a SpatialIndex) and derives all artifacts.
+        workers is passed on to the geometry graph build (see run_sharded); with a
+        CompactGraph, the polylines of its edges are resolved as well.
+        """
+        if noded:
+            network = PathNetwork.build(geojson_data, node_index, threshold, workers=workers)
+            geometry_graph = network.to_geometry_graph(node_index, threshold)
+        else:
+            geometry_graph = GeometryGraph(node_index, geojson_data, threshold=threshold, workers=workers)
+        edge_features = build_edge_features(geojson_data, node_index, threshold)
+        artifacts = cls(key, geojson_data, geometry_graph, edge_features, noded)
+        if compact is not None:
+            artifacts.polylines = RoutePolylines.build(compact, artifacts.edge_geometry, geometry_graph)
+        return artifacts
+
+    def save(self, path):
+        """
+        Writes the artifacts to path. Each geometry edge is stored once as a slice
+        of a flat [lon, lat] coordinate buffer; the reverse direction is rebuilt on load.
+        """
+        adj = self.geometry_graph.adj
+        names = list(adj)
+        for pair in self.edge_features:
+            names.extend(n for n in pair if n not in adj and n not in names)
+        index = {name: i for i, name in enumerate(names)}
+
+        edge_a, edge_b, offsets = array('i'), array('i'), array('q', [0])
+        coords, distance = array('d'), array('d')
+        done = set()
+        for a, neighbors in adj.items():
+            for b, info in neighbors.items():
+                if frozenset((a, b)) in done:
+                    continue
+                done.add(frozenset((a, b)))
+                edge_a.append(index[a])
+                edge_b.append(index[b])
+                for c in info["coords"]:
+                    coords.extend((c[0], c[1]))
+                offsets.append(len(coords) // 2)
+                distance.append(info["distance"])
+
+        feature_a, feature_b, feature_index = array('i'), array('i'), array('i')
+        for pair, i in self.edge_features.items():
+            a, b = sorted(pair, key=index.get)
+            feature_a.append(index[a])
+            feature_b.append(index[b])
+            feature_index.append(i)
+
+        meta = {"version": GEOMETRY_VERSION, "key": list(self.key), "nodes": names,
+                "threshold": self.geometry_graph.threshold, "noded": self.noded}
+        arrays = {
+            "edge_a": edge_a, "edge_b": edge_b, "offsets": offsets, "coords": coords, "distance": distance,
+            "feature_a": feature_a, "feature_b": feature_b, "feature_index": feature_index,
+        }
+        if self.polylines is not None:
+            meta["polyline_edges"] = self.polylines.edge_keys
+            arrays.update({"polyline_coords": self.polylines.coords, "polyline_offsets": self.polylines.offsets,
+                           "polyline_kind": self.polylines.kind})
+        write_bundle(path, meta, arrays)
+
+    @classmethod
+    def load(cls, path, geojson_data, node_index, key, noded=False, compact=None):
+        """
+        Loads saved artifacts, or returns None if they are missing or were built
+        from other inputs (or, given a CompactGraph, without polylines for its edges).
+        """
+        try:
+            meta = read_bundle_meta(path)
+            if meta.get("version") != GEOMETRY_VERSION or tuple(meta.get("key", ())) != tuple(key):
+                return None
+            if meta.get("noded", False) != noded:
+                return None
+            if compact is not None and meta.get("polyline_edges") != [
+                compact.edge_key(e) for e in range(len(compact.targets))
+            ]:
+                return None
+            _, arrays = read_bundle(path)
+        except (OSError, ValueError):
+            return None
+
+        names = meta["nodes"]
+        adj = {}
+        offsets, flat = arrays["offsets"], arrays["coords"]
+        for e, (a, b) in enumerate(zip(arrays["edge_a"], arrays["edge_b"])):
+            segment = [[flat[2 * j], flat[2 * j + 1]] for j in range(offsets[e], offsets[e + 1])]
+            info = {"coords": segment, "distance": arrays["distance"][e]}
+            adj.setdefault(names[a], {})[names[b]] = info
+            adj.setdefault(names[b], {})[names[a]] = {"coords": list(reversed(segment)), "distance": info["distance"]}
+        geometry_graph = GeometryGraph.from_adjacency(adj, node_index, meta["threshold"])
+
+        edge_features = {
+            frozenset((names[a], names[b])): i
+            for a, b, i in zip(arrays["feature_a"], arrays["feature_b"], arrays["feature_index"])
+        }
+        polylines = None
+        if "polyline_edges" in meta:
+            polylines = RoutePolylines(meta["polyline_edges"], arrays["polyline_coords"], arrays["polyline_offsets"],
+                                       arrays["polyline_kind"])
+        return cls(key, geojson_data, geometry_graph, edge_features, noded, polylines)
+
+    @classmethod
+    def load_or_build(cls, geojson_data, node_index, key, cache_path=None, threshold=5.0, noded=False, workers=1,
+                      compact=None):
+        """
+        Returns artifacts for key, read from cache_path when it holds a matching
+        copy and built (then written to cache_path, if given) otherwise.
+        """
+        if cache_path:
+            artifacts = cls.load(cache_path, geojson_data, node_index, key, noded, compact)
+            if artifacts is not None:
+                return artifacts
+        artifacts = cls.build(geojson_data, node_index, key, threshold, noded, workers, compact)
+        if cache_path:
+            try:
+                artifacts.save(cache_path)
+            except OSError as e:
+                print(f"Warning: could not write geometry cache {cache_path}: {e}")
+        return artifacts
+
+
+# ----------------------------------------------------------------------------------
+# PathNetwork: topological noding of the GeoJSON paths
+# ----------------------------------------------------------------------------------
+
+
+def _segment_intersection(p1, p2, q1, q2, eps=1e-9):
+    """
+    Intersects segments p1-p2 and q1-q2 (planar (x, y) tuples).
+    Returns (t, u) parameters along each segment, or None if they do not meet
+    (parallel and collinear segments are treated as not meeting).
+    """
+    rx, ry = p2[0] - p1[0], p2[1] - p1[1]
+    sx, sy = q2[0] - q1[0], q2[1] - q1[1]
+    denom = rx * sy - ry * sx
+    if abs(denom) < eps * eps:
+        return None
+    qpx, qpy = q1[0] - p1[0], q1[1] - p1[1]
+    t = (qpx * sy - qpy * sx) / denom
+    u = (qpx * ry - qpy * rx) / denom
+    if -eps <= t <= 1 + eps and -eps <= u <= 1 + eps:
+        return t, u
+    return None
+
+
+class PathNetwork:
+    """
+    Planar network of the GeoJSON LineStrings.
+
+    Vertices are identified by hashing coordinates quantized to `precision`
+    decimals, so lines that share a vertex are joined there. Crossings and
+    T-junctions between segments are found by bucketing segments on a uniform
+    grid and intersecting only segments that share a cell, and are inserted as
+    new shared vertices. Lines are then split at every junction (line ends,
+    vertices with other than two neighbors, crossings) and at every vertex within
+    `threshold` meters of a campus node, which gives that vertex the node's name.
+
+    Stores:
+      - vertices: [lon, lat] of every vertex id.
+      - labels: vertex id -> name in the network (campus node name or "~j<id>").
+      - edges: List of (name_a, name_b, coords) polylines between junctions.
+    """
+    def __init__(self, vertices, labels, edges):
+        self.vertices = vertices
+        self.labels = labels
+        self.edges = edges
+
+    @classmethod
+    def build(cls, geojson_data, node_index, threshold=5.0, precision=6, cell_size=5e-4, workers=1):
+        """
+        Nodes every LineString of geojson_data and attaches the nodes of node_index.
+        workers shards only the vertex snapping (step 4) as in run_sharded, with
+        workers None going parallel from PARALLEL_MIN_VERTICES vertices; hashing,
+        the crossing search and splitting always run in this process.
+        """
+        scale = 10 ** precision
+        vertex_ids = {}
+        vertices = []
+
+        def vertex(lon, lat):
+            key = (round(lon * scale), round(lat * scale))
+            vid = vertex_ids.get(key)
+            if vid is None:
+                vid = vertex_ids[key] = len(vertices)
+                vertices.append([lon, lat])
+            return vid
+
+        # 1. Hash every line vertex; drop repeated consecutive vertices
+        lines = []
+        for feature in geojson_data["features"]:
+            geom = feature.get("geometry") or {}
+            if geom.get("type") != "LineString":
+                continue
+            sequence = []
+            for c in geom.get("coordinates", []):
+                vid = vertex(c[0], c[1])
+                if not sequence or sequence[-1] != vid:
+                    sequence.append(vid)
+            if len(sequence) >= 2:
+                lines.append(sequence)
+        if not lines:
+            return cls(vertices, {}, [])
+
+        # Work in a local planar frame (longitude scaled by cos(latitude))
+        mean_lat = float(np.mean([v[1] for v in vertices]))
+        x_scale = float(np.cos(np.radians(mean_lat)))
+
+        def planar(vid):
+            return (vertices[vid][0] * x_scale, vertices[vid][1])
+
+        # 2. Bucket segments on a grid and intersect candidate pairs
+        segments = [(li, si) for li, seq in enumerate(lines) for si in range(len(seq) - 1)]
+        grid = {}
+        for s_index, (li, si) in enumerate(segments):
+            (x1, y1), (x2, y2) = planar(lines[li][si]), planar(lines[li][si + 1])
+            for cx in range(int(np.floor(min(x1, x2) / cell_size)), int(np.floor(max(x1, x2) / cell_size)) + 1):
+                for cy in range(int(np.floor(min(y1, y2) / cell_size)), int(np.floor(max(y1, y2) / cell_size)) + 1):
+                    grid.setdefault((cx, cy), []).append(s_index)
+
+        splits = {}  # segment index -> [(t, vertex id)]
+        checked = set()
+        eps = 1e-9
+        for bucket in grid.values():
+            for a_pos, a in enumerate(bucket):
+                for b in bucket[a_pos + 1:]:
+                    pair = (a, b) if a < b else (b, a)
+                    if pair in checked:
+                        continue
+                    checked.add(pair)
+                    (la, sa), (lb, sb) = segments[a], segments[b]
+                    pa, pb = lines[la][sa], lines[la][sa + 1]
+                    qa, qb = lines[lb][sb], lines[lb][sb + 1]
+                    hit = _segment_intersection(planar(pa), planar(pb), planar(qa), planar(qb))
+                    if hit is None:
+                        continue
+                    t, u = hit
+                    t_end = t <= eps or t >= 1 - eps
+                    u_end = u <= eps or u >= 1 - eps
+                    if t_end and u_end:
+                        continue  # meeting at existing vertices, already shared by hashing
+                    if t_end:
+                        vid = pa if t <= eps else pb
+                    elif u_end:
+                        vid = qa if u <= eps else qb
+                    else:
+                        x, y = planar(pa)
+                        (x2, y2) = planar(pb)
+                        vid = vertex((x + t * (x2 - x)) / x_scale, y + t * (y2 - y))
+                    if not t_end and vid not in (pa, pb):
+                        splits.setdefault(a, []).append((t, vid))
+                    if not u_end and vid not in (qa, qb):
+                        splits.setdefault(b, []).append((u, vid))
+
+        # 3. Insert the split vertices into their lines, in order along each segment
+        s_index = 0
+        for li, seq in enumerate(lines):
+            split_line = [seq[0]]
+            for si in range(len(seq) - 1):
+                for _, vid in sorted(splits.get(s_index, ())):
+                    if split_line[-1] != vid:
+                        split_line.append(vid)
+                if split_line[-1] != seq[si + 1]:
+                    split_line.append(seq[si + 1])
+                s_index += 1
+            lines[li] = split_line
+
+        # 4. Attach campus nodes and find junctions
+        shards = run_sharded(_snap_task, vertices, node_index, workers, threshold, PARALLEL_MIN_VERTICES)
+        snapped = [name for shard in shards for name in shard]
+        neighbors = [set() for _ in vertices]
+        line_ends = set()
+        for seq in lines:
+            line_ends.update((seq[0], seq[-1]))
+            for a, b in zip(seq, seq[1:]):
+                neighbors[a].add(b)
+                neighbors[b].add(a)
+        labels = {}
+        for vid in range(len(vertices)):
+            if snapped[vid]:
+                labels[vid] = snapped[vid]
+            elif vid in line_ends or len(neighbors[vid]) != 2:
+                labels[vid] = f"~j{vid}"
+
+        # 5. Split every line at labeled vertices
+        edges = []
+        for seq in lines:
+            start = 0
+            for i in range(1, len(seq)):
+                if seq[i] in labels:
+                    a, b = labels[seq[start]], labels[seq[i]]
+                    if a != b:
+                        edges.append((a, b, [list(vertices[v]) for v in seq[start:i + 1]]))
+                    start = i
+        return cls(vertices, labels, edges)
+
+    def to_geometry_graph(self, node_index=None, threshold=5.0):
+        """
+        Returns a GeometryGraph over the network (junctions included as "~j<id>"
+        nodes), keeping the shortest polyline where two lines join the same pair.
+        """
+        geometry_graph = GeometryGraph.from_adjacency({}, node_index, threshold)
+        for a, b, coords in self.edges:
+            existing = geometry_graph.adj.get(a, {}).get(b)
+            if existing is None or polyline_length(coords) < existing["distance"]:
+                geometry_graph.add_edge(a, b, coords)
+        return geometry_graph
+
+    def to_graph(self, walking_speed=1.4):
+        """
+        Returns an edgegraph.Graph routing purely on the path geometry: every
+        named node and junction becomes a location, and every network edge a
+        connection in both directions with distance (km) and time (seconds at
+        walking_speed m/s) metrics.
+        """
+        from edgegraph import Graph
+
+        graph = Graph()
+        with graph.bulk_changes():
+            for vid, name in self.labels.items():
+                lon, lat = self.vertices[vid]
+                graph.add_location(name, lat, lon, is_building=False)
+            for a, neighbors in self.to_geometry_graph().adj.items():
+                for b, info in neighbors.items():
+                    graph.add_connection(a, b, {
+                        "time": info["distance"] / walking_speed,
+                        "distance": info["distance"] / 1000.0,
+                    })
+        return graph
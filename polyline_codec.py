@@ -0,0 +1,96 @@
+# The Local Graph, Polyline Codec Module
+# Encoded polyline strings (the Google polyline algorithm) for compact route payloads.
+
+import math
+
+DEFAULT_PRECISION = 5  # Decimal digits kept per coordinate; 5 is about 1 m, 6 about 0.1 m
+
+
+# ----------------------------------------------------------------------------------
+# Encoder / Decoder
+# ----------------------------------------------------------------------------------
+
+
+def _encode_value(value, chunks):
+    """Appends the characters of one signed integer delta to chunks."""
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+
+
+def encode(points, precision=DEFAULT_PRECISION):
+    """
+    Encodes a list of (lat, lon) points as a polyline string. Each coordinate is
+    rounded to precision decimals and stored as the delta from the previous point
+    in 5-bit ASCII chunks, so nearby points cost only a few bytes each.
+    """
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = prev_lon = 0
+    for lat, lon in points:
+        lat_i, lon_i = int(round(lat * factor)), int(round(lon * factor))
+        _encode_value(lat_i - prev_lat, chunks)
+        _encode_value(lon_i - prev_lon, chunks)
+        prev_lat, prev_lon = lat_i, lon_i
+    return "".join(chunks)
+
+
+def decode(encoded, precision=DEFAULT_PRECISION):
+    """Decodes a polyline string back into a list of [lat, lon] points."""
+    factor = 10 ** precision
+    points = []
+    index = lat = lon = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= length:
+                    raise ValueError("Truncated polyline string")
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append([lat / factor, lon / factor])
+    return points
+
+
+# ----------------------------------------------------------------------------------
+# Routes
+# ----------------------------------------------------------------------------------
+
+
+def encode_route(route, polylines, precision=DEFAULT_PRECISION, tolerance=0.0):
+    """
+    Encodes the geometry of a routing.RouteResult as one polyline string, using
+    the precomputed edge polylines (geometry_graph.RoutePolylines) at the LOD
+    level for tolerance meters. Returns None if no route was found.
+    """
+    if not route.found:
+        return None
+    return encode(polylines.route_points(route.edge_ids, tolerance), precision)
+
+
+def route_payload(route, polylines, precision=DEFAULT_PRECISION, tolerance=0.0):
+    """
+    Returns a JSON-ready dict describing a RouteResult: the encoded geometry,
+    its precision, the edge keys, the metric totals and the visiting order.
+    Without polylines, "polyline" is None.
+    """
+    return {
+        "found": route.found,
+        "metric": route.metric,
+        "totals": {m: (v if math.isfinite(v) else None) for m, v in route.totals.items()},
+        "edges": route.edges or [],
+        "waypoints": route.waypoints,
+        "precision": precision,
+        "polyline": encode_route(route, polylines, precision, tolerance) if polylines is not None else None,
+    }
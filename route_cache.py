@@ -0,0 +1,141 @@
+# The Local Graph, Route Cache Module
+# Bounded in-process LRU cache of computed routes, invalidated by graph version.
+
+import math
+import threading
+from collections import OrderedDict
+
+from compact_graph import CompactGraph, ConnectionMatrix
+
+
+def graph_version(graph):
+    """
+    Returns the version stamp of any graph representation used by routing:
+    Graph.version for a Graph or its connection matrix, the fingerprint for a
+    CompactGraph, and None for a plain dict (which is never cached).
+    """
+    if isinstance(graph, ConnectionMatrix):
+        graph = graph.graph
+    if isinstance(graph, CompactGraph):
+        return graph.fingerprint()
+    return getattr(graph, 'version', None)
+
+
+class RouteCache:
+    """
+    Thread-safe LRU cache of route results.
+
+    Keys are (start, waypoints tuple, end, metric, graph version, options), where
+    options is a tuple of extra flags that change the result. Seeing a new
+    graph version drops every entry, so a reloaded graph never serves stale routes.
+    Counters: hits, misses, evictions (LRU removals) and invalidations (clears
+    caused by a version change). sync() carries unaffected entries over to a
+    newer version of an edited graph instead.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_version(self, version):
+        """Clears the cache if version differs from the one the entries belong to."""
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def get(self, start, waypoints, end, metric, version, options=()):
+        """Returns the cached result or None, updating the hit/miss counters."""
+        key = (start, tuple(waypoints), end, metric, version, options)
+        with self._lock:
+            self._check_version(version)
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, start, waypoints, end, metric, version, result, options=()):
+        """Stores a result, evicting the least recently used entries beyond maxsize."""
+        key = (start, tuple(waypoints), end, metric, version, options)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def sync(self, graph):
+        """
+        Moves the entries to graph.version, keeping the ones the changes since the
+        cached version cannot affect (see Graph.changes_since). A change that only
+        makes an edge more expensive (or removes it) leaves every route that does
+        not use the edge optimal, so those entries are kept; entries using a
+        changed edge or optimizing a metric that some edge got cheaper in are
+        dropped. Added or removed locations, or a change log that no longer
+        reaches back far enough, clear the cache as a version change always did.
+        """
+        with self._lock:
+            if self.version is None or self.version == graph.version or not self._entries:
+                return
+            changes = graph.changes_since(self.version) if isinstance(self.version, int) else None
+            if changes is None or any(op in ('add_node', 'remove_node') for _, op, _, _ in changes):
+                self._check_version(graph.version)
+                return
+            # Compare each changed edge's weight before the first change with its weight now
+            before = {}
+            for _, op, key, old in changes:
+                if op.endswith('_edge') and key not in before:
+                    before[key] = old
+            changed = {}
+            for (source, destination), old in before.items():
+                new = graph.nodes[source]['connections'].get(destination)
+                changed[f"{source}-{destination}"] = (old, new)
+
+            entries = OrderedDict()
+            for key, result in self._entries.items():
+                metric = key[3]
+                edges = (result.get("edges") if isinstance(result, dict) else result.edges) or ()
+                if any(e in changed for e in edges):
+                    continue
+                if any(_metric_value(new, metric) < _metric_value(old, metric) for old, new in changed.values()):
+                    continue
+                entries[key[:4] + (graph.version,) + key[5:]] = result
+            if len(entries) < len(self._entries):
+                self.invalidations += 1
+            self._entries = entries
+            self.version = graph.version
+
+    def clear(self):
+        """Drops every entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the counters and current size as a dict."""
+        return {
+            "size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits,
+            "misses": self.misses, "evictions": self.evictions, "invalidations": self.invalidations,
+        }
+
+
+def _metric_value(weight, metric):
+    """Value of metric in a Graph connection weight (a metrics dict, a scalar, or None when absent); inf if missing."""
+    if weight is None:
+        return math.inf
+    if isinstance(weight, dict):
+        value = weight.get(metric)
+        return math.inf if value is None else float(value)
+    return float(weight)
@@ -0,0 +1,172 @@
+# The Local Graph, Route Table Module
+# Precomputed building-to-everywhere shortest path trees for constant time route legs.
+
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from binary_store import read_bundle, read_bundle_meta, write_bundle
+from contraction_hierarchy import ch_search
+from worker_pool import init_worker, worker_state
+
+INF = float('inf')
+TABLE_VERSION = 1
+
+
+def _tree_task(source, metrics):
+    """Computes the shortest path trees of one origin for every metric."""
+    compact = worker_state("route_table")
+    return [compact.shortest_path_tree(source, metric) for metric in metrics]
+
+
+class RouteTable:
+    """
+    Shortest path trees from a fixed set of origins (the buildings) to every node.
+
+    Stores:
+      - origins: Origin node ids; row i of every matrix belongs to origins[i].
+      - dist[metric]: Flat len(origins) x len(compact) array of path costs.
+      - prev[metric]: Flat array of the same shape holding the predecessor edge
+        id of every node in that origin's tree (-1 at the root or if unreachable).
+
+    A leg from an origin is answered by one lookup plus a walk up the tree.
+    """
+    def __init__(self, compact, origins, metrics, dist, prev):
+        self.compact = compact
+        self.origins = array('i', origins)
+        self.metrics = list(metrics)
+        self.dist = dist
+        self.prev = prev
+        self.row = {origin: i for i, origin in enumerate(self.origins)}
+
+    @classmethod
+    def build(cls, compact, origins, metrics=('time', 'distance'), workers=None):
+        """
+        Runs one one-to-all search per origin and metric. With workers > 1 (or
+        None for one per CPU) the origins are spread over a process pool.
+        """
+        metrics = [m for m in metrics if m in compact.weights]
+        origins = list(origins)
+        if workers == 1 or len(origins) < 2:
+            init_worker("route_table", compact)
+            trees = [_tree_task(origin, metrics) for origin in origins]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=("route_table", compact)) as pool:
+                trees = list(pool.map(_tree_task, origins, [metrics] * len(origins),
+                                      chunksize=max(1, len(origins) // (4 * (workers or os.cpu_count() or 1)))))
+
+        dist = {m: array('d') for m in metrics}
+        prev = {m: array('i') for m in metrics}
+        for per_metric in trees:
+            for metric, (d, p) in zip(metrics, per_metric):
+                dist[metric].extend(d)
+                prev[metric].extend(p)
+        return cls(compact, origins, metrics, dist, prev)
+
+    # ------------------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------------------
+    def save(self, path):
+        """Writes the table to path, stamped with the graph fingerprint."""
+        meta = {"version": TABLE_VERSION, "graph": self.compact.fingerprint(), "metrics": self.metrics}
+        arrays = {"origins": self.origins}
+        for metric in self.metrics:
+            arrays[f"dist:{metric}"] = self.dist[metric]
+            arrays[f"prev:{metric}"] = self.prev[metric]
+        write_bundle(path, meta, arrays)
+
+    @classmethod
+    def load(cls, path, compact, origins=None):
+        """
+        Loads a saved table, or returns None if it is missing, belongs to another
+        graph, or (when origins is given) covers a different set of origins.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            meta = read_bundle_meta(path)
+            if meta.get("version") != TABLE_VERSION or meta.get("graph") != compact.fingerprint():
+                return None
+            _, arrays = read_bundle(path)
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read route table {path}: {e}")
+            return None
+        if origins is not None and list(arrays["origins"]) != list(origins):
+            return None
+        metrics = meta["metrics"]
+        return cls(compact, arrays["origins"], metrics,
+                   {m: arrays[f"dist:{m}"] for m in metrics},
+                   {m: arrays[f"prev:{m}"] for m in metrics})
+
+    # ------------------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------------------
+    def discard(self, metric):
+        """Forgets the trees of metric (after its weights change); its legs are then searched instead."""
+        if metric in self.dist:
+            self.metrics.remove(metric)
+            del self.dist[metric]
+            del self.prev[metric]
+
+    def covers(self, source, metric):
+        """True if legs from node id source can be answered for metric."""
+        return source in self.row and metric in self.dist
+
+    def leg(self, source, target, metric):
+        """Returns (edge_ids, cost) from the table, like CompactGraph.shortest_path."""
+        base = self.row[source] * len(self.compact)
+        cost = self.dist[metric][base + target]
+        if cost == INF:
+            return [], INF
+        prev, sources = self.prev[metric], self.compact.sources
+        edge_ids = []
+        node = target
+        while node != source:
+            e = prev[base + node]
+            edge_ids.append(e)
+            node = sources[e]
+        edge_ids.reverse()
+        return edge_ids, cost
+
+
+# ----------------------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------------------
+
+
+def route_table_path(excel_file):
+    """Returns the file the route table is persisted to, next to the workbook."""
+    return os.path.splitext(excel_file)[0] + ".routes.bin"
+
+
+def prepare_route_table(graph, excel_file='compendium.xlsx', workers=None):
+    """
+    Loads (or builds and saves) the building route table of graph and attaches
+    it to its CompactGraph, where the "table" routing algorithm picks it up.
+    """
+    compact = graph.get_compact_graph()
+    origins = [compact.ids[name] for name, is_building in graph.node_type.items()
+               if is_building and name in compact.ids]
+    path = route_table_path(excel_file)
+    table = RouteTable.load(path, compact, origins)
+    if table is None:
+        table = RouteTable.build(compact, origins, workers=workers)
+        try:
+            table.save(path)
+        except OSError as e:
+            print(f"Warning: could not write route table {path}: {e}")
+    compact.route_table = table
+    return table
+
+
+def table_search(compact, source, target, metric='time'):
+    """
+    Search kernel for routing.SEARCH_ALGORITHMS: answers legs that start at a
+    precomputed origin from the route table and everything else with the
+    contraction hierarchy / A* kernel.
+    """
+    table = compact.route_table
+    if table is not None and table.covers(source, metric):
+        return table.leg(source, target, metric)
+    return ch_search(compact, source, target, metric)
@@ -0,0 +1,125 @@
+# The Local Graph, Routing Module
+# Multi-leg route computation shared by the Streamlit app and other front ends.
+
+import math
+
+from compact_graph import CompactGraph
+from contraction_hierarchy import ch_search
+from dijkstras_algorithm import compact_graph_for
+from edgegraph import Graph
+from route_cache import graph_version
+from route_table import table_search
+from tracing import count
+from waypoint_order import order_waypoints
+
+# Point-to-point search kernels selectable through compute_route(algorithm=...)
+SEARCH_ALGORITHMS = {
+    'dijkstra': CompactGraph.shortest_path,
+    'astar': CompactGraph.astar,
+    'bidirectional': CompactGraph.bidirectional,
+    'ch': ch_search,
+    'table': table_search,
+}
+
+
+class RouteResult:
+    """
+    Result of a multi-leg route search.
+
+    Stores:
+      - edges: Ordered "A-B" edge keys along the whole route.
+      - edge_ids: The same edges as CompactGraph edge ids.
+      - metric: The metric the route was optimized for.
+      - totals: Accumulated value of every metric along the chosen route,
+        e.g. {'time': 271.6, 'distance': 0.41, 'gain': 3.0, 'loss': 5.0}.
+      - waypoints: The waypoints in the order the route visits them.
+    """
+    def __init__(self, edges, edge_ids, metric, totals, found=True, waypoints=None):
+        self.edges = edges
+        self.edge_ids = edge_ids
+        self.metric = metric
+        self.totals = totals
+        self.found = found
+        self.waypoints = waypoints or []
+
+    @classmethod
+    def not_found(cls, metric):
+        """Returns the result used when any leg of the route is unreachable."""
+        return cls(None, [], metric, {metric: math.inf}, found=False)
+
+    @property
+    def total(self):
+        """Total of the optimized metric (inf if no route was found)."""
+        return self.totals.get(self.metric, math.inf)
+
+    def __repr__(self):
+        return f"RouteResult(metric={self.metric!r}, found={self.found}, totals={self.totals}, edges={self.edges})"
+
+
+def accumulate_metrics(compact, edge_ids):
+    """
+    Sums every metric of the CompactGraph along a list of edge ids.
+    Edges that lack a metric contribute nothing to that metric's total.
+    """
+    totals = {}
+    for metric, weights in compact.weights.items():
+        totals[metric] = math.fsum(w for w in (weights[e] for e in edge_ids) if w != math.inf)
+    return totals
+
+
+def compute_route(graph, start, waypoints, end, metric='time', algorithm='dijkstra', cache=None,
+                  optimize_order=False):
+    """
+    Compute a route from start to end through the ordered waypoints with one
+    search per leg, optimizing metric and accumulating all other metrics along
+    the chosen edges. algorithm picks the search kernel from SEARCH_ALGORITHMS.
+    With optimize_order, the waypoints are visited in the cheapest order instead
+    (see waypoint_order.order_waypoints) and algorithm is not used.
+    If a RouteCache is given, results are looked up and stored per algorithm under
+    the graph's version stamp (after an edit of a Graph, the entries the edit
+    cannot affect are carried over, see RouteCache.sync). Returns a RouteResult.
+    """
+    if cache is not None and isinstance(graph, Graph):
+        cache.sync(graph)
+    version = graph_version(graph) if cache is not None else None
+    if version is None:
+        return _search_route(graph, start, waypoints, end, metric, algorithm, optimize_order)
+
+    # Kernels agree on the cost but may pick different routes of equal cost, so the
+    # algorithm is part of the key (it is not used when optimizing the order)
+    options = ('optimize_order',) if optimize_order else (('algorithm', algorithm),)
+    route = cache.get(start, waypoints, end, metric, version, options)
+    if route is None:
+        route = _search_route(graph, start, waypoints, end, metric, algorithm, optimize_order)
+        cache.put(start, waypoints, end, metric, version, route, options)
+    return route
+
+
+def _search_route(graph, start, waypoints, end, metric, algorithm, optimize_order):
+    """Runs the searches for compute_route."""
+    search = SEARCH_ALGORITHMS[algorithm]
+    compact = compact_graph_for(graph)
+    stops = [start, *waypoints, end]
+    ids = [compact.ids.get(name) for name in stops]
+    if None in ids:
+        return RouteResult.not_found(metric)
+
+    if optimize_order and len(waypoints) > 1:
+        order, edge_ids = order_waypoints(compact, ids[0], ids[1:-1], ids[-1], metric)
+        if order is None:
+            return RouteResult.not_found(metric)
+        waypoints = [compact.names[i] for i in order]
+    else:
+        edge_ids = []
+        for source, target in zip(ids, ids[1:]):
+            # Kernels that search report their settled nodes; route table lookups settle none
+            compact.last_settled = 0
+            leg, cost = search(compact, source, target, metric)
+            count("route_legs")
+            count("nodes_settled", compact.last_settled)
+            if cost == math.inf:
+                return RouteResult.not_found(metric)
+            edge_ids.extend(leg)
+
+    edges = [compact.edge_key(e) for e in edge_ids]
+    return RouteResult(edges, edge_ids, metric, accumulate_metrics(compact, edge_ids), waypoints=list(waypoints))
@@ -0,0 +1,313 @@
+# The Local Graph, Routing Service Module
+# Headless JSON routing API on asyncio, for kiosks and mobile clients that do not need the Streamlit app.
+#
+# Endpoints (GET with query parameters; /route also accepts a POST with a JSON body):
+#   /route?start=Fir&end=Oak Pavilion&waypoints=Manzanita,Redbud&metric=time&optimize=1
+#   /nearest?lat=38.031&lon=-120.387&max_distance=50
+#   /buildings
+#   /health
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from contraction_hierarchy import prepare_hierarchies
+from edgegraph import Graph
+from geometry_graph import GeometryArtifacts, input_key
+from polyline_codec import DEFAULT_PRECISION, route_payload
+from route_cache import RouteCache
+from route_table import prepare_route_table
+from routing import SEARCH_ALGORITHMS, compute_route
+from worker_pool import init_worker, worker_state
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_HEADER_LINES = 100
+MAX_PRECISION = 10  # Polyline decimals; a double holds no more, and 10 ** precision overflows far beyond
+
+
+# ----------------------------------------------------------------------------------
+# Service state: loaded once, shared read-only with the search workers
+# ----------------------------------------------------------------------------------
+
+
+class ServiceState:
+    """
+    Everything the service answers from.
+
+    Stores:
+      - graph: The loaded edgegraph.Graph (its version keys the route cache).
+      - compact: The graph's CompactGraph with hierarchies and route table attached.
+      - polylines: RoutePolylines of the graph's edges, or None without GeoJSON data.
+      - buildings: Sorted list of {"name", "latitude", "longitude"} dicts.
+    """
+    def __init__(self, graph, compact, polylines):
+        self.graph = graph
+        self.compact = compact
+        self.polylines = polylines
+        self.buildings = [
+            {"name": name, "latitude": graph.location_data[name]["latitude"],
+             "longitude": graph.location_data[name]["longitude"]}
+            for name in sorted(n for n, is_bldg in graph.node_type.items() if is_bldg and n in graph.location_data)
+        ]
+
+    @classmethod
+    def load(cls, excel_path="compendium.xlsx", geojson_path="qgis_1.json"):
+        """Loads the graph, its routing structures and (if the GeoJSON exists) the route polylines."""
+        graph = Graph()
+        graph.load_from_excel(excel_path)
+        compact = graph.get_compact_graph()
+        prepare_hierarchies(compact, excel_path)
+        prepare_route_table(graph, excel_path)
+        graph.get_spatial_index()
+
+        polylines = None
+        if geojson_path and os.path.exists(geojson_path):
+            with open(geojson_path, "r") as f:
+                geojson_data = json.load(f)
+            cache_path = os.path.splitext(geojson_path)[0] + ".geometry.bin"
+            artifacts = GeometryArtifacts.load_or_build(
+                geojson_data, graph.get_spatial_index(), input_key(geojson_path, excel_path), cache_path,
+                noded=True, workers=None, compact=compact
+            )
+            polylines = artifacts.polylines
+        else:
+            print(f"Warning: {geojson_path} not found; routes are served without geometry.")
+        return cls(graph, compact, polylines)
+
+
+def _route_task(start, waypoints, end, metric, algorithm, optimize_order, precision):
+    """Computes one route and returns its JSON payload."""
+    compact, polylines = worker_state("routing_service")
+    route = compute_route(compact, start, waypoints, end, metric=metric, algorithm=algorithm,
+                          optimize_order=optimize_order)
+    return route_payload(route, polylines, precision)
+
+
+# ----------------------------------------------------------------------------------
+# Request handling
+# ----------------------------------------------------------------------------------
+
+
+class HTTPError(Exception):
+    """An error answered with the given HTTP status and a JSON {"error": message} body."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class RoutingService:
+    """
+    asyncio HTTP/1.1 server answering the JSON endpoints. Route searches run in
+    a process pool so the event loop only parses requests and writes responses;
+    repeated routes are answered from a RouteCache without reaching the pool, and
+    identical requests in flight at the same time share one search.
+    """
+    def __init__(self, state, workers=None, cache_size=1024):
+        self.state = state
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = RouteCache(maxsize=cache_size)
+        self.in_flight = {}
+        self.pool = None
+
+    def start_pool(self):
+        """Starts the search workers (each receives the routing data once)."""
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                        initargs=("routing_service", (self.state.compact, self.state.polylines)))
+
+    async def serve(self, host="127.0.0.1", port=8502):
+        """Runs the server until cancelled."""
+        self.start_pool()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Routing service listening on http://{host}:{port} with {self.workers} workers")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+
+    async def handle_connection(self, reader, writer):
+        """Answers requests on one connection until the client closes it (keep-alive)."""
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                try:
+                    status, payload = 200, await self.dispatch(method, target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": e.message}
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as e:
+            self.write_response(writer, e.status, {"error": e.message}, False)
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        """Reads one request; returns (method, target, headers, body) or None at end of stream."""
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    def write_response(self, writer, status, payload, keep_alive):
+        """Writes a JSON response."""
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+    async def dispatch(self, method, target, body):
+        """Routes a request to its endpoint and returns the JSON payload."""
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if method == "POST" and body:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                raise HTTPError(400, "Body must be a JSON object")
+            params.update(data)
+        elif method not in ("GET", "POST"):
+            raise HTTPError(405, f"Method {method} not allowed")
+
+        if url.path == "/route":
+            return await self.route(params)
+        if url.path == "/nearest":
+            return self.nearest(params)
+        if url.path == "/buildings":
+            return {"buildings": self.state.buildings}
+        if url.path == "/health":
+            return {"status": "ok", "nodes": len(self.state.compact), "cache": self.cache.stats()}
+        raise HTTPError(404, f"Unknown endpoint {url.path}")
+
+    async def route(self, params):
+        """/route: start, end, optional waypoints (list or comma-separated), metric, algorithm, optimize, precision."""
+        start, end = params.get("start"), params.get("end")
+        if not start or not end:
+            raise HTTPError(400, "start and end are required")
+        waypoints = params.get("waypoints") or []
+        if isinstance(waypoints, str):
+            waypoints = [w.strip() for w in waypoints.split(",") if w.strip()]
+        metric = params.get("metric", "time")
+        algorithm = params.get("algorithm", "table")
+        # A JSON body can carry any type; names end up in dict lookups and the cache key
+        if not all(isinstance(v, str) for v in (start, end, metric, algorithm)) or not (
+            isinstance(waypoints, list) and all(isinstance(w, str) for w in waypoints)
+        ):
+            raise HTTPError(400, "start, end, waypoints, metric and algorithm must be strings")
+        optimize_order = str(params.get("optimize", "")).lower() in ("1", "true", "yes")
+        try:
+            precision = int(params.get("precision", DEFAULT_PRECISION))
+        except (TypeError, ValueError, OverflowError):
+            raise HTTPError(400, "precision must be an integer")
+        if not 0 <= precision <= MAX_PRECISION:
+            raise HTTPError(400, f"precision must be between 0 and {MAX_PRECISION}")
+        if metric not in self.state.compact.weights:
+            raise HTTPError(400, f"Unknown metric {metric!r}; expected one of {sorted(self.state.compact.weights)}")
+        if algorithm not in SEARCH_ALGORITHMS:
+            raise HTTPError(400, f"Unknown algorithm {algorithm!r}; expected one of {sorted(SEARCH_ALGORITHMS)}")
+        unknown = [n for n in (start, *waypoints, end) if n not in self.state.compact.ids]
+        if unknown:
+            raise HTTPError(404, f"Unknown location(s): {', '.join(map(str, unknown))}")
+
+        search = ('optimize_order',) if optimize_order else (('algorithm', algorithm),)
+        options = search + (('precision', precision),)
+        version = self.state.graph.version
+        payload = self.cache.get(start, waypoints, end, metric, version, options)
+        if payload is not None:
+            return payload
+        # Identical requests arriving while a search is running share its result
+        key = (start, tuple(waypoints), end, metric, version, options)
+        future = self.in_flight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self.pool, _route_task, start, waypoints, end, metric, algorithm, optimize_order, precision
+            )
+            self.in_flight[key] = future
+            try:
+                payload = await future
+                self.cache.put(start, waypoints, end, metric, version, payload, options)
+            finally:
+                del self.in_flight[key]
+            return payload
+        return await asyncio.shield(future)
+
+    def nearest(self, params):
+        """/nearest: lat, lon and optional max_distance (meters). A KD-tree lookup, cheap enough for the loop."""
+        try:
+            lat, lon = float(params["lat"]), float(params["lon"])
+            max_distance = float(params["max_distance"]) if params.get("max_distance") not in (None, "") else None
+        except (KeyError, TypeError, ValueError):
+            raise HTTPError(400, "lat and lon must be numbers")
+        found = self.state.graph.snap_to_graph(lat, lon, max_distance)
+        if found is None:
+            raise HTTPError(404, "No node within max_distance")
+        name, distance = found
+        return {"name": name, "distance_m": distance, "is_building": bool(self.state.graph.node_type.get(name))}
+
+
+# ----------------------------------------------------------------------------------
+# Entry point
+# ----------------------------------------------------------------------------------
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Local Graph routes as JSON over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--workers", type=int, default=None, help="search processes (default: one per CPU)")
+    parser.add_argument("--excel", default="compendium.xlsx")
+    parser.add_argument("--geojson", default="qgis_1.json")
+    args = parser.parse_args(argv)
+
+    service = RoutingService(ServiceState.load(args.excel, args.geojson), workers=args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("Routing service stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# The Local Graph, Spatial Index Module
+# KD-tree over node coordinates for nearest-node and radius queries.
+
+import heapq
+import math
+
+import numpy as np
+
+from geodesy import EARTH_RADIUS_M, haversine_distance, pairwise_distances
+from tracing import count
+
+
+def _unit_vector(lat, lon):
+    """Projects a lat/lon onto the unit sphere as an (x, y, z) point."""
+    phi, lam = math.radians(lat), math.radians(lon)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+
+def _chord(distance_m):
+    """Straight-line distance on the unit sphere between points distance_m apart."""
+    return 2 * math.sin(min(distance_m / (2 * EARTH_RADIUS_M), math.pi / 2))
+
+
+class SpatialIndex:
+    """
+    KD-tree over the nodes of Graph.location_data.
+
+    Points are projected onto the unit sphere, where straight-line (chord)
+    distance grows monotonically with great-circle distance, so pruning on
+    splitting planes never discards a true neighbor. Candidates are ranked with
+    geodesy.haversine_distance and ties go to the node that comes first in
+    location_data, which gives exactly the answers of MAIN.find_closest_node.
+    Nodes without coordinates are left out.
+
+    apply_changes keeps the index current as the graph changes: moved and added
+    nodes are inserted as new points and the points they replace are marked
+    dead, so the tree is rebuilt only once dead points outnumber live ones.
+    """
+    def __init__(self, location_data):
+        self.names = []
+        self.latitudes = []
+        self.longitudes = []
+        points = []
+        for name, coords in location_data.items():
+            lat, lon = coords.get("latitude"), coords.get("longitude")
+            if lat is None or lon is None:
+                continue
+            self.names.append(name)
+            self.latitudes.append(lat)
+            self.longitudes.append(lon)
+            points.append(_unit_vector(lat, lon))
+        self.points = points
+        # Tie-break rank of every point (its node's position in location_data), and dead (replaced) points
+        self.order = list(range(len(points)))
+        self.dead = [False] * len(points)
+        self.slot = {name: i for i, name in enumerate(self.names)}
+        self.next_order = len(points)
+        # Flat tree: node i splits on axis[i] at point split[i]; children left[i]/right[i] (-1 = none)
+        self.split, self.axis, self.left, self.right = [], [], [], []
+        self.root = self._build(list(range(len(points))), 0)
+
+    def __len__(self):
+        return len(self.slot)
+
+    def _build(self, indices, depth):
+        """Recursively builds the tree over point indices; returns the node id."""
+        if not indices:
+            return -1
+        axis = depth % 3
+        indices.sort(key=lambda i: self.points[i][axis])
+        mid = len(indices) // 2
+        node = len(self.split)
+        self.split.append(indices[mid])
+        self.axis.append(axis)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.left[node] = self._build(indices[:mid], depth + 1)
+        self.right[node] = self._build(indices[mid + 1:], depth + 1)
+        return node
+
+    # ------------------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------------------
+    def _insert(self, name, lat, lon, order):
+        """Adds a point below the leaf its coordinates lead to (O(depth))."""
+        i = len(self.points)
+        self.names.append(name)
+        self.latitudes.append(lat)
+        self.longitudes.append(lon)
+        self.points.append(_unit_vector(lat, lon))
+        self.order.append(order)
+        self.dead.append(False)
+        self.slot[name] = i
+
+        node = len(self.split)
+        self.split.append(i)
+        self.left.append(-1)
+        self.right.append(-1)
+        if self.root < 0:
+            self.axis.append(0)
+            self.root = node
+            return
+        parent = self.root
+        while True:
+            axis = self.axis[parent]
+            side = self.left if self.points[i][axis] < self.points[self.split[parent]][axis] else self.right
+            if side[parent] < 0:
+                side[parent] = node
+                self.axis.append((axis + 1) % 3)
+                return
+            parent = side[parent]
+
+    def apply_changes(self, location_data, changes):
+        """
+        Applies the node entries of Graph.changes_since (edge entries are ignored)
+        using the current location_data. Returns False, leaving the rebuild to the
+        caller, once dead points outnumber live ones.
+        """
+        for _, op, name, _ in changes:
+            if op not in ('add_node', 'update_node', 'remove_node'):
+                continue
+            i = self.slot.pop(name, None)
+            order = None
+            if i is not None:
+                self.dead[i] = True
+                order = self.order[i]
+            coords = location_data.get(name)
+            if coords is None:
+                continue
+            lat, lon = coords.get("latitude"), coords.get("longitude")
+            if lat is None or lon is None:
+                continue
+            if order is None or op == 'add_node':
+                order = self.next_order
+                self.next_order += 1
+            self._insert(name, lat, lon, order)
+        return len(self.points) - len(self.slot) <= len(self.slot)
+
+    # ------------------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------------------
+    def _search(self, lat, lon, k, radius):
+        """
+        Returns up to k (distance, point index) pairs within radius meters,
+        nearest first (ties by location_data order).
+        """
+        query = _unit_vector(lat, lon)
+        best = []  # max-heap of (-distance, -order, index) holding the current k best
+        slack = 1e-9
+        order, dead = self.order, self.dead
+
+        def bound():
+            if len(best) < k:
+                return _chord(radius) if radius is not None else math.inf
+            return _chord(-best[0][0])
+
+        evaluations = 0
+        stack = [self.root] if self.root >= 0 else []
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            i = self.split[node]
+            delta = query[self.axis[node]] - self.points[i][self.axis[node]]
+            limit = bound() * (1 + slack) + slack
+            if abs(delta) <= limit and not dead[i]:
+                d = haversine_distance(lat, lon, self.latitudes[i], self.longitudes[i])
+                evaluations += 1
+                if radius is None or d <= radius:
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, -order[i], i))
+                    elif (d, order[i]) < (-best[0][0], -best[0][1]):
+                        heapq.heapreplace(best, (-d, -order[i], i))
+                limit = bound() * (1 + slack) + slack
+            near, far = (self.left[node], self.right[node]) if delta < 0 else (self.right[node], self.left[node])
+            if abs(delta) <= limit:
+                stack.append(far)
+            stack.append(near)
+        count("snap_distance_evaluations", evaluations)
+        return [(d, i) for d, _, i in sorted((-d, -o, i) for d, o, i in best)]
+
+    def nearest(self, lat, lon, max_distance=None):
+        """Returns (name, distance_m) of the closest node (within max_distance), or None."""
+        found = self._search(lat, lon, 1, max_distance)
+        if not found:
+            return None
+        d, i = found[0]
+        return self.names[i], d
+
+    def k_nearest(self, lat, lon, k, max_distance=None):
+        """Returns up to k (name, distance_m) pairs, nearest first."""
+        if k <= 0:
+            return []
+        return [(self.names[i], d) for d, i in self._search(lat, lon, k, max_distance)]
+
+    def within_radius(self, lat, lon, radius):
+        """Returns every (name, distance_m) within radius meters, nearest first."""
+        return [(self.names[i], d) for d, i in self._search(lat, lon, len(self.names), radius)]
+
+    def nearest_many(self, lats, lons, max_distance=None, chunk_cells=1_000_000):
+        """
+        Snaps a batch of points at once. Distances to every node are computed
+        as NumPy arrays (in chunks of about chunk_cells matrix cells), and the
+        few candidates within rounding of each row's minimum are re-ranked with
+        haversine_distance, so the answers match nearest() exactly.
+        Returns a list of node names (None where nothing is within max_distance).
+        """
+        lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        result = [None] * len(lats)
+        if not self.slot or not len(lats):
+            return result
+        live = np.flatnonzero(~np.asarray(self.dead, dtype=bool))
+        node_lats, node_lons = np.asarray(self.latitudes)[live], np.asarray(self.longitudes)[live]
+        rows = max(1, chunk_cells // len(live))
+        for start in range(0, len(lats), rows):
+            block = pairwise_distances(lats[start:start + rows], lons[start:start + rows], node_lats, node_lons)
+            count("snap_distance_evaluations", block.size)
+            minima = block.min(axis=1)
+            for r, row_min in enumerate(minima):
+                if max_distance is not None and row_min > max_distance + 1e-6:
+                    continue
+                lat, lon = float(lats[start + r]), float(lons[start + r])
+                candidates = live[block[r] <= row_min + 1e-6]
+                d, _, i = min((haversine_distance(lat, lon, self.latitudes[i], self.longitudes[i]), self.order[i], i)
+                              for i in candidates.tolist())
+                if max_distance is None or d <= max_distance:
+                    result[start + r] = self.names[i]
+        return result
@@ -0,0 +1,43 @@
+# The Local Graph, test configuration
+# The modules live at the repository root; make them importable however pytest is started.
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_campus_graph(rows=4, cols=5, seed=3):
+    """
+    A small fixed campus: a rows x cols grid of junctions "N<r><c>" 100 m apart,
+    every third one a building, joined both ways with uneven times (one street
+    is one-way), plus an unconnected building "Z".
+    """
+    from edgegraph import Graph
+
+    rng = random.Random(seed)
+    graph = Graph()
+    with graph.bulk_changes():
+        for r in range(rows):
+            for c in range(cols):
+                graph.add_location(f"N{r}{c}", 38.03 + r * 0.0009, -120.39 + c * 0.00114,
+                                   is_building=(r * cols + c) % 3 == 0)
+        graph.add_location("Z", 38.02, -120.38, is_building=True)
+        for r in range(rows):
+            for c in range(cols):
+                for dr, dc in ((0, 1), (1, 0)):
+                    if r + dr < rows and c + dc < cols:
+                        a, b = f"N{r}{c}", f"N{r + dr}{c + dc}"
+                        for u, v in ((a, b), (b, a)):
+                            if (u, v) == ("N11", "N12"):
+                                continue  # one-way street
+                            graph.add_connection(u, v, {"time": rng.uniform(72.0, 150.0), "distance": 0.1})
+    return graph
+
+
+@pytest.fixture
+def campus_graph():
+    return build_campus_graph()
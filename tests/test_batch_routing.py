@@ -0,0 +1,95 @@
+# The Local Graph, batch routing tests
+
+import csv
+import io
+import json
+
+import pytest
+
+import batch_routing
+from batch_routing import OUTPUT_METRICS, main, read_pairs, route_pairs
+from benchmark_suite import generate_campus, write_campus
+from edgegraph import Graph
+
+PAIRS = [
+    ("1", "J0", "B14"), ("2", "B4", "J15"), ("3", "J0", "J15"), ("4", "J0", "Nowhere"),
+    ("5", "B4", "J0"), ("6", "Nowhere", "B9"), ("7", "J0", "J0"), ("8", "B9", "B4"),
+]
+
+
+@pytest.fixture
+def campus(tmp_path):
+    """A generated 4x4 campus workbook and a CSV of pairs; returns (excel_path, pairs_path, graph)."""
+    excel_path = str(tmp_path / "campus.xlsx")
+    write_campus(*generate_campus(4, seed=1), excel_path, str(tmp_path / "campus.json"))
+    pairs_path = tmp_path / "pairs.csv"
+    with open(pairs_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "origin", "destination"])
+        writer.writerows(PAIRS)
+    graph = Graph()
+    graph.load_from_excel(excel_path)
+    return excel_path, str(pairs_path), graph
+
+
+def _check(records, graph, metric="time", with_edges=True):
+    compact = graph.get_compact_graph()
+    assert [(r["id"], r["origin"], r["destination"]) for r in records] == PAIRS
+    for record in records:
+        origin, destination = record["origin"], record["destination"]
+        if "Nowhere" in (origin, destination):
+            assert not record["found"] and "unknown" in record["error"]
+            continue
+        edge_ids, cost = compact.shortest_path(compact.ids[origin], compact.ids[destination], metric)
+        assert record["found"] and float(record[metric]) == pytest.approx(cost)
+        assert len(record["edges"]) == (len(edge_ids) if with_edges else 0)
+
+
+def test_main_writes_csv_to_stdout(campus, capsys):
+    excel_path, pairs_path, graph = campus
+    main([pairs_path, "--excel", excel_path, "--workers", "1", "--chunk-size", "3"])
+    captured = capsys.readouterr()
+    assert captured.err.rstrip().endswith("Routed 8 pairs (6 found).")
+    # csv's own \r\n line ends reach stdout untranslated
+    assert captured.out.startswith("id,origin,destination,found,error," + ",".join(OUTPUT_METRICS) + ",edges\r\n")
+    records = list(csv.DictReader(io.StringIO(captured.out)))
+    for record in records:
+        record["found"] = record["found"] == "True"
+        record["edges"] = record["edges"].split()
+    _check(records, graph)
+
+    # stdout is still usable once main is done
+    print("after")
+    assert capsys.readouterr().out == "after\n"
+
+
+def test_main_writes_jsonl(campus, tmp_path):
+    excel_path, pairs_path, graph = campus
+    output = str(tmp_path / "routes.jsonl")
+    main([pairs_path, "-o", output, "--excel", excel_path, "--workers", "1", "--metric", "distance", "--no-edges"])
+    with open(output) as f:
+        records = [json.loads(line) for line in f]
+    _check(records, graph, "distance", with_edges=False)
+
+
+def test_route_pairs_groups_each_chunk_by_origin(campus, monkeypatch):
+    _, pairs_path, graph = campus
+    searches = []
+    original = batch_routing._origin_task
+
+    def recording_task(origin, destinations, *args):
+        searches.append((origin, destinations))
+        return original(origin, destinations, *args)
+
+    monkeypatch.setattr(batch_routing, "_origin_task", recording_task)
+    with open(pairs_path, newline="") as f:
+        results = list(route_pairs(graph.get_compact_graph(), read_pairs(f, "csv"), workers=1, chunk_size=3))
+    assert [row["id"] for row, _ in results] == [p[0] for p in PAIRS]
+    # One search per origin and chunk: chunks are pairs 1-3, 4-6 and 7-8
+    assert searches == [
+        ("J0", ["B14", "J15"]), ("B4", ["J15"]),
+        ("J0", ["Nowhere"]), ("B4", ["J0"]), ("Nowhere", ["B9"]),
+        ("J0", ["J0"]), ("B9", ["B4"]),
+    ]
+    records = [dict(row, **result) for row, result in results]
+    _check(records, graph)
@@ -0,0 +1,85 @@
+# The Local Graph, benchmark suite tests
+
+import json
+
+import pytest
+
+import benchmark_suite
+from benchmark_suite import MIN_COMPARE_RUNS, compare, main, run_size
+
+
+def _stats(best, runs=MIN_COMPARE_RUNS):
+    return {"runs": runs, "ops": 1, "min": best, "median": best * 1.1, "mean": best * 1.2, "per_op_us": 0.0}
+
+
+def _report(results):
+    return {"meta": {}, "results": results}
+
+
+def _write(path, report):
+    with open(path, "w") as f:
+        json.dump(report, f)
+    return str(path)
+
+
+BASELINE = _report({"x1": {
+    "dijkstra": _stats(0.010), "load_excel": _stats(0.200), "path_network": _stats(0.050),
+    "prepare_route_table": _stats(0.100), "find_closest_node": _stats(0.004, runs=1),
+}})
+
+
+def test_compare_flags_only_slowdowns_beyond_the_threshold(tmp_path):
+    current = _report({"x1": {
+        "dijkstra": _stats(0.013),                 # 30% slower
+        "load_excel": _stats(0.220),               # 10% slower: noise
+        "path_network": _stats(0.030),             # 40% faster
+        "prepare_route_table": _stats(0.500, runs=MIN_COMPARE_RUNS - 1),
+        "find_closest_node": _stats(0.008),        # baseline has a single run
+        "geometry_graph": _stats(0.020),
+    }})
+    with open(_write(tmp_path / "current.json", current)) as f:
+        current = json.load(f)
+    with open(_write(tmp_path / "baseline.json", BASELINE)) as f:
+        baseline = json.load(f)
+
+    rows = {name: (base, now, ratio, status) for _, name, base, now, ratio, status in compare(current, baseline)}
+    assert rows["dijkstra"] == (0.010, 0.013, pytest.approx(1.3), "REGRESSION")
+    assert rows["load_excel"][2:] == (pytest.approx(1.1), "ok")
+    assert rows["path_network"][3] == "faster"
+    assert rows["prepare_route_table"][3] == "few runs" and rows["find_closest_node"][3] == "few runs"
+    assert rows["geometry_graph"] == (None, 0.020, None, "new")
+    assert compare(current, baseline, threshold=0.5)[0][-1] == "ok"
+
+
+def _run_main(monkeypatch, tmp_path, results, *args):
+    monkeypatch.setattr(benchmark_suite, "run_size", lambda size, *rest: results[size])
+    baseline = _write(tmp_path / "baseline.json", BASELINE)
+    main(["--sizes", "x1", "--workdir", str(tmp_path), "--compare", baseline, *args])
+
+
+def test_main_exits_on_a_regression(monkeypatch, tmp_path, capsys):
+    out = str(tmp_path / "report.json")
+    with pytest.raises(SystemExit) as exit_info:
+        _run_main(monkeypatch, tmp_path, {"x1": {"dijkstra": _stats(0.020)}}, "--out", out)
+    assert exit_info.value.code == 1
+    captured = capsys.readouterr()
+    assert "REGRESSION" in captured.out and "1 regression(s) beyond 20%." in captured.err
+    with open(out) as f:
+        assert json.load(f)["results"] == {"x1": {"dijkstra": _stats(0.020)}}
+
+
+def test_main_keeps_stdout_parseable_without_out(monkeypatch, tmp_path, capsys):
+    _run_main(monkeypatch, tmp_path, {"x1": {"dijkstra": _stats(0.011), "load_excel": _stats(0.1)}})
+    captured = capsys.readouterr()
+    report = json.loads(captured.out)
+    assert set(report["results"]["x1"]) == {"dijkstra", "load_excel"} and report["meta"]["repeat"] == 3
+    assert "dijkstra" in captured.err and "REGRESSION" not in captured.err
+
+
+def test_run_size_keeps_loader_output_off_stdout(tmp_path, capsys):
+    results = run_size("x1", str(tmp_path), repeat=1, queries=5)
+    assert results["load_excel"]["runs"] == 1
+    assert results["prepare_route_table"]["runs"] == MIN_COMPARE_RUNS
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "load_snapshot" in captured.err
@@ -0,0 +1,66 @@
+# The Local Graph, binary store tests
+
+import os
+import sys
+from array import array
+
+import pytest
+
+from binary_store import atomic_write, read_bundle, read_bundle_meta, write_bundle
+
+
+def test_bundle_round_trip(tmp_path):
+    path = str(tmp_path / "data.bin")
+    arrays = {"ids": array('i', [3, -1, 7]), "empty": array('q'), "weights": array('d', [0.5, 1e300]),
+              "flags": array('b', [1, 0, 1, 1, 0])}
+    write_bundle(path, {"version": 2, "names": ["A", "B"]}, arrays)
+    assert read_bundle_meta(path) == {"version": 2, "names": ["A", "B"]}
+    meta, loaded = read_bundle(path)
+    assert meta == {"version": 2, "names": ["A", "B"]}
+    assert {name: (values.typecode, list(values)) for name, values in loaded.items()} == {
+        name: (values.typecode, list(values)) for name, values in arrays.items()}
+    assert os.listdir(tmp_path) == ["data.bin"]
+
+
+def test_not_a_bundle(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"something else entirely")
+    with pytest.raises(ValueError):
+        read_bundle_meta(str(path))
+    with pytest.raises(ValueError):
+        read_bundle(str(path))
+
+
+@pytest.mark.parametrize("sync", [False, True])
+def test_atomic_write_replaces_the_file(tmp_path, sync):
+    path = tmp_path / "state.json"
+    path.write_text("old")
+    with atomic_write(str(path), sync=sync) as f:
+        f.write("new")
+        # Until the block completes, readers still see the old contents
+        assert path.read_text() == "old"
+        assert [p.name.startswith(".state.json.tmp") for p in tmp_path.iterdir()].count(True) == 1
+    assert path.read_text() == "new"
+    assert os.listdir(tmp_path) == ["state.json"]
+
+
+def test_atomic_write_failure_keeps_the_old_file(tmp_path):
+    path = tmp_path / "state.bin"
+    path.write_bytes(b"old")
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path), "wb") as f:
+            f.write(b"partial")
+            raise RuntimeError("interrupted")
+    assert path.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["state.bin"]
+
+
+def test_bundle_written_by_another_byte_order_is_swapped(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.bin")
+    write_bundle(path, {}, {"ids": array('i', [1, 2, 256])})
+    other = "big" if sys.byteorder == "little" else "little"
+    monkeypatch.setattr(sys, "byteorder", other)
+    _, loaded = read_bundle(path)
+    swapped = array('i', [1, 2, 256])
+    swapped.byteswap()
+    assert list(loaded["ids"]) == list(swapped)
@@ -0,0 +1,53 @@
+# The Local Graph, CompactGraph tests
+
+import math
+
+from compact_graph import CompactGraph
+from contraction_hierarchy import ch_search
+from route_table import table_search
+
+
+def _graph_through_unlocated_node():
+    """S and T are close, but the cheap path detours via B and X, and X has no coordinates."""
+    # (time in seconds, distance in km); S-B runs at the fastest speed, which sets the time scale
+    edges = {
+        'S': {'B': (100.0, 11.2), 'T': (150.0, 0.2)},
+        'B': {'X': (1.0, 0.01)},
+        'X': {'T': (1.0, 0.01)},
+        'T': {},
+    }
+    matrix = {u: {v: {'time': t, 'distance': d} for v, (t, d) in out.items()} for u, out in edges.items()}
+    location_data = {
+        'S': {'latitude': 0.0, 'longitude': 0.0},
+        'T': {'latitude': 0.0, 'longitude': 0.001},
+        'B': {'latitude': 0.0, 'longitude': -0.1},
+        'X': {'latitude': None, 'longitude': None},
+    }
+    return CompactGraph.from_connection_matrix(matrix, location_data=location_data)
+
+
+def test_no_heuristic_when_an_edge_touches_a_node_without_coordinates():
+    compact = _graph_through_unlocated_node()
+    assert compact.heuristic == {}
+
+
+def test_astar_stays_exact_through_nodes_without_coordinates():
+    compact = _graph_through_unlocated_node()
+    s, t = compact.ids['S'], compact.ids['T']
+    _, expected = compact.shortest_path(s, t, 'time')
+    assert expected == 102.0
+    # ch_search and table_search fall back to A* without precomputed data
+    for search in (CompactGraph.astar, ch_search, table_search):
+        edge_ids, cost = search(compact, s, t, 'time')
+        assert cost == expected
+        assert [compact.edge_key(e) for e in edge_ids] == ['S-B', 'B-X', 'X-T']
+
+
+def test_heuristic_kept_when_every_node_has_coordinates():
+    compact = CompactGraph.from_connection_matrix(
+        {'A': {'B': {'time': 60.0, 'distance': 0.1}}, 'B': {'A': {'time': 60.0, 'distance': 0.1}}},
+        location_data={'A': {'latitude': 38.03, 'longitude': -120.38},
+                       'B': {'latitude': 38.0305, 'longitude': -120.3805}},
+    )
+    assert set(compact.heuristic) == {'time', 'distance'}
+    assert not math.isnan(compact.heuristic['time'][0])
@@ -0,0 +1,104 @@
+# The Local Graph, contraction hierarchy tests
+
+import math
+import os
+
+import pytest
+
+from contraction_hierarchy import ContractionHierarchy, ch_search, hierarchy_path, prepare_hierarchies
+
+
+def _pairs(compact):
+    n = len(compact.names)
+    return [(s, t) for s in range(n) for t in range(n)]
+
+
+def _check_path(compact, edge_ids, source, target, metric, cost):
+    """edge_ids is a connected path from source to target whose weights add up to cost."""
+    if source == target:
+        assert edge_ids == []
+        return
+    assert compact.sources[edge_ids[0]] == source and compact.targets[edge_ids[-1]] == target
+    for e, f in zip(edge_ids, edge_ids[1:]):
+        assert compact.targets[e] == compact.sources[f]
+    assert sum(compact.weights[metric][e] for e in edge_ids) == pytest.approx(cost)
+
+
+@pytest.mark.parametrize("metric", ["time", "distance"])
+def test_query_matches_dijkstra(campus_graph, metric):
+    compact = campus_graph.get_compact_graph()
+    hierarchy = ContractionHierarchy.build(compact, metric)
+    for source, target in _pairs(compact):
+        expected = compact.shortest_path(source, target, metric)[1]
+        edge_ids, cost = hierarchy.query(source, target)
+        if math.isinf(expected):
+            assert math.isinf(cost) and edge_ids == []
+        else:
+            assert cost == pytest.approx(expected)
+            _check_path(compact, edge_ids, source, target, metric, cost)
+
+
+def test_one_way_street_is_respected(campus_graph):
+    compact = campus_graph.get_compact_graph()
+    hierarchy = ContractionHierarchy.build(compact, "time")
+    a, b = compact.ids["N11"], compact.ids["N12"]
+    assert hierarchy.query(b, a)[0] == [compact.edge_id(b, a)]
+    assert compact.edge_id(a, b) not in hierarchy.query(a, b)[0]
+
+
+def test_save_load_round_trip(campus_graph, tmp_path):
+    compact = campus_graph.get_compact_graph()
+    hierarchy = ContractionHierarchy.build(compact, "time")
+    path = str(tmp_path / "campus.ch-time.bin")
+    hierarchy.save(path)
+
+    loaded = ContractionHierarchy.load(path, compact, "time")
+    assert loaded is not None and loaded.shortcut_count == hierarchy.shortcut_count
+    assert list(loaded.rank) == list(hierarchy.rank)
+    for source, target in _pairs(compact):
+        assert loaded.query(source, target) == hierarchy.query(source, target)
+
+
+def test_load_rejects_another_graph_or_metric(campus_graph, tmp_path):
+    compact = campus_graph.get_compact_graph()
+    path = str(tmp_path / "campus.ch-time.bin")
+    ContractionHierarchy.build(compact, "time").save(path)
+
+    assert ContractionHierarchy.load(path, compact, "distance") is None
+    assert ContractionHierarchy.load(str(tmp_path / "missing.bin"), compact, "time") is None
+    fingerprint = compact.fingerprint()
+    campus_graph.update_connection("N00", "N01", time=1.0)
+    changed = campus_graph.get_compact_graph()
+    assert changed.fingerprint() != fingerprint
+    assert ContractionHierarchy.load(path, changed, "time") is None
+
+
+def test_prepare_hierarchies_saves_and_reuses(campus_graph, tmp_path, monkeypatch):
+    excel_file = str(tmp_path / "campus.xlsx")
+    compact = campus_graph.get_compact_graph()
+    prepare_hierarchies(compact, excel_file)
+    assert set(compact.hierarchies) == {"time", "distance"}
+    for metric in ("time", "distance"):
+        assert os.path.exists(hierarchy_path(excel_file, metric))
+
+    def no_build(*args, **kwargs):
+        raise AssertionError("a saved hierarchy should have been loaded")
+
+    monkeypatch.setattr(ContractionHierarchy, "build", no_build)
+    compact.hierarchies.clear()
+    prepare_hierarchies(compact, excel_file)
+    assert set(compact.hierarchies) == {"time", "distance"}
+
+
+def test_ch_search_falls_back_to_astar(campus_graph):
+    compact = campus_graph.get_compact_graph()
+    assert not compact.hierarchies
+    source, target = compact.ids["N00"], compact.ids["N34"]
+    expected = compact.shortest_path(source, target, "time")
+    edge_ids, cost = ch_search(compact, source, target, "time")
+    assert cost == pytest.approx(expected[1])
+    _check_path(compact, edge_ids, source, target, "time", cost)
+
+    compact.hierarchies["time"] = ContractionHierarchy.build(compact, "time")
+    assert ch_search(compact, source, target, "time")[1] == pytest.approx(expected[1])
+    assert ch_search(compact, source, compact.ids["Z"], "time") == ([], math.inf)
@@ -0,0 +1,75 @@
+# The Local Graph, Graph change tracking tests
+
+import os
+import shutil
+
+import pytest
+
+from edgegraph import Graph
+from route_cache import RouteCache
+from routing import compute_route
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("use_snapshot", [False, True])
+def test_loading_is_one_version(tmp_path, use_snapshot):
+    excel_file = str(tmp_path / "compendium.xlsx")
+    shutil.copy(os.path.join(ROOT, "compendium.xlsx"), excel_file)
+    Graph().load_from_excel(excel_file)  # writes the snapshot
+
+    graph = Graph()
+    before = graph.version
+    graph.load_from_excel(excel_file, use_snapshot=use_snapshot)
+    assert graph.nodes
+    assert not graph.changes
+    assert graph.changes_since(before) is None  # anything derived before the load is rebuilt
+    assert graph.changes_since(graph.version) == []
+
+
+def test_changes_after_a_bulk_load_are_logged():
+    graph = Graph()
+    with graph.bulk_changes():
+        graph.add_location('A', 38.0, -120.0)
+        graph.add_location('B', 38.001, -120.0)
+        with graph.bulk_changes():
+            graph.add_connection('A', 'B', {'time': 10.0})
+        assert not graph.changes
+    loaded = graph.version
+    compact = graph.get_compact_graph()
+
+    graph.update_connection('A', 'B', time=12.0)
+    assert [(op, key) for _, op, key, _ in graph.changes_since(loaded)] == [('update_edge', ('A', 'B'))]
+    assert graph.get_compact_graph() is compact
+
+
+def _triangle():
+    graph = Graph()
+    graph.add_location('A', 38.0, -120.0)
+    graph.add_location('B', 38.001, -120.0)
+    graph.add_location('C', 38.001, -120.001)
+    graph.add_connection('A', 'B', {'time': 10.0, 'distance': 0.1})
+    graph.add_connection('B', 'C', {'time': 10.0, 'distance': 0.1})
+    graph.add_connection('C', 'B', {'time': 10.0, 'distance': 0.1})
+    return graph
+
+
+def test_removing_a_connected_location_rebuilds_the_compact_graph():
+    graph = _triangle()
+    compact = graph.get_compact_graph()
+    graph.remove_location('A')
+    rebuilt = graph.get_compact_graph()
+    assert rebuilt is not compact
+    assert 'A' not in rebuilt.ids and sorted(rebuilt.ids) == ['B', 'C']
+
+
+def test_removing_a_connected_location_clears_the_route_cache():
+    graph = _triangle()
+    cache = RouteCache()
+    route = compute_route(graph, 'B', [], 'C', metric='time', cache=cache)
+    assert route.found and len(cache) == 1
+    graph.remove_location('A')
+    cache.sync(graph)
+    assert len(cache) == 0 and cache.version == graph.version
+    assert compute_route(graph, 'B', [], 'C', metric='time', cache=cache).found
+    assert not compute_route(graph, 'A', [], 'C', metric='time', cache=cache).found
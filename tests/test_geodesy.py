@@ -0,0 +1,123 @@
+# The Local Graph, geodesy tests
+
+import math
+import random
+
+import numpy as np
+import pytest
+
+from geodesy import (EARTH_RADIUS_M, haversine_array, haversine_distance, pairwise_distances, polyline_length,
+                     segment_lengths, simplify_polyline)
+
+
+# Agreement with the scalar formula to well below nearest_many's 1e-6 m re-ranking margin
+ABS = 1e-6
+
+
+def _points(n, seed):
+    rng = random.Random(seed)
+    return [(38.03 + rng.uniform(-0.01, 0.01), -120.39 + rng.uniform(-0.01, 0.01)) for _ in range(n)]
+
+
+def test_haversine_distance_known_values():
+    assert haversine_distance(38.03, -120.39, 38.03, -120.39) == 0.0
+    # One degree of latitude is about 111.2 km on a 6371 km sphere
+    assert haversine_distance(38.0, -120.0, 39.0, -120.0) == pytest.approx(111194.9, abs=0.1)
+    assert haversine_distance(0.0, 0.0, 0.0, 180.0) == pytest.approx(6371000 * np.pi)
+
+
+def test_haversine_array_matches_scalar():
+    a, b = _points(50, 1), _points(50, 2)
+    lats1, lons1 = zip(*a)
+    lats2, lons2 = zip(*b)
+    distances = haversine_array(lats1, lons1, lats2, lons2)
+    assert distances.shape == (50,)
+    for d, (lat1, lon1), (lat2, lon2) in zip(distances, a, b):
+        assert d == pytest.approx(haversine_distance(lat1, lon1, lat2, lon2), abs=ABS)
+
+
+def test_haversine_array_broadcasts_a_scalar_point():
+    points = _points(20, 3)
+    lats, lons = zip(*points)
+    distances = haversine_array(38.03, -120.39, lats, lons)
+    expected = [haversine_distance(38.03, -120.39, lat, lon) for lat, lon in points]
+    assert list(distances) == pytest.approx(expected, abs=ABS)
+
+
+def test_pairwise_distances_matches_scalar():
+    rows, cols = _points(7, 4), _points(11, 5)
+    matrix = pairwise_distances([p[0] for p in rows], [p[1] for p in rows],
+                                [p[0] for p in cols], [p[1] for p in cols])
+    assert matrix.shape == (7, 11)
+    for i, (lat1, lon1) in enumerate(rows):
+        for j, (lat2, lon2) in enumerate(cols):
+            assert matrix[i, j] == pytest.approx(haversine_distance(lat1, lon1, lat2, lon2), abs=ABS)
+
+
+def test_polyline_length_matches_scalar_sum():
+    coords = [[lon, lat] for lat, lon in _points(30, 6)]  # GeoJSON order
+    expected = [haversine_distance(a[1], a[0], b[1], b[0]) for a, b in zip(coords, coords[1:])]
+    assert list(segment_lengths(coords)) == pytest.approx(expected)
+    assert polyline_length(coords) == pytest.approx(sum(expected))
+
+
+@pytest.mark.parametrize("coords", [[], [[-120.39, 38.03]]])
+def test_polyline_length_of_degenerate_lines(coords):
+    assert len(segment_lengths(coords)) == 0
+    assert polyline_length(coords) == 0.0
+
+
+def _wiggly_line(n, seed):
+    """A [lon, lat] walk of n vertices about 10 m apart, with a few meters of sideways jitter."""
+    rng = random.Random(seed)
+    lon, lat, heading = -120.39, 38.03, 0.0
+    coords = []
+    for _ in range(n):
+        coords.append([lon, lat])
+        heading += rng.uniform(-0.6, 0.6)
+        lat += 9e-5 * math.cos(heading)
+        lon += 1.1e-4 * math.sin(heading)
+    return coords
+
+
+def _offset_from_line(point, line, mean_lat):
+    """Meters from a [lon, lat] point to the nearest segment of line, in the planar frame centered on mean_lat."""
+    x_scale = math.cos(math.radians(mean_lat))
+
+    def planar(c):
+        return np.radians([c[0] * x_scale, c[1]]) * EARTH_RADIUS_M
+
+    p = planar(point)
+    best = math.inf
+    for a, b in zip(line, line[1:]):
+        a, d = planar(a), planar(b) - planar(a)
+        t = float(np.clip((p - a) @ d / (d @ d), 0.0, 1.0)) if d @ d > 0 else 0.0
+        best = min(best, float(np.hypot(*(p - a - t * d))))
+    return best
+
+
+@pytest.mark.parametrize("tolerance", [0.5, 2.0, 8.0, 50.0])
+def test_simplify_polyline_keeps_the_endpoints_and_the_tolerance(tolerance):
+    coords = _wiggly_line(200, seed=7)
+    simplified = simplify_polyline(coords, tolerance)
+    assert simplified[0] == coords[0] and simplified[-1] == coords[-1]
+    assert 2 <= len(simplified) < len(coords)
+    kept = [i for i, c in enumerate(coords) if c in simplified]
+    assert [coords[i] for i in kept] == simplified  # an in-order subset of the input
+    mean_lat = np.mean([c[1] for c in coords])
+    for c in coords:
+        assert _offset_from_line(c, simplified, mean_lat) <= tolerance + 1e-6
+
+
+def test_simplify_polyline_keeps_the_requested_vertices():
+    coords = _wiggly_line(100, seed=8)
+    keep = [13, 50, 51, 97]
+    simplified = simplify_polyline(coords, 1000.0, keep)
+    assert simplified == [coords[i] for i in [0, *keep, 99]]
+
+
+@pytest.mark.parametrize("tolerance", [0.0, -1.0])
+def test_simplify_polyline_without_tolerance_returns_the_line(tolerance):
+    coords = _wiggly_line(20, seed=9)
+    assert simplify_polyline(coords, tolerance) == coords
+    assert simplify_polyline(coords[:2], 10.0) == coords[:2]
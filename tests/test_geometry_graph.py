@@ -0,0 +1,214 @@
+# The Local Graph, geometry graph tests
+
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import geometry_graph
+from geodesy import meters_per_pixel
+from geometry_graph import (LOD_TOLERANCES, GeometryArtifacts, GeometryGraph, PathNetwork, lod_for_zoom, lod_level,
+                            simplify_path_layer)
+from spatial_index import SpatialIndex
+
+
+def _street_geojson(graph, rows=4, cols=5, seed=21):
+    """
+    One LineString along every row and column of the campus grid, through the
+    node positions with nine jittered vertices (a few meters off the street) between them.
+    """
+    rng = random.Random(seed)
+    streets = [[f"N{r}{c}" for c in range(cols)] for r in range(rows)]
+    streets += [[f"N{r}{c}" for r in range(rows)] for c in range(cols)]
+    features = []
+    for names in streets:
+        points = [graph.location_data[name] for name in names]
+        coords = [[points[0]["longitude"], points[0]["latitude"]]]
+        for a, b in zip(points, points[1:]):
+            for step in range(1, 11):
+                t = step / 10
+                lon = a["longitude"] + t * (b["longitude"] - a["longitude"])
+                lat = a["latitude"] + t * (b["latitude"] - a["latitude"])
+                if step < 10:
+                    lon, lat = lon + rng.uniform(-3e-5, 3e-5), lat + rng.uniform(-3e-5, 3e-5)
+                coords.append([lon, lat])
+        features.append({"type": "Feature", "properties": {"street": names[0] + names[-1]},
+                         "geometry": {"type": "LineString", "coordinates": coords}})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _is_subsequence(short, long):
+    remaining = iter(long)
+    return all(any(point == other for other in remaining) for point in short)
+
+
+def test_lod_level():
+    assert [lod_level(t) for t in (-1.0, 0.0, 0.5, 1.0, 3.9, 4.0, 100.0)] == [0.0, 0.0, 0.0, 1.0, 2.0, 4.0, 16.0]
+    assert all(lod_level(t) == t for t in LOD_TOLERANCES)
+
+
+def test_lod_for_zoom_stays_below_one_pixel():
+    levels = [lod_for_zoom(zoom, 38.03) for zoom in range(10, 23)]
+    assert levels == sorted(levels, reverse=True)
+    assert levels[0] == LOD_TOLERANCES[-1] and levels[-1] == 0.0
+    for zoom, level in zip(range(10, 23), levels):
+        assert level <= meters_per_pixel(zoom, 38.03)
+
+
+def test_simplified_path_layers_keep_the_breakpoints(campus_graph):
+    geojson = _street_geojson(campus_graph)
+    artifacts = GeometryArtifacts.build(geojson, campus_graph.get_spatial_index(), key=())
+    raw = artifacts.path_layers[0.0]["features"]
+    assert [f["geometry"]["coordinates"] for f in raw] == [f["geometry"]["coordinates"] for f in geojson["features"]]
+
+    node_points = {(c["longitude"], c["latitude"]) for c in campus_graph.location_data.values()}
+    previous = raw
+    for tolerance in LOD_TOLERANCES[1:]:
+        layer = simplify_path_layer(geojson, artifacts.geometry_graph, tolerance)
+        assert layer == artifacts.path_layers[tolerance]
+        for feature, source, coarser in zip(layer["features"], geojson["features"], previous):
+            coords, original = feature["geometry"]["coordinates"], source["geometry"]["coordinates"]
+            assert feature["properties"] == source["properties"]
+            assert coords[0] == original[0] and coords[-1] == original[-1]
+            # Every campus node along the street is kept, so the simplified streets still meet there
+            assert [c for c in coords if tuple(c) in node_points] == [c for c in original if tuple(c) in node_points]
+            assert _is_subsequence(coords, original) and len(coords) <= len(coarser["geometry"]["coordinates"])
+        previous = layer["features"]
+    # At the coarsest level the jitter is gone: only the nodes are left
+    assert all(len(f["geometry"]["coordinates"]) in (4, 5) for f in previous)
+
+
+def test_route_polyline_levels_keep_the_edge_endpoints(campus_graph):
+    compact = campus_graph.get_compact_graph()
+    geojson = _street_geojson(campus_graph)
+    artifacts = GeometryArtifacts.build(geojson, campus_graph.get_spatial_index(), key=(), compact=compact)
+    polylines = artifacts.polylines
+    assert set(polylines.levels) == set(LOD_TOLERANCES)
+    for e in range(len(compact.targets)):
+        full = polylines.edge_points(e)
+        for tolerance in LOD_TOLERANCES[1:]:
+            points = polylines.edge_points(e, tolerance)
+            assert points[0] == full[0] and points[-1] == full[-1]
+            assert _is_subsequence(points, full)
+        # Tolerances between the levels use the coarsest level within them
+        assert polylines.edge_points(e, 5.0) == polylines.edge_points(e, 4.0)
+
+    edge_ids, _ = compact.shortest_path(compact.ids["N00"], compact.ids["N34"], "time")
+    full = polylines.route_points(edge_ids)
+    points = polylines.route_points(edge_ids, 16.0)
+    assert points[0] == full[0] and points[-1] == full[-1] and len(points) < len(full)
+
+
+def _line(*coords):
+    return {"type": "Feature", "properties": {}, "geometry": {"type": "LineString", "coordinates": list(coords)}}
+
+
+def _crossing_network():
+    """
+    A west-east street W-E crossed mid-segment by a south-north one from S,
+    a spur ending on W-E between the crossing and E (a T-junction), and a
+    street continuing from the north end (a shared vertex). W, E and S are campus nodes.
+    """
+    geojson = {"type": "FeatureCollection", "features": [
+        _line([-120.392, 38.030], [-120.388, 38.030]),
+        _line([-120.390, 38.028], [-120.390, 38.032]),
+        _line([-120.389, 38.031], [-120.389, 38.030]),
+        _line([-120.390, 38.032], [-120.387, 38.032]),
+        {"type": "Feature", "properties": {}, "geometry": {"type": "Point", "coordinates": [-120.39, 38.03]}},
+    ]}
+    location_data = {
+        "W": {"latitude": 38.030, "longitude": -120.392},
+        "E": {"latitude": 38.030, "longitude": -120.388},
+        "S": {"latitude": 38.028, "longitude": -120.390},
+        "Far": {"latitude": 38.1, "longitude": -120.3},
+    }
+    return PathNetwork.build(geojson, SpatialIndex(location_data))
+
+
+def _label_at(network, lon, lat):
+    return network.labels[network.vertices.index([lon, lat])]
+
+
+def test_noding_splits_lines_at_crossings_and_junctions():
+    network = _crossing_network()
+    crossing = _label_at(network, -120.390, 38.030)
+    tee = _label_at(network, -120.389, 38.030)
+    north = _label_at(network, -120.390, 38.032)
+    assert crossing.startswith("~j") and tee.startswith("~j") and north.startswith("~j")
+    assert "Far" not in network.labels.values()
+
+    edges = {frozenset((a, b)): coords for a, b, coords in network.edges}
+    assert len(edges) == len(network.edges) == 7
+    # W-E is split at the crossing and at the spur's end, S-north at the crossing
+    assert edges[frozenset(("W", crossing))] == [[-120.392, 38.030], [-120.390, 38.030]]
+    assert edges[frozenset((crossing, tee))] == [[-120.390, 38.030], [-120.389, 38.030]]
+    assert edges[frozenset((tee, "E"))] == [[-120.389, 38.030], [-120.388, 38.030]]
+    assert edges[frozenset(("S", crossing))] == [[-120.390, 38.028], [-120.390, 38.030]]
+    assert edges[frozenset((crossing, north))] == [[-120.390, 38.030], [-120.390, 38.032]]
+
+    geometry_graph = network.to_geometry_graph()
+    assert set(geometry_graph.adj[crossing]) == {"W", "S", tee, north}
+    assert set(geometry_graph.adj[tee]) == {crossing, "E", _label_at(network, -120.389, 38.031)}
+
+
+def test_noded_network_as_a_graph():
+    network = _crossing_network()
+    graph = network.to_graph(walking_speed=1.25)
+    assert set(graph.nodes) == set(network.labels.values())
+    assert not any(graph.node_type.values())
+    crossing = _label_at(network, -120.390, 38.030)
+    assert graph.location_data[crossing] == {"latitude": 38.030, "longitude": -120.390}
+    metrics = graph.nodes["W"]["connections"][crossing]
+    assert metrics == graph.nodes[crossing]["connections"]["W"]
+    assert metrics["distance"] == pytest.approx(0.1755, abs=1e-3)
+    assert metrics["time"] == pytest.approx(metrics["distance"] * 1000 / 1.25)
+    # Built as one bulk change
+    assert not graph.changes
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    """Records the worker count of every process pool geometry_graph starts."""
+    started = []
+
+    class RecordingPool(ProcessPoolExecutor):
+        def __init__(self, max_workers=None, **kwargs):
+            started.append(max_workers)
+            super().__init__(max_workers=max_workers, **kwargs)
+
+    monkeypatch.setattr(geometry_graph, "ProcessPoolExecutor", RecordingPool)
+    return started
+
+
+@pytest.mark.parametrize("workers", [2, None])
+def test_parallel_geometry_graph_matches_serial(campus_graph, monkeypatch, pools, workers):
+    monkeypatch.setattr(geometry_graph, "PARALLEL_MIN_LINES", 2)
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    geojson = _street_geojson(campus_graph)
+    node_index = campus_graph.get_spatial_index()
+    serial = GeometryGraph(node_index, geojson, workers=1)
+    assert not pools
+    parallel = GeometryGraph(node_index, geojson, workers=workers)
+    assert pools == [2]
+    assert parallel.adj == serial.adj
+    assert list(parallel.adj) == list(serial.adj)
+    assert all(list(parallel.adj[a]) == list(serial.adj[a]) for a in serial.adj)
+
+
+@pytest.mark.parametrize("workers", [2, None])
+def test_parallel_path_network_matches_serial(campus_graph, monkeypatch, pools, workers):
+    monkeypatch.setattr(geometry_graph, "PARALLEL_MIN_VERTICES", 2)
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    geojson = _street_geojson(campus_graph)
+    geojson["features"].append(_line([-120.3905, 38.0305], [-120.3845, 38.0325]))  # crosses two streets
+    node_index = campus_graph.get_spatial_index()
+    serial = PathNetwork.build(geojson, node_index, workers=1)
+    assert not pools
+    parallel = PathNetwork.build(geojson, node_index, workers=workers)
+    assert pools == [2]
+    assert parallel.vertices == serial.vertices
+    assert parallel.labels == serial.labels
+    assert parallel.edges == serial.edges
+    assert any(label.startswith("~j") for label in serial.labels.values())
+    assert parallel.to_geometry_graph().adj == serial.to_geometry_graph().adj
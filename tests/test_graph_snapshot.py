@@ -0,0 +1,43 @@
+# The Local Graph, graph snapshot tests
+
+import os
+import shutil
+
+import edgegraph
+from binary_store import read_bundle_meta
+from edgegraph import ExcelGraphIO, Graph
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_touched_workbook_is_hashed_once(tmp_path, monkeypatch):
+    excel_file = str(tmp_path / "compendium.xlsx")
+    shutil.copy(os.path.join(ROOT, "compendium.xlsx"), excel_file)
+    Graph().load_from_excel(excel_file)
+    snapshot = ExcelGraphIO.snapshot_path(excel_file)
+    assert os.path.exists(snapshot)
+
+    # Same contents under a new mtime, e.g. after a fresh checkout
+    mtime_ns = os.stat(excel_file).st_mtime_ns + 5 * 10 ** 9
+    os.utime(excel_file, ns=(mtime_ns, mtime_ns))
+    hashed = []
+    original_sha256 = edgegraph.file_sha256
+    monkeypatch.setattr(edgegraph, "file_sha256", lambda path: hashed.append(path) or original_sha256(path))
+
+    assert ExcelGraphIO.snapshot_is_current(excel_file)
+    assert len(hashed) == 1
+    assert read_bundle_meta(snapshot)["source_mtime_ns"] == mtime_ns
+
+    graph = Graph()
+    assert ExcelGraphIO.load_snapshot(graph, excel_file)
+    assert len(hashed) == 1
+    assert graph.nodes
+
+
+def test_edited_workbook_is_not_current(tmp_path):
+    excel_file = str(tmp_path / "compendium.xlsx")
+    shutil.copy(os.path.join(ROOT, "compendium.xlsx"), excel_file)
+    Graph().load_from_excel(excel_file)
+    with open(excel_file, "ab") as f:
+        f.write(b"\0")
+    assert not ExcelGraphIO.snapshot_is_current(excel_file)
@@ -0,0 +1,100 @@
+# The Local Graph, polyline codec tests
+
+import json
+import math
+from array import array
+
+import pytest
+
+from geometry_graph import POLYLINE_DIRECT, RoutePolylines
+from polyline_codec import decode, encode, encode_route, route_payload
+from routing import RouteResult
+
+
+def _polylines():
+    """Two edges A-B (three points) and B-C (two points), sharing B's point."""
+    points = [
+        [38.03000, -120.38770], [38.03050, -120.38800], [38.03100, -120.38790],
+        [38.03100, -120.38790], [38.03080, -120.38650],
+    ]
+    coords = array('d', [c for point in points for c in point])
+    return RoutePolylines(["A-B", "B-C"], coords, array('q', [0, 3, 5]), array('b', [POLYLINE_DIRECT] * 2))
+
+
+def test_reference_string():
+    points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    assert encode(points) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode("_p~iF~ps|U_ulLnnqC_mqNvxq`@") == [list(p) for p in points]
+
+
+@pytest.mark.parametrize("precision", [5, 6])
+def test_round_trip_with_negative_coordinates_and_deltas(precision):
+    # Every quadrant, a crossing of zero and deltas of both signs
+    points = [(-33.86882, 151.20929), (-33.86882, -151.20929), (0.0, -0.00001),
+              (45.5, -73.56), (-0.00002, 0.00003), (-89.99999, 179.99999)]
+    decoded = decode(encode(points, precision), precision)
+    assert len(decoded) == len(points)
+    for (lat, lon), (lat_d, lon_d) in zip(points, decoded):
+        assert lat_d == pytest.approx(lat, abs=0.5 / 10 ** precision)
+        assert lon_d == pytest.approx(lon, abs=0.5 / 10 ** precision)
+
+
+@pytest.mark.parametrize("precision, point, expected", [
+    (5, (38.123456, -120.123454), [38.12346, -120.12345]),
+    (5, (-38.123456, 120.123454), [-38.12346, 120.12345]),
+    (6, (38.1234564, -120.1234566), [38.123456, -120.123457]),
+    (6, (-38.1234564, 120.1234566), [-38.123456, 120.123457]),
+])
+def test_rounds_to_nearest_at_precision(precision, point, expected):
+    assert decode(encode([point], precision), precision) == [pytest.approx(expected, abs=1e-12)]
+
+
+def test_precision_six_keeps_a_digit_precision_five_drops():
+    point = (38.031234, -120.387766)
+    assert decode(encode([point], 5), 5) != decode(encode([point], 6), 6)
+    assert decode(encode([point], 6), 6) == [pytest.approx(list(point), abs=1e-12)]
+
+
+def test_empty_input():
+    assert encode([]) == ""
+    assert decode("") == []
+
+
+def test_truncated_string_is_rejected():
+    with pytest.raises(ValueError):
+        decode("_p~iF~ps|U_ulL")
+
+
+def test_encode_route_joins_edge_polylines():
+    polylines = _polylines()
+    route = RouteResult(["A-B", "B-C"], [0, 1], "time", {"time": 60.0})
+    expected = polylines.route_points([0, 1])
+    assert len(expected) == 4  # B's point is not repeated
+    assert decode(encode_route(route, polylines)) == [pytest.approx(p, abs=1e-12) for p in expected]
+
+
+def test_empty_route():
+    polylines = _polylines()
+    # Start and end are the same node: found, but no edges and no geometry
+    same_node = RouteResult([], [], "time", {"time": 0.0})
+    assert encode_route(same_node, polylines) == ""
+    not_found = RouteResult.not_found("time")
+    assert encode_route(not_found, polylines) is None
+    payload = route_payload(not_found, polylines)
+    assert payload["found"] is False and payload["polyline"] is None and payload["edges"] == []
+    assert payload["totals"] == {"time": None}  # inf is not valid JSON
+    json.dumps(payload)
+
+
+def test_route_payload():
+    polylines = _polylines()
+    route = RouteResult(["A-B", "B-C"], [0, 1], "time", {"time": 60.0, "distance": 0.25, "gain": math.nan},
+                        waypoints=["B"])
+    payload = route_payload(route, polylines, precision=6)
+    assert payload["found"] is True and payload["metric"] == "time"
+    assert payload["totals"] == {"time": 60.0, "distance": 0.25, "gain": None}
+    assert payload["edges"] == ["A-B", "B-C"] and payload["waypoints"] == ["B"]
+    assert payload["precision"] == 6
+    assert decode(payload["polyline"], 6) == [pytest.approx(p, abs=1e-12) for p in polylines.route_points([0, 1])]
+    assert json.loads(json.dumps(payload)) == payload
+    assert route_payload(route, None)["polyline"] is None
@@ -0,0 +1,82 @@
+# The Local Graph, route cache tests
+
+import edgegraph
+from route_cache import RouteCache
+from routing import compute_route
+
+
+def test_get_put_and_lru_eviction():
+    cache = RouteCache(maxsize=2)
+    assert cache.get('A', [], 'B', 'time', 1) is None
+    cache.put('A', [], 'B', 'time', 1, 'ab')
+    cache.put('A', [], 'C', 'time', 1, 'ac')
+    assert cache.get('A', [], 'B', 'time', 1) == 'ab'  # A-B is now the most recently used
+    cache.put('B', [], 'C', 'time', 1, 'bc')
+    assert cache.get('A', [], 'C', 'time', 1) is None
+    assert cache.get('A', [], 'B', 'time', 1) == 'ab'
+    assert cache.get('A', [], 'B', 'distance', 1) is None
+    assert cache.get('A', [], 'B', 'time', 1, options=('optimize_order',)) is None
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 2, "misses": 4, "evictions": 1, "invalidations": 0}
+
+
+def test_new_version_clears_every_entry():
+    cache = RouteCache()
+    cache.put('A', [], 'B', 'time', 1, 'ab')
+    assert cache.get('A', [], 'B', 'time', 2) is None
+    assert len(cache) == 0 and cache.invalidations == 1 and cache.version == 2
+
+
+def _cached_routes(graph, cache):
+    """Caches N00 -> N04 along row 0 and N30 -> N34 along row 3 (both by time)."""
+    top = compute_route(graph, 'N00', [], 'N04', metric='time', cache=cache)
+    bottom = compute_route(graph, 'N30', [], 'N34', metric='time', cache=cache)
+    assert len(cache) == 2
+    return top, bottom
+
+
+def test_sync_keeps_routes_a_slower_edge_cannot_affect(campus_graph):
+    cache = RouteCache()
+    top, bottom = _cached_routes(campus_graph, cache)
+    source, destination = top.edges[0].split('-')
+    assert top.edges[0] not in bottom.edges
+    campus_graph.update_connection(source, destination, time=10000.0)
+
+    cache.sync(campus_graph)
+    assert cache.version == campus_graph.version and len(cache) == 1 and cache.invalidations == 1
+    assert compute_route(campus_graph, 'N30', [], 'N34', metric='time', cache=cache) is bottom
+    assert cache.hits == 1
+    assert top.edges[0] not in compute_route(campus_graph, 'N00', [], 'N04', metric='time', cache=cache).edges
+
+
+def test_sync_drops_the_metric_an_edge_got_cheaper_in(campus_graph):
+    cache = RouteCache()
+    _cached_routes(campus_graph, cache)
+    by_distance = compute_route(campus_graph, 'N00', [], 'N04', metric='distance', cache=cache)
+    campus_graph.update_connection('N20', 'N21', time=1.0)
+
+    cache.sync(campus_graph)
+    assert len(cache) == 1
+    assert compute_route(campus_graph, 'N00', [], 'N04', metric='distance', cache=cache) is by_distance
+
+
+def test_sync_clears_when_the_change_log_no_longer_reaches_back(campus_graph, monkeypatch):
+    monkeypatch.setattr(edgegraph, "CHANGE_LOG_LIMIT", 3)
+    cache = RouteCache()
+    _cached_routes(campus_graph, cache)
+    cached_version = cache.version
+    for _ in range(2):
+        campus_graph.update_connection('N20', 'N21', time=500.0)
+        campus_graph.update_connection('N21', 'N20', time=500.0)
+    assert campus_graph.changes_since(cached_version) is None
+
+    cache.sync(campus_graph)
+    assert len(cache) == 0 and cache.invalidations == 1 and cache.version == campus_graph.version
+
+
+def test_algorithm_is_part_of_the_key(campus_graph):
+    cache = RouteCache()
+    dijkstra = compute_route(campus_graph, 'N00', [], 'N34', metric='time', algorithm='dijkstra', cache=cache)
+    astar = compute_route(campus_graph, 'N00', [], 'N34', metric='time', algorithm='astar', cache=cache)
+    assert astar is not dijkstra and astar.totals['time'] == dijkstra.totals['time']
+    assert len(cache) == 2 and cache.hits == 0
+    assert compute_route(campus_graph, 'N00', [], 'N34', metric='time', algorithm='astar', cache=cache) is astar
@@ -0,0 +1,95 @@
+# The Local Graph, route table tests
+
+import math
+
+import pytest
+
+import route_table
+from conftest import build_campus_graph
+from route_table import RouteTable, prepare_route_table, route_table_path, table_search
+
+
+def _origins(graph, compact):
+    return [compact.ids[name] for name, is_building in graph.node_type.items() if is_building]
+
+
+@pytest.mark.parametrize("metric", ["time", "distance"])
+def test_leg_matches_dijkstra(campus_graph, metric):
+    compact = campus_graph.get_compact_graph()
+    origins = _origins(campus_graph, compact)
+    table = RouteTable.build(compact, origins, workers=1)
+    for source in origins:
+        assert table.covers(source, metric)
+        for target in range(len(compact)):
+            expected_edges, expected = compact.shortest_path(source, target, metric)
+            edge_ids, cost = table.leg(source, target, metric)
+            if math.isinf(expected):
+                assert math.isinf(cost) and edge_ids == []
+                continue
+            assert cost == pytest.approx(expected)
+            assert sum(compact.weights[metric][e] for e in edge_ids) == pytest.approx(cost)
+            if source != target:
+                assert compact.sources[edge_ids[0]] == source and compact.targets[edge_ids[-1]] == target
+
+
+def test_parallel_build_matches_serial(campus_graph):
+    compact = campus_graph.get_compact_graph()
+    origins = _origins(campus_graph, compact)
+    serial = RouteTable.build(compact, origins, workers=1)
+    parallel = RouteTable.build(compact, origins, workers=2)
+    for metric in serial.metrics:
+        assert list(parallel.dist[metric]) == list(serial.dist[metric])
+        assert list(parallel.prev[metric]) == list(serial.prev[metric])
+
+
+def test_load_rejects_another_graph_or_origin_set(campus_graph, tmp_path):
+    excel_file = str(tmp_path / "campus.xlsx")
+    compact = campus_graph.get_compact_graph()
+    origins = _origins(campus_graph, compact)
+    table = prepare_route_table(campus_graph, excel_file, workers=1)
+    assert compact.route_table is table
+    path = route_table_path(excel_file)
+
+    loaded = RouteTable.load(path, compact, origins)
+    assert loaded is not None and list(loaded.origins) == origins
+    assert RouteTable.load(path, compact, origins[:-1]) is None
+    assert RouteTable.load(str(tmp_path / "missing.bin"), compact) is None
+
+    other = build_campus_graph(seed=4).get_compact_graph()
+    assert other.fingerprint() != compact.fingerprint()
+    assert RouteTable.load(path, other, origins) is None
+
+
+def test_prepare_route_table_reuses_the_saved_table(campus_graph, tmp_path, monkeypatch):
+    excel_file = str(tmp_path / "campus.xlsx")
+    prepare_route_table(campus_graph, excel_file, workers=1)
+
+    def no_build(*args, **kwargs):
+        raise AssertionError("the saved table should have been loaded")
+
+    monkeypatch.setattr(RouteTable, "build", no_build)
+    graph = build_campus_graph()
+    assert prepare_route_table(graph, excel_file, workers=1) is graph.get_compact_graph().route_table
+
+
+def test_discard_falls_back_to_ch(campus_graph, monkeypatch):
+    compact = campus_graph.get_compact_graph()
+    origins = _origins(campus_graph, compact)
+    compact.route_table = RouteTable.build(compact, origins, workers=1)
+    source, target = origins[0], compact.ids["N34"]
+    expected = compact.shortest_path(source, target, "time")[1]
+
+    searched = []
+    original = route_table.ch_search
+    monkeypatch.setattr(route_table, "ch_search", lambda *args: searched.append(args) or original(*args))
+    assert table_search(compact, source, target, "time")[1] == pytest.approx(expected)
+    assert not searched
+
+    compact.route_table.discard("time")
+    assert not compact.route_table.covers(source, "time")
+    assert table_search(compact, source, target, "time")[1] == pytest.approx(expected)
+    assert len(searched) == 1
+    # A leg that starts away from every origin is searched too
+    assert table_search(compact, compact.ids["N01"], target, "distance")[1] == pytest.approx(
+        compact.shortest_path(compact.ids["N01"], target, "distance")[1])
+    assert len(searched) == 2
@@ -0,0 +1,143 @@
+# The Local Graph, routing service tests
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+import routing_service
+from geometry_graph import GeometryGraph, RoutePolylines
+from polyline_codec import decode
+from routing import compute_route
+from routing_service import HTTPError, RoutingService, ServiceState
+from worker_pool import init_worker
+
+
+@pytest.fixture
+def service(campus_graph):
+    """A service over the campus graph that runs its searches on the event loop's thread pool."""
+    compact = campus_graph.get_compact_graph()
+    # Without path geometry every edge is drawn as a straight line
+    polylines = RoutePolylines.build(compact, {}, GeometryGraph.from_adjacency({}, None))
+    init_worker("routing_service", (compact, polylines))
+    return RoutingService(ServiceState(campus_graph, compact, polylines), workers=1)
+
+
+def _read(service, raw):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await service.read_request(reader)
+    return asyncio.run(read())
+
+
+def _status(call):
+    with pytest.raises(HTTPError) as error:
+        asyncio.run(call)
+    return error.value.status
+
+
+def test_read_request(service):
+    body = json.dumps({"start": "N00", "end": "N34"}).encode()
+    raw = (b"post /route HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+           b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+    assert _read(service, raw) == ("POST", "/route", {"host": "localhost", "content-type": "application/json",
+                                                      "content-length": str(len(body))}, body)
+    assert _read(service, b"GET /health HTTP/1.1\n\n") == ("GET", "/health", {}, b"")
+    assert _read(service, b"") is None
+
+
+@pytest.mark.parametrize("raw, status", [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"POST /route HTTP/1.1\r\nContent-Length: many\r\n\r\n", 400),
+    (f"POST /route HTTP/1.1\r\nContent-Length: {routing_service.MAX_BODY_BYTES + 1}\r\n\r\n".encode(), 413),
+])
+def test_read_request_rejects(service, raw, status):
+    with pytest.raises(HTTPError) as error:
+        _read(service, raw)
+    assert error.value.status == status
+
+
+def test_route_from_query_and_body(service, campus_graph):
+    expected = compute_route(campus_graph.get_compact_graph(), "N00", ["N32", "N04"], "N34", metric="time")
+    query = asyncio.run(service.dispatch("GET", "/route?start=N00&end=N34&waypoints=N32,%20N04,&metric=time", b""))
+    # The body overrides the query string
+    body = json.dumps({"start": "N00", "end": "N34", "waypoints": ["N32", "N04"], "metric": "time",
+                       "precision": 6}).encode()
+    posted = asyncio.run(service.dispatch("POST", "/route?metric=distance&precision=5", body))
+    assert query["found"] and query["edges"] == expected.edges and query["waypoints"] == ["N32", "N04"]
+    assert query["totals"]["time"] == pytest.approx(expected.totals["time"])
+    assert posted["metric"] == "time" and posted["edges"] == query["edges"] and posted["precision"] == 6
+    start = campus_graph.location_data["N00"]
+    assert decode(posted["polyline"], 6)[0] == [start["latitude"], start["longitude"]]
+
+
+@pytest.mark.parametrize("method, target, body, status", [
+    ("GET", "/route?start=N00", b"", 400),
+    ("GET", "/route?start=N00&end=N34&metric=speed", b"", 400),
+    ("GET", "/route?start=N00&end=N34&algorithm=guess", b"", 400),
+    ("GET", "/route?start=N00&end=N34&precision=high", b"", 400),
+    ("GET", "/route?start=N00&end=N34&precision=11", b"", 400),
+    ("GET", "/route?start=N00&end=N34&precision=-1", b"", 400),
+    ("POST", "/route", b'{"start": "N00", "end": "N34", "precision": 400}', 400),
+    ("POST", "/route", b'{"start": "N00", "end": "N34", "precision": Infinity}', 400),
+    ("POST", "/route", b'{"start": ["N00"], "end": "N34"}', 400),
+    ("POST", "/route", b'{"start": "N00", "end": {"name": "N34"}}', 400),
+    ("POST", "/route", b'{"start": "N00", "end": "N34", "waypoints": [["N32"]]}', 400),
+    ("POST", "/route", b'{"start": "N00", "end": "N34", "waypoints": {"N32": 1}}', 400),
+    ("POST", "/route", b'{"start": "N00", "end": "N34", "metric": ["time"]}', 400),
+    ("POST", "/route", b'["start", "end"]', 400),
+    ("POST", "/route", b'{"start": "N00"', 400),
+    ("GET", "/route?start=N00&end=Nowhere", b"", 404),
+    ("GET", "/elsewhere", b"", 404),
+    ("DELETE", "/route", b"", 405),
+])
+def test_bad_requests(service, method, target, body, status):
+    assert _status(service.dispatch(method, target, body)) == status
+
+
+def test_identical_requests_share_one_search(service, monkeypatch):
+    searches = []
+    release = threading.Event()
+    original = routing_service._route_task
+
+    def slow_route_task(*args):
+        searches.append(args)
+        release.wait(5)
+        return original(*args)
+
+    monkeypatch.setattr(routing_service, "_route_task", slow_route_task)
+    params = {"start": "N00", "end": "N34", "waypoints": "N21"}
+
+    async def requests():
+        first = asyncio.ensure_future(service.route(dict(params)))
+        second = asyncio.ensure_future(service.route(dict(params)))
+        other = asyncio.ensure_future(service.route(dict(params, metric="distance")))
+        await asyncio.sleep(0.05)
+        in_flight = len(service.in_flight)
+        release.set()
+        return in_flight, await asyncio.gather(first, second, other)
+
+    in_flight, (first, second, other) = asyncio.run(requests())
+    assert in_flight == 2 and len(searches) == 2
+    assert first is second and other["metric"] == "distance"
+    assert not service.in_flight and len(service.cache) == 2
+
+    # Answered from the cache, until the graph changes
+    assert asyncio.run(service.route(dict(params))) is first and len(searches) == 2
+    service.state.graph.update_connection("N00", "N01", time=1.0)
+    asyncio.run(service.route(dict(params)))
+    assert len(searches) == 3
+
+
+def test_nearest_buildings_and_health(service):
+    found = asyncio.run(service.dispatch("GET", "/nearest?lat=38.0301&lon=-120.3901", b""))
+    assert found["name"] == "N00" and found["is_building"] and found["distance_m"] < 20
+    assert _status(service.dispatch("GET", "/nearest?lat=north&lon=-120.39", b"")) == 400
+    assert _status(service.dispatch("GET", "/nearest?lat=38.5&lon=-120.39&max_distance=10", b"")) == 404
+    buildings = asyncio.run(service.dispatch("GET", "/buildings", b""))["buildings"]
+    assert [b["name"] for b in buildings] == ["N00", "N03", "N11", "N14", "N22", "N30", "N33", "Z"]
+    health = asyncio.run(service.dispatch("GET", "/health", b""))
+    assert health["status"] == "ok" and health["nodes"] == 21
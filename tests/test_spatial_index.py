@@ -0,0 +1,117 @@
+# The Local Graph, spatial index tests
+
+import random
+
+import pytest
+
+from edgegraph import Graph
+from geodesy import haversine_distance
+from geometry_graph import find_closest_node
+from spatial_index import SpatialIndex
+
+
+def _random_graph(n=150, seed=11):
+    """Random campus-sized point cloud with a few duplicate points (ties) and nodes without coordinates."""
+    rng = random.Random(seed)
+    graph = Graph()
+    for i in range(n):
+        if i % 25 == 24:
+            graph.add_location(f"P{i}", None, None)
+        elif i % 10 == 9:
+            twin = graph.location_data[f"P{i - 1}"]
+            graph.add_location(f"P{i}", twin["latitude"], twin["longitude"])
+        else:
+            graph.add_location(f"P{i}", 38.03 + rng.uniform(-0.005, 0.005), -120.39 + rng.uniform(-0.006, 0.006))
+    return graph
+
+
+def _queries(seed=12, n=200):
+    rng = random.Random(seed)
+    return [(38.03 + rng.uniform(-0.007, 0.007), -120.39 + rng.uniform(-0.008, 0.008)) for _ in range(n)]
+
+
+def _brute_force(location_data, lat, lon):
+    """(distance, name) of every located node, nearest first, ties in location_data order."""
+    ranked = []
+    for position, (name, coords) in enumerate(location_data.items()):
+        if coords["latitude"] is not None and coords["longitude"] is not None:
+            d = haversine_distance(lat, lon, coords["latitude"], coords["longitude"])
+            ranked.append((d, position, name))
+    return [(d, name) for d, _, name in sorted(ranked)]
+
+
+def _check_against_brute_force(index, location_data):
+    queries = _queries()
+    for lat, lon in queries:
+        for threshold in (5.0, 60.0, float("inf")):
+            expected = find_closest_node(lat, lon, location_data, threshold)
+            found = index.nearest(lat, lon, threshold)
+            assert (found[0] if found else None) == expected
+        ranked = _brute_force(location_data, lat, lon)
+        assert [name for name, _ in index.k_nearest(lat, lon, 5)] == [name for _, name in ranked[:5]]
+        within = index.within_radius(lat, lon, 150.0)
+        assert [name for name, _ in within] == [name for d, name in ranked if d <= 150.0]
+        assert all(d == pytest.approx(haversine_distance(lat, lon, location_data[name]["latitude"],
+                                                         location_data[name]["longitude"])) for name, d in within)
+    lats, lons = [q[0] for q in queries], [q[1] for q in queries]
+    for threshold in (None, 60.0):
+        expected = [find_closest_node(lat, lon, location_data, threshold if threshold else float("inf"))
+                    for lat, lon in queries]
+        assert index.nearest_many(lats, lons, threshold) == expected
+        assert index.nearest_many(lats, lons, threshold, chunk_cells=500) == expected
+
+
+def test_matches_linear_scan():
+    graph = _random_graph()
+    index = SpatialIndex(graph.location_data)
+    assert len(index) == sum(1 for c in graph.location_data.values() if c["latitude"] is not None)
+    _check_against_brute_force(index, graph.location_data)
+
+
+def test_ties_go_to_the_first_node():
+    graph = _random_graph()
+    index = graph.get_spatial_index()
+    coords = graph.location_data["P8"]
+    assert graph.location_data["P9"] == coords
+    assert index.nearest(coords["latitude"], coords["longitude"]) == ("P8", 0.0)
+    assert [name for name, _ in index.k_nearest(coords["latitude"], coords["longitude"], 2)] == ["P8", "P9"]
+
+
+def test_stays_exact_after_add_update_and_remove():
+    graph = _random_graph()
+    index = graph.get_spatial_index()
+    rng = random.Random(13)
+    for step in range(40):
+        name = f"P{rng.randrange(150)}"
+        if step % 4 == 0:
+            graph.add_location(f"New{step}", 38.03 + rng.uniform(-0.005, 0.005), -120.39 + rng.uniform(-0.006, 0.006))
+        elif step % 4 == 1 and name in graph.nodes:
+            graph.remove_location(name)
+        elif name in graph.nodes:
+            graph.update_location(name, 38.03 + rng.uniform(-0.005, 0.005), -120.39 + rng.uniform(-0.006, 0.006))
+    # An update that gives a node without coordinates a position, and a move onto another node (a tie)
+    graph.update_location("P24", 38.031, -120.391)
+    target = graph.location_data["P3"]
+    graph.update_location("New0", target["latitude"], target["longitude"])
+
+    assert graph.get_spatial_index() is index  # updated in place, not rebuilt
+    _check_against_brute_force(index, graph.location_data)
+
+
+def test_rebuilds_once_dead_points_outnumber_live_ones():
+    graph = _random_graph()
+    index = graph.get_spatial_index()
+    for i in range(0, 120):
+        if f"P{i}" in graph.nodes:
+            graph.remove_location(f"P{i}")
+    rebuilt = graph.get_spatial_index()
+    assert rebuilt is not index
+    _check_against_brute_force(rebuilt, graph.location_data)
+
+
+def test_empty_index():
+    index = SpatialIndex({"A": {"latitude": None, "longitude": None}})
+    assert len(index) == 0
+    assert index.nearest(38.0, -120.0) is None
+    assert index.k_nearest(38.0, -120.0, 3) == [] and index.within_radius(38.0, -120.0, 100.0) == []
+    assert index.nearest_many([38.0], [-120.0]) == [None]
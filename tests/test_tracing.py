@@ -0,0 +1,78 @@
+# The Local Graph, tracing tests
+
+import json
+import time
+
+import pytest
+
+from tracing import Tracer
+
+
+def _busy_tracer():
+    tracer = Tracer()
+    for i in range(1, 101):
+        tracer.record("leg", i / 1000)
+    with tracer.span("block"):
+        time.sleep(0.01)
+    with pytest.raises(ValueError):
+        with tracer.span("failing"):
+            raise ValueError("recorded anyway")
+    tracer.count("nodes_settled", 40)
+    tracer.count("nodes_settled", 2)
+    return tracer
+
+
+def test_spans_and_counters():
+    tracer = _busy_tracer()
+    assert tracer.percentiles("leg") == {0.5: 0.05, 0.9: 0.09, 0.99: 0.099}
+    assert tracer.percentiles("missing") == {}
+    assert tracer.last["block"] >= 0.01 and "failing" in tracer.totals
+    assert tracer.counters == {"nodes_settled": 42}
+
+    snap = tracer.snapshot()
+    assert snap["spans"]["leg"]["count"] == 100
+    assert snap["spans"]["leg"]["total"] == pytest.approx(5.05)
+    assert snap["spans"]["leg"]["mean"] == pytest.approx(0.0505)
+    assert snap["spans"]["leg"]["percentiles"] == {"0.5": 0.05, "0.9": 0.09, "0.99": 0.099}
+    assert snap["counters"] == {"nodes_settled": 42}
+
+
+def test_samples_are_bounded():
+    tracer = Tracer(max_samples=10)
+    for i in range(1, 101):
+        tracer.record("leg", float(i))
+    assert list(tracer.samples["leg"]) == [float(i) for i in range(91, 101)]
+    assert tracer.totals["leg"] == [100, 5050.0] and tracer.last["leg"] == 100.0
+
+
+def test_prometheus_text():
+    tracer = _busy_tracer()
+    tracer.count('odd "name"\\')
+    text = tracer.to_prometheus()
+    assert 'local_graph_span_seconds{span="leg",quantile="0.9"} 0.09' in text
+    assert 'local_graph_span_seconds_count{span="leg"} 100' in text
+    assert 'local_graph_events_total{counter="nodes_settled"} 42' in text
+    assert 'local_graph_events_total{counter="odd \\"name\\"\\\\"} 1' in text
+    assert tracer.to_prometheus("campus").startswith("# HELP campus_span_seconds ")
+
+
+def test_write_files(tmp_path):
+    tracer = _busy_tracer()
+    json_path, prom_path = tmp_path / "metrics.json", tmp_path / "metrics.prom"
+    tracer.write_json(str(json_path))
+    tracer.write_prometheus(str(prom_path))
+    assert json.loads(json_path.read_text())["counters"] == {"nodes_settled": 42}
+    assert prom_path.read_text() == tracer.to_prometheus()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["metrics.json", "metrics.prom"]
+
+
+def test_disabled_and_reset():
+    disabled = Tracer(enabled=False)
+    with disabled.span("ignored"):
+        disabled.count("ignored")
+    disabled.record("ignored", 1.0)
+    assert not disabled.samples and not disabled.counters
+
+    tracer = _busy_tracer()
+    tracer.reset()
+    assert tracer.snapshot()["spans"] == {} and tracer.snapshot()["counters"] == {}
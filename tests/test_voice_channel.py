@@ -0,0 +1,113 @@
+# The Local Graph, voice channel tests
+
+import json
+import os
+import time
+
+import pytest
+
+import voice_channel
+from binary_store import atomic_write
+from conftest import build_campus_graph
+from voice_channel import VoiceChannel, submit_request
+
+BUILDINGS = ["N00", "N03", "N11", "N14", "N22"]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    """(queue_dir, legacy_path) in a fresh directory."""
+    return str(tmp_path / "queue"), str(tmp_path / "voice_update.json")
+
+
+@pytest.fixture
+def channel(campus_graph, paths):
+    """A channel that is polled by hand (no consumer thread)."""
+    queue_dir, legacy_path = paths
+    os.makedirs(queue_dir)
+    return VoiceChannel(campus_graph, queue_dir, legacy_path)
+
+
+def _write_legacy(path, data, age=1.0):
+    with atomic_write(path) as f:
+        json.dump(data, f)
+    os.utime(path, (time.time() - age, time.time() - age))
+
+
+def _wait_for(channel, seq):
+    deadline = time.time() + 10
+    while channel.seq < seq and time.time() < deadline:
+        time.sleep(0.02)
+    assert channel.seq >= seq
+
+
+def test_queued_requests_are_routed_in_order(campus_graph, paths):
+    queue_dir, legacy_path = paths
+    channel = VoiceChannel(campus_graph, queue_dir, legacy_path).start()
+    try:
+        pairs = list(zip(BUILDINGS, BUILDINGS[1:4])) + [("N00", "Nowhere")]
+        for start, end in pairs:
+            submit_request(start, end, queue_dir=queue_dir)
+        submit_request("N00", "N22", waypoints=["N14"], queue_dir=queue_dir)
+        _wait_for(channel, 5)
+        results = channel.take_results()
+    finally:
+        channel.stop()
+    assert [(r["start"], r["end"]) for r in results] == pairs + [("N00", "N22")]
+    assert [r["seq"] for r in results] == [1, 2, 3, 4, 5]
+    assert all(r["route"].found for r in results[:3]) and not results[3]["route"].found
+    assert results[4]["waypoints"] == ["N14"] and "N14" in results[4]["route"].waypoints
+    assert not channel.has_results() and channel.take_results() == [] and not os.listdir(queue_dir)
+
+
+def test_a_second_channel_replaces_the_first(campus_graph, paths):
+    queue_dir, legacy_path = paths
+    first = VoiceChannel(campus_graph, queue_dir, legacy_path).start()
+    second = VoiceChannel(campus_graph, queue_dir, legacy_path).start()
+    try:
+        assert first._thread is None
+        assert voice_channel._channels[os.path.abspath(queue_dir)] is second
+        assert second.start() is second  # starting again is a no-op
+        submit_request("N00", "N03", queue_dir=queue_dir)
+        _wait_for(second, 1)
+        assert first.seq == 0 and second.take_results()[0]["end"] == "N03"
+    finally:
+        second.stop()
+    assert os.path.abspath(queue_dir) not in voice_channel._channels
+
+
+def test_legacy_file_is_consumed_once(channel, paths):
+    _, legacy_path = paths
+    _write_legacy(legacy_path, {"start": "N22", "end": "N00", "confirmed": True})
+    assert channel.poll_once() == 1
+    assert channel.take_results()[0]["start"] == "N22" and not os.path.exists(legacy_path)
+    assert channel.poll_once() == 0
+
+    # Unconfirmed, or still being written by an old producer: left alone
+    _write_legacy(legacy_path, {"start": None, "end": None, "confirmed": False})
+    assert channel.poll_once() == 0 and os.path.exists(legacy_path)
+    _write_legacy(legacy_path, {"start": "N22", "end": "N00", "confirmed": True}, age=0.0)
+    assert channel.poll_once() == 0 and os.path.exists(legacy_path)
+
+
+def test_torn_request_is_set_aside(channel, paths):
+    queue_dir, _ = paths
+    with open(os.path.join(queue_dir, "00000000000000000001-torn.json"), "w") as f:
+        f.write('{"start": "N00", "en')
+    submit_request("N00", "N03", queue_dir=queue_dir)
+    assert channel.poll_once() == 1
+    assert os.listdir(queue_dir) == ["00000000000000000001-torn.json.rejected"]
+
+
+def test_use_graph(channel, paths):
+    queue_dir, _ = paths
+    submit_request("N00", "N01", queue_dir=queue_dir)
+    channel.poll_once()
+    assert channel.take_results()[0]["route"].totals["time"] > 1.0
+
+    reloaded = build_campus_graph()
+    reloaded.update_connection("N00", "N01", time=1.0)
+    channel.use_graph(reloaded)
+    submit_request("N00", "N01", queue_dir=queue_dir)
+    channel.poll_once()
+    assert channel.take_results()[0]["route"].totals["time"] == 1.0
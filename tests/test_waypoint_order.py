@@ -0,0 +1,99 @@
+# The Local Graph, waypoint order tests
+
+import itertools
+import math
+import random
+
+import pytest
+
+import waypoint_order
+from waypoint_order import HELD_KARP_LIMIT, held_karp, nearest_neighbor_two_opt, order_waypoints
+
+
+def _random_costs(k, seed):
+    """Asymmetric leg costs between start 0, waypoints 1..k and end k + 1 (nothing leaves the end)."""
+    rng = random.Random(seed)
+    n = k + 2
+    cost = [[0.0 if i == j else rng.uniform(1.0, 100.0) for j in range(n)] for i in range(n)]
+    cost[-1] = [math.inf] * n
+    return cost
+
+
+def _tour_cost(cost, order):
+    stops = [0, *order, len(cost) - 1]
+    return sum(cost[a][b] for a, b in zip(stops, stops[1:]))
+
+
+def _brute_force(cost, k):
+    return min(_tour_cost(cost, order) for order in itertools.permutations(range(1, k + 1)))
+
+
+@pytest.mark.parametrize("k", range(1, 8))
+@pytest.mark.parametrize("seed", range(3))
+def test_held_karp_matches_brute_force(k, seed):
+    cost = _random_costs(k, seed)
+    order, total = held_karp(cost, k)
+    assert sorted(order) == list(range(1, k + 1))
+    assert total == pytest.approx(_tour_cost(cost, order))
+    assert total == pytest.approx(_brute_force(cost, k))
+
+
+def test_held_karp_at_the_limit():
+    # Waypoints scattered along a line between start and end: the optimum visits them in line order
+    k = HELD_KARP_LIMIT
+    rng = random.Random(5)
+    positions = [0.0, *rng.sample(range(1, 1000), k), 1000.0]
+    cost = [[abs(b - a) for b in positions] for a in positions]
+    order, total = held_karp(cost, k)
+    assert total == pytest.approx(1000.0)
+    assert [positions[i] for i in order] == sorted(positions[1:-1])
+
+
+@pytest.mark.parametrize("k", [3, 8, HELD_KARP_LIMIT + 3])
+def test_heuristic_returns_a_permutation(k):
+    cost = _random_costs(k, seed=k)
+    order, total = nearest_neighbor_two_opt(cost, k)
+    assert sorted(order) == list(range(1, k + 1))
+    assert total == pytest.approx(_tour_cost(cost, order))
+    if k <= 8:
+        assert total >= _brute_force(cost, k) - 1e-9
+
+
+def _check_route(compact, start, order, end, edge_ids):
+    """edge_ids is one connected path from start through order to end."""
+    assert compact.sources[edge_ids[0]] == start and compact.targets[edge_ids[-1]] == end
+    for e, f in zip(edge_ids, edge_ids[1:]):
+        assert compact.targets[e] == compact.sources[f]
+    visited = {compact.sources[e] for e in edge_ids}
+    assert set(order) <= visited
+
+
+def test_order_waypoints_is_optimal_on_the_campus(campus_graph):
+    compact = campus_graph.get_compact_graph()
+    start, end = compact.ids["N00"], compact.ids["N34"]
+    waypoints = [compact.ids[name] for name in ("N32", "N04", "N21", "N13")]
+    order, edge_ids = order_waypoints(compact, start, waypoints, end, "time")
+    assert sorted(order) == sorted(waypoints)
+    _check_route(compact, start, order, end, edge_ids)
+
+    def legs(stops):
+        return sum(compact.shortest_path(a, b, "time")[1] for a, b in zip(stops, stops[1:]))
+
+    best = min(legs([start, *perm, end]) for perm in itertools.permutations(waypoints))
+    assert sum(compact.weights["time"][e] for e in edge_ids) == pytest.approx(best)
+
+
+def test_order_waypoints_uses_the_heuristic_beyond_the_limit(campus_graph, monkeypatch):
+    monkeypatch.setattr(waypoint_order, "HELD_KARP_LIMIT", 2)
+    compact = campus_graph.get_compact_graph()
+    start, end = compact.ids["N10"], compact.ids["N10"]
+    waypoints = [compact.ids[name] for name in ("N32", "N04", "N21", "N13", "N30")]
+    order, edge_ids = order_waypoints(compact, start, waypoints, end, "time")
+    assert sorted(order) == sorted(waypoints)
+    _check_route(compact, start, order, end, edge_ids)
+
+
+def test_unreachable_waypoint(campus_graph):
+    compact = campus_graph.get_compact_graph()
+    ids = compact.ids
+    assert order_waypoints(compact, ids["N00"], [ids["N12"], ids["Z"]], ids["N34"]) == (None, None)
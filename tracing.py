@@ -0,0 +1,177 @@
+# The Local Graph, Tracing Module
+# Lightweight span timers and counters showing where a rerun's time goes, with JSON and Prometheus textfile export.
+#
+#   from tracing import count, span
+#   with span("compute_route"):
+#       ...
+#   count("nodes_settled", compact.last_settled)
+#
+# Spans and counters go to one process-wide Tracer (TRACER), shared by every Streamlit
+# session. Work done in pool worker processes is counted in those processes, not here.
+# Set LOCAL_GRAPH_TRACING=0 to turn it off; spans then cost one attribute check.
+
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from binary_store import atomic_write
+
+SPAN_SAMPLES = 1024  # Most recent durations kept per span for the percentiles
+PERCENTILES = (0.5, 0.9, 0.99)
+METRIC_PREFIX = "local_graph"
+
+
+class Tracer:
+    """
+    Collects span durations and event counters.
+
+    Stores:
+      - enabled: When False, span() and count() do nothing.
+      - samples: Span name -> deque of its most recent durations (seconds).
+      - totals: Span name -> [number of spans, total seconds] since the last reset.
+      - last: Span name -> duration of its most recent span (seconds).
+      - counters: Counter name -> accumulated value.
+    """
+    def __init__(self, enabled=True, max_samples=SPAN_SAMPLES):
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self.samples = {}
+        self.totals = {}
+        self.last = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def span(self, name):
+        """Context manager timing its block as one span of name (exceptions still record the time)."""
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timed(name)
+
+    def record(self, name, seconds):
+        """Adds one span duration measured elsewhere."""
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.max_samples)
+                self.totals[name] = [0, 0.0]
+            samples.append(seconds)
+            self.totals[name][0] += 1
+            self.totals[name][1] += seconds
+            self.last[name] = seconds
+
+    def count(self, name, value=1):
+        """Adds value to a counter. Hot loops should count locally and call this once per search."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def percentiles(self, name, quantiles=PERCENTILES):
+        """Returns {quantile: seconds} over the span's recent samples (nearest rank), or {} if there are none."""
+        with self._lock:
+            values = sorted(self.samples.get(name, ()))
+        if not values:
+            return {}
+        return {q: values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))] for q in quantiles}
+
+    def reset(self):
+        """Forgets every span and counter."""
+        with self._lock:
+            self.samples.clear()
+            self.totals.clear()
+            self.last.clear()
+            self.counters.clear()
+
+    # ------------------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------------------
+    def snapshot(self):
+        """
+        Returns a JSON-ready dict: per span its count, total, mean, last and
+        percentile durations (seconds), plus the counters.
+        """
+        with self._lock:
+            names = sorted(self.samples)
+            totals = {name: tuple(self.totals[name]) for name in names}
+            last = dict(self.last)
+            counters = dict(sorted(self.counters.items()))
+        spans = {}
+        for name in names:
+            n, total = totals[name]
+            spans[name] = {
+                "count": n,
+                "total": total,
+                "mean": total / n,
+                "last": last[name],
+                "percentiles": {str(q): v for q, v in self.percentiles(name).items()},
+            }
+        return {"timestamp": time.time(), "spans": spans, "counters": counters}
+
+    def to_prometheus(self, prefix=METRIC_PREFIX):
+        """
+        Returns the snapshot in the Prometheus text format: one summary of span
+        durations labelled by span, and one counter labelled by counter name.
+        """
+        snap = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_span_seconds Duration of instrumented stages.",
+            f"# TYPE {prefix}_span_seconds summary",
+        ]
+        for name, stats in snap["spans"].items():
+            label = _label_value(name)
+            for q, value in stats["percentiles"].items():
+                lines.append(f'{prefix}_span_seconds{{span="{label}",quantile="{q}"}} {value:.9g}')
+            lines.append(f'{prefix}_span_seconds_sum{{span="{label}"}} {stats["total"]:.9g}')
+            lines.append(f'{prefix}_span_seconds_count{{span="{label}"}} {stats["count"]}')
+        lines += [
+            f"# HELP {prefix}_events_total Events counted by the instrumented code.",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for name, value in snap["counters"].items():
+            lines.append(f'{prefix}_events_total{{counter="{_label_value(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        """Writes snapshot() to path (atomically, see binary_store.atomic_write)."""
+        with atomic_write(path) as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def write_prometheus(self, path, prefix=METRIC_PREFIX):
+        """Writes to_prometheus() to path, e.g. a *.prom file in node_exporter's textfile directory."""
+        with atomic_write(path) as f:
+            f.write(self.to_prometheus(prefix))
+
+
+def _label_value(value):
+    """Escapes a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# ----------------------------------------------------------------------------------
+# Process-wide tracer
+# ----------------------------------------------------------------------------------
+
+TRACER = Tracer(enabled=os.environ.get("LOCAL_GRAPH_TRACING", "1").lower() not in ("0", "false", "no"))
+
+
+def span(name):
+    """TRACER.span: times a block as one span of name."""
+    return TRACER.span(name)
+
+
+def count(name, value=1):
+    """TRACER.count: adds value to a counter."""
+    TRACER.count(name, value)
@@ -0,0 +1,217 @@
+# The Local Graph, Voice Channel Module
+# Queue of voice route requests, routed by a background thread instead of on every Streamlit rerun.
+#
+# Producers (the voice assistant) call submit_request(start, end), which drops one JSON file
+# per request into QUEUE_DIR. The file is written under a temporary name and renamed into place,
+# so the consumer never reads a torn request. Writers of the older single-file interface
+# (voice_update.json with {"start", "end", "confirmed"}) are still picked up.
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from binary_store import atomic_write
+from routing import compute_route
+from tracing import count, span
+
+QUEUE_DIR = "voice_requests"
+LEGACY_PATH = "voice_update.json"
+POLL_INTERVAL = 0.5  # seconds between directory scans (submit_request in this process wakes it at once)
+LEGACY_SETTLE = 0.2  # seconds a legacy file must be left alone before it is read
+MAX_RESULTS = 100  # routed requests kept until a session takes them
+
+
+def submit_request(start, end, waypoints=(), queue_dir=QUEUE_DIR):
+    """
+    Queues a route request and returns its file path. Names start with a
+    nanosecond timestamp, so the consumer handles requests in submission order.
+    """
+    os.makedirs(queue_dir, exist_ok=True)
+    name = f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+    path = os.path.join(queue_dir, name)
+    with atomic_write(path, sync=True) as f:
+        json.dump({"start": start, "end": end, "waypoints": list(waypoints), "confirmed": True}, f)
+    channel = _channels.get(os.path.abspath(queue_dir))
+    if channel is not None:
+        channel.notify()
+    return path
+
+
+_channels = {}  # Absolute queue directory -> running VoiceChannel of this process
+
+
+# ----------------------------------------------------------------------------------
+# VoiceChannel: background consumer
+# ----------------------------------------------------------------------------------
+
+
+class VoiceChannel:
+    """
+    Consumes queued voice requests on a daemon thread and routes them.
+
+    Stores:
+      - graph: The graph routes are computed on (any graph accepted by routing.compute_route).
+      - queue_dir: Directory holding one JSON file per request.
+      - legacy_path: The single-file voice_update.json of older producers (None to ignore it).
+      - cache: Optional RouteCache shared with the app.
+      - results: Routed requests not yet taken, as dicts with "seq", "start", "end",
+        "waypoints" and "route" (a routing.RouteResult), oldest first.
+      - seq: Sequence number of the latest result (0 before the first one).
+
+    Each request file is claimed by renaming it before it is read, so several
+    consumers sharing a directory never route the same request twice. Likewise
+    each result is handed to exactly one caller of take_results().
+    """
+    def __init__(self, graph, queue_dir=QUEUE_DIR, legacy_path=LEGACY_PATH, cache=None, poll_interval=POLL_INTERVAL):
+        self.graph = graph
+        self.queue_dir = queue_dir
+        self.legacy_path = legacy_path
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.results = deque(maxlen=MAX_RESULTS)
+        self.seq = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the consumer thread (once). A channel of this process already
+        consuming the same queue directory is stopped first, so requests are
+        never claimed by a channel nobody reads from.
+        """
+        if self._thread is not None:
+            return self
+        os.makedirs(self.queue_dir, exist_ok=True)
+        previous = _channels.get(os.path.abspath(self.queue_dir))
+        if previous is not None and previous is not self:
+            previous.stop()
+        _channels[os.path.abspath(self.queue_dir)] = self
+        self._thread = threading.Thread(target=self._run, name="voice-channel", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stops the consumer thread after the request it is working on."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if _channels.get(os.path.abspath(self.queue_dir)) is self:
+            del _channels[os.path.abspath(self.queue_dir)]
+
+    def use_graph(self, graph):
+        """Routes later requests on graph (e.g. after the input files were reloaded); results so far are kept."""
+        with self._lock:
+            self.graph = graph
+
+    def notify(self):
+        """Wakes the consumer without waiting for the next scan."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Warning: voice channel error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def has_results(self):
+        """True if a routed request is waiting to be taken."""
+        return bool(self.results)
+
+    def take_results(self):
+        """Removes and returns the routed requests waiting to be taken, oldest first."""
+        with self._lock:
+            results = list(self.results)
+            self.results.clear()
+        return results
+
+    # ------------------------------------------------------------------------------
+    # Consuming requests
+    # ------------------------------------------------------------------------------
+    def poll_once(self):
+        """Routes every request waiting in the legacy file and the queue directory; returns how many."""
+        handled = 0
+        request = self._claim_legacy()
+        if request is not None:
+            handled += self._handle(request)
+        try:
+            names = sorted(n for n in os.listdir(self.queue_dir) if n.endswith(".json") and not n.startswith("."))
+        except FileNotFoundError:
+            return handled
+        for name in names:
+            request = self._claim(os.path.join(self.queue_dir, name))
+            if request is not None:
+                handled += self._handle(request)
+        return handled
+
+    def _claim(self, path):
+        """Renames a request file out of the queue, reads it and deletes it. Returns the request or None."""
+        claimed = f"{path}.{os.getpid()}.claimed"
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            return None  # Another consumer took it
+        try:
+            with open(claimed, "r") as f:
+                request = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: rejecting unreadable voice request {path}: {e}")
+            os.replace(claimed, f"{path}.rejected")
+            return None
+        os.remove(claimed)
+        return request
+
+    def _claim_legacy(self):
+        """
+        Takes a confirmed request from the legacy voice_update.json. The file is
+        renamed away before reading, so a producer writing the next request
+        creates a new file instead of racing this read. A file modified in the
+        last LEGACY_SETTLE seconds is left for the next scan, since old producers
+        may still be writing it.
+        """
+        path = self.legacy_path
+        if not path:
+            return None
+        try:
+            if time.time() - os.path.getmtime(path) < LEGACY_SETTLE:
+                self.notify()
+                return None
+        except OSError:
+            return None
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except OSError:
+            return None
+        except ValueError:
+            data = None  # Torn or invalid; _claim sets it aside and reports it
+        if data is not None and not (isinstance(data, dict) and data.get("confirmed")):
+            return None
+        return self._claim(path)
+
+    def _handle(self, request):
+        """Routes one request and publishes the result; returns 1 if it was a valid request, else 0."""
+        if not isinstance(request, dict) or not request.get("confirmed", True):
+            return 0
+        start, end = request.get("start"), request.get("end")
+        if not start or not end:
+            return 0
+        waypoints = list(request.get("waypoints") or [])
+        with self._lock:
+            graph = self.graph
+        count("voice_requests")
+        with span("voice_route"):
+            route = compute_route(graph, start, waypoints, end, metric="time", algorithm="table", cache=self.cache)
+        with self._lock:
+            self.seq += 1
+            self.results.append({"seq": self.seq, "start": start, "end": end, "waypoints": waypoints, "route": route})
+        return 1
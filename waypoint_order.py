@@ -0,0 +1,120 @@
+# The Local Graph, Waypoint Order Module
+# Chooses the cheapest order to visit a set of waypoints between a fixed start and end.
+
+import itertools
+import math
+
+INF = math.inf
+HELD_KARP_LIMIT = 12  # exact DP up to this many waypoints (2^k * k^2 work), heuristic beyond
+
+
+def terminal_trees(compact, terminals, metric):
+    """
+    Returns one shortest path tree (dist, prev_edge) per terminal, taken from the
+    attached RouteTable when it covers the terminal and searched otherwise.
+    """
+    table = compact.route_table
+    n = len(compact)
+    trees = []
+    for source in terminals:
+        if table is not None and table.covers(source, metric):
+            base = table.row[source] * n
+            trees.append((table.dist[metric][base:base + n], table.prev[metric][base:base + n]))
+        else:
+            trees.append(compact.shortest_path_tree(source, metric))
+    return trees
+
+
+def held_karp(cost, k):
+    """
+    Exact order for visiting terminals 1..k between 0 (start) and k + 1 (end).
+    cost[i][j] is the leg cost from terminal i to terminal j. Returns (order, total).
+    """
+    full = (1 << k) - 1
+    # best[(mask, last)] = (cost, previous waypoint) over paths from the start
+    # visiting exactly the waypoints in mask and ending at waypoint last
+    best = {(1 << i, i): (cost[0][i + 1], -1) for i in range(k)}
+    for size in range(2, k + 1):
+        for subset in itertools.combinations(range(k), size):
+            mask = sum(1 << i for i in subset)
+            for last in subset:
+                prev_mask = mask & ~(1 << last)
+                options = (
+                    (best[(prev_mask, p)][0] + cost[p + 1][last + 1], p)
+                    for p in subset if p != last
+                )
+                best[(mask, last)] = min(options)
+
+    total, last = min((best[(full, i)][0] + cost[i + 1][k + 1], i) for i in range(k))
+    order = []
+    mask = full
+    while last != -1:
+        order.append(last + 1)
+        mask, last = mask & ~(1 << last), best[(mask, last)][1]
+    order.reverse()
+    return order, total
+
+
+def _order_cost(cost, order, end):
+    """Total cost of start -> order... -> end."""
+    stops = [0, *order, end]
+    return sum(cost[a][b] for a, b in zip(stops, stops[1:]))
+
+
+def nearest_neighbor_two_opt(cost, k):
+    """
+    Heuristic order for large waypoint sets: greedy nearest neighbor from the
+    start, improved by 2-opt segment reversals until no reversal helps.
+    Returns (order, total).
+    """
+    remaining = set(range(1, k + 1))
+    order = []
+    current = 0
+    while remaining:
+        current = min(remaining, key=lambda j: (cost[current][j], j))
+        order.append(current)
+        remaining.remove(current)
+
+    end = k + 1
+    total = _order_cost(cost, order, end)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                candidate_total = _order_cost(cost, candidate, end)
+                if candidate_total < total:
+                    order, total = candidate, candidate_total
+                    improved = True
+    return order, total
+
+
+def order_waypoints(compact, start, waypoints, end, metric='time'):
+    """
+    Finds a visiting order for waypoints (node ids) between start and end.
+
+    Builds the terminal cost matrix from one one-to-all search per terminal
+    (the end needs none), solves it exactly with Held-Karp for up to
+    HELD_KARP_LIMIT waypoints and heuristically beyond that, and unwinds the
+    legs from the same trees. Returns (ordered waypoint ids, edge_ids), or
+    (None, None) if some leg is unreachable.
+    """
+    terminals = [start, *waypoints, end]
+    k = len(waypoints)
+    trees = terminal_trees(compact, terminals[:-1], metric)
+    cost = [[dist[t] for t in terminals] for dist, _ in trees]
+    cost.append([INF] * len(terminals))  # nothing leaves the end
+
+    if k <= HELD_KARP_LIMIT:
+        order, total = held_karp(cost, k)
+    else:
+        order, total = nearest_neighbor_two_opt(cost, k)
+    if total == INF:
+        return None, None
+
+    edge_ids = []
+    stops = [0, *order, k + 1]
+    for a, b in zip(stops, stops[1:]):
+        edge_ids.extend(compact.unwind(trees[a][1], terminals[a], terminals[b]))
+    return [terminals[i] for i in order], edge_ids
@@ -0,0 +1,21 @@
+# The Local Graph, Worker Pool Module
+# Read-only data handed to every process pool worker once, instead of being pickled with each task.
+#
+#   with ProcessPoolExecutor(initializer=init_worker, initargs=("route_table", compact)) as pool:
+#       ...
+#   def _task(source):
+#       compact = worker_state("route_table")
+#
+# Serial code paths call init_worker in their own process, so tasks run unchanged without a pool.
+
+_worker_state = {}  # Name -> value held by this process
+
+
+def init_worker(name, value):
+    """Process pool initializer: keeps one copy of value per worker, under name."""
+    _worker_state[name] = value
+
+
+def worker_state(name):
+    """Returns the value init_worker kept under name in this process."""
+    return _worker_state[name]